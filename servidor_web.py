@@ -2,25 +2,125 @@
 # -*- coding: utf-8 -*-
 
 import http.server
-import socketserver
 import json
 import urllib.parse
 import math
 import csv
 import os
 from pathlib import Path
-from io import BytesIO
+from io import StringIO
 import openpyxl
 from openpyxl.styles import Font, Alignment
+import numpy as np
 import multiprocessing as mp
 from functools import lru_cache
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import time
 import socket
+import sys
+import re
+import threading
+import struct
+import hashlib
+import gzip
+import uuid
+import sqlite3
+import tempfile
+import shutil
+import io
+import queue
+import itertools
+from collections.abc import Mapping
+from types import MappingProxyType
+
+try:
+    import brotli  # Opcional: Content-Encoding br para páginas e tábuas
+except ImportError:
+    brotli = None
 
 # Configuração do servidor
 PORT_INICIAL = 8001
 
+# Número de idades das tábuas de mortalidade (0 a 125 anos)
+IDADES_TABUA = 126
+MESES_TABUA = IDADES_TABUA * 12
+
+# Pool de processos persistente para o cálculo coletivo (criado no início do servidor).
+# Configurável por variáveis de ambiente ou pela linha de comando.
+MAX_WORKERS = int(os.environ.get('SEGURO_MAX_WORKERS', min(mp.cpu_count(), 8)))
+# Uma fatia (tábua, sexo) do coletivo custa ~0,14 ms, o mesmo que o envio de uma
+# tarefa ao pool (~0,13 ms): por isso o padrão é uma tarefa por worker, e o pool
+# só é usado a partir de MIN_CELULAS_POOL células (alcançável por uma grade coletiva).
+TAMANHO_CHUNK = int(os.environ.get('SEGURO_TAMANHO_CHUNK', 0))  # Fatias (tábua, sexo) por tarefa; 0 = uma tarefa por worker
+MIN_CELULAS_POOL = int(os.environ.get('SEGURO_MIN_CELULAS_POOL', 20000))  # Grades menores rodam no próprio processo
+POOL_PROCESSOS = None
+_POOL_LOCK = threading.Lock()
+
+# Cache em disco (SQLite) dos resultados da grade coletiva, compartilhado entre
+# reinícios do servidor. Caminho vazio desativa o cache.
+ARQUIVO_CACHE_RESULTADOS = os.environ.get('SEGURO_CACHE_RESULTADOS', 'cache_resultados.sqlite')
+MAX_LINHAS_CACHE_RESULTADOS = int(os.environ.get('SEGURO_CACHE_RESULTADOS_MAX_LINHAS', 2000000))
+CACHE_RESULTADOS = None
+_CACHE_RESULTADOS_LOCK = threading.Lock()
+VERSOES_TABUAS = {}
+VERSAO_CALCULO_COLETIVO = 1  # Faz parte da chave: mude ao alterar o cálculo das taxas da grade coletiva
+
+# Cache em disco das planilhas enviadas (taxas de risco e empréstimos), endereçado
+# pelo sha256 do arquivo: reenviar a mesma planilha dispensa a leitura do Excel.
+# Fica fora do diretório servido (as planilhas têm dados dos segurados); diretório
+# vazio desativa o cache.
+DIRETORIO_CACHE_PLANILHAS = os.environ.get('SEGURO_CACHE_PLANILHAS',
+                                           os.path.join(tempfile.gettempdir(), 'seguro_prestamista_cache_planilhas'))
+MAX_ARQUIVOS_CACHE_PLANILHAS = int(os.environ.get('SEGURO_CACHE_PLANILHAS_MAX_ARQUIVOS', 64))
+VERSAO_CACHE_PLANILHAS = 1  # Faz parte da chave: mude ao alterar a normalização das planilhas
+
+# Uploads multipart lidos do socket em blocos; arquivos acima do limite vão para
+# um arquivo temporário em disco em vez de ficarem em memória.
+TAMANHO_BLOCO_UPLOAD = 64 * 1024
+LIMITE_MEMORIA_UPLOAD = int(os.environ.get('SEGURO_LIMITE_MEMORIA_UPLOAD', 1024 * 1024))
+MAX_TAMANHO_CABECALHO_UPLOAD = 16 * 1024
+
+# Ingestão em streaming da carteira da reserva coletiva: arquivos de empréstimos
+# grandes (ou CSV) são lidos linha a linha por uma thread produtora e calculados
+# em blocos de tamanho fixo enquanto a leitura continua, com memória constante.
+LIMITE_INGESTAO_STREAMING = int(os.environ.get('SEGURO_LIMITE_INGESTAO_STREAMING', 8 * 1024 * 1024))
+TAMANHO_BLOCO_INGESTAO = int(os.environ.get('SEGURO_TAMANHO_BLOCO_INGESTAO', 20000))
+TAMANHO_FILA_INGESTAO = 2  # Blocos lidos à frente do cálculo
+
+# Servidor concorrente: cada requisição tem sua thread, mas as rotas de cálculo
+# pesado passam por um executor limitado para não esgotar CPU e memória;
+# rotas leves (páginas estáticas, /tabuas, /obter_qx...) continuam respondendo.
+# Intervalo mínimo entre eventos de progresso do /calcular_coletivo_progress (segundos)
+INTERVALO_SSE = 0.2
+
+# Linhas por lote nas respostas em streaming (NDJSON)
+TAMANHO_LOTE_STREAM = 500
+# Células (empréstimo × mês) por bloco de matriz no motor de reserva da carteira
+CELULAS_BLOCO_RESERVA = 2_000_000
+
+MAX_REQUISICOES_PESADAS = int(os.environ.get('SEGURO_MAX_REQUISICOES_PESADAS', 2))
+EXECUTOR_PESADO = None
+
+# Jobs assíncronos (/jobs/...): rodam fora da requisição HTTP. O executor de jobs só
+# limita quantos jobs disputam ao mesmo tempo o EXECUTOR_PESADO, onde o cálculo de fato
+# roda, junto com as rotas pesadas síncronas (o limite de cálculo pesado continua sendo
+# MAX_REQUISICOES_PESADAS); jobs finalizados ficam disponíveis por JOB_TTL segundos.
+# Acima de MAX_JOBS_GUARDADOS jobs, os finalizados mais antigos saem (com seus resultados).
+MAX_JOBS_SIMULTANEOS = int(os.environ.get('SEGURO_MAX_JOBS', 2))
+JOB_TTL = int(os.environ.get('SEGURO_JOB_TTL', 3600))
+MAX_JOBS_GUARDADOS = int(os.environ.get('SEGURO_MAX_JOBS_GUARDADOS', 16))
+EXECUTOR_JOBS = None
+JOBS = {}
+_JOBS_LOCK = threading.Lock()
+
+# Resultados guardados no servidor para download por ID (sem reenviar as linhas), em
+# forma colunar (ResultadoCompacto): expiram após RESULTADO_TTL segundos; acima de
+# MAX_BYTES_RESULTADOS_GUARDADOS bytes no total, os mais antigos saem.
+RESULTADO_TTL = int(os.environ.get('SEGURO_RESULTADO_TTL', 1800))
+MAX_BYTES_RESULTADOS_GUARDADOS = int(os.environ.get('SEGURO_MAX_BYTES_RESULTADOS', 256 * 1024 * 1024))
+RESULTADOS_GUARDADOS = {}
+_RESULTADOS_LOCK = threading.Lock()
+
 # Cache global para tábuas de comutação (otimização de performance)
 TABUAS_CACHE = {}
 
@@ -35,6 +135,268 @@ def obter_tabua_cached(taxa_juros, tabua_nome):
     
     return TABUAS_CACHE[cache_key]
 
+# Cache de colunas de comutação por (tábua, sexo, taxa de juros anual)
+COMUTACAO_CACHE = {}
+COMUTACAO_ESTATISTICAS = {'hits': 0, 'misses': 0}
+_COMUTACAO_LOCK = threading.Lock()
+
+# Cache de kernels de decremento mensal por (tábua, sexo)
+KERNEL_MENSAL_CACHE = {}
+
+# Registro global de tábuas de mortalidade: carregado uma única vez por processo
+# (no início do servidor e no initializer de cada worker) e compartilhado somente leitura
+TABUAS_REGISTRO = None
+TABUA_PADRAO_REGISTRO = None
+_REGISTRO_LOCK = threading.Lock()
+
+# Cubo tábuas x sexos x idades (qx) e índice nome -> posição no cubo.
+# Quando vem do arquivo compilado, o cubo é um np.memmap: os processos filhos
+# compartilham as mesmas páginas em vez de manterem cópias próprias.
+TABUAS_CUBO = None
+TABUAS_INDICE = {}
+
+# Armazenamento binário compilado das tábuas (gerado a partir do CSV canônico)
+ARQUIVO_TABUAS_CSV = 'tabuas_mortalidade_completas.csv'
+ARQUIVO_TABUAS_BIN = 'tabuas_mortalidade.bin'
+_TABUAS_BIN_MAGIC = b'TABUAS01'
+_TABUAS_BIN_CABECALHO = struct.Struct('<8sIIIQ32s')  # magic, tábuas, sexos, idades, tam. índice, sha256
+SEXOS_TABUA = ('masculino', 'feminino')
+
+class QxPorIdade(Mapping):
+    """
+    Visão somente leitura de uma linha do cubo (qx de uma tábua e sexo).
+    
+    Aceita a idade como int ou str, mantendo compatibilidade com o formato
+    antigo (dict com chaves string) sem duplicar os dados.
+    """
+    __slots__ = ('qx',)
+    
+    def __init__(self, qx):
+        self.qx = qx
+    
+    def __getitem__(self, idade):
+        try:
+            idade = int(idade)
+        except (TypeError, ValueError):
+            raise KeyError(idade)
+        if not 0 <= idade < len(self.qx):
+            raise KeyError(idade)
+        return float(self.qx[idade])
+    
+    def __iter__(self):
+        return iter(range(len(self.qx)))
+    
+    def __len__(self):
+        return len(self.qx)
+
+def ler_tabuas_js(caminho='tabuas_mortalidade.js'):
+    """Lê e converte o objeto TABUAS_MORTALIDADE do arquivo JS para um dict Python."""
+    with open(caminho, 'r', encoding='utf-8') as f:
+        content = f.read()
+    
+    # Extrair o objeto TABUAS_MORTALIDADE usando regex
+    match = re.search(r'const TABUAS_MORTALIDADE\s*=\s*({.*?});', content, re.DOTALL)
+    if not match:
+        raise Exception("Não foi possível extrair TABUAS_MORTALIDADE do arquivo JS")
+    
+    # Converter JavaScript para JSON: chaves não quotadas e aspas simples
+    js_data = re.sub(r'(\w+):', r'"\1":', match.group(1))
+    js_data = js_data.replace("'", '"')
+    
+    return json.loads(js_data)
+
+def montar_cubo_tabuas(tabuas_data):
+    """Converte {tábua: {sexo: {idade: qx}}} em (nomes, cubo float64 tábuas x sexos x idades)."""
+    nomes = list(tabuas_data.keys())
+    cubo = np.ones((len(nomes), len(SEXOS_TABUA), IDADES_TABUA), dtype=np.float64)  # qx = 1 onde faltar idade
+    for i, nome in enumerate(nomes):
+        for s, sexo in enumerate(SEXOS_TABUA):
+            for idade, qx in tabuas_data[nome].get(sexo, {}).items():
+                if 0 <= int(idade) < IDADES_TABUA:
+                    cubo[i, s, int(idade)] = float(qx)
+    return nomes, cubo
+
+def ler_tabuas_csv(caminho=ARQUIVO_TABUAS_CSV):
+    """Lê o CSV canônico (tabua, idade, qx_masc, qx_fem) preservando a ordem das tábuas."""
+    tabuas_data = {}
+    with open(caminho, 'r', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            dados = tabuas_data.setdefault(row['tabua'], {'masculino': {}, 'feminino': {}})
+            dados['masculino'][int(row['idade'])] = float(row['qx_masc'])
+            dados['feminino'][int(row['idade'])] = float(row['qx_fem'])
+    return tabuas_data
+
+def compilar_tabuas_binarias(caminho_csv=ARQUIVO_TABUAS_CSV, caminho_bin=ARQUIVO_TABUAS_BIN):
+    """
+    Compila o CSV de tábuas no armazenamento binário.
+    
+    Layout: cabeçalho fixo, índice de nomes em JSON (alinhado a 8 bytes) e o cubo
+    float64 little-endian tábuas x sexos x idades. O SHA-256 cobre índice e cubo.
+    
+    Returns:
+        Número de tábuas compiladas
+    """
+    nomes, cubo = montar_cubo_tabuas(ler_tabuas_csv(caminho_csv))
+    
+    indice = json.dumps(nomes, ensure_ascii=False).encode('utf-8')
+    indice += b' ' * (-len(indice) % 8)
+    dados_cubo = cubo.astype('<f8').tobytes()
+    checksum = hashlib.sha256(indice + dados_cubo).digest()
+    
+    cabecalho = _TABUAS_BIN_CABECALHO.pack(_TABUAS_BIN_MAGIC, len(nomes), len(SEXOS_TABUA),
+                                          IDADES_TABUA, len(indice), checksum)
+    
+    # Escrita atômica para não expor um arquivo parcial a processos já em execução
+    caminho_tmp = f"{caminho_bin}.tmp"
+    with open(caminho_tmp, 'wb') as f:
+        f.write(cabecalho)
+        f.write(indice)
+        f.write(dados_cubo)
+    os.replace(caminho_tmp, caminho_bin)
+    
+    return len(nomes)
+
+def abrir_tabuas_binarias(caminho_bin=ARQUIVO_TABUAS_BIN):
+    """Valida o checksum e mapeia em memória o cubo de tábuas. Retorna (nomes, cubo memmap)."""
+    with open(caminho_bin, 'rb') as f:
+        magic, n_tabuas, n_sexos, n_idades, tam_indice, checksum = _TABUAS_BIN_CABECALHO.unpack(
+            f.read(_TABUAS_BIN_CABECALHO.size))
+        if magic != _TABUAS_BIN_MAGIC or n_sexos != len(SEXOS_TABUA) or n_idades != IDADES_TABUA:
+            raise ValueError(f"Formato inválido em {caminho_bin}")
+        indice = f.read(tam_indice)
+        dados_cubo = f.read(n_tabuas * n_sexos * n_idades * 8)
+    
+    if hashlib.sha256(indice + dados_cubo).digest() != checksum:
+        raise ValueError(f"Checksum inválido em {caminho_bin}")
+    
+    nomes = json.loads(indice.decode('utf-8'))
+    cubo = np.memmap(caminho_bin, dtype='<f8', mode='r',
+                     offset=_TABUAS_BIN_CABECALHO.size + tam_indice,
+                     shape=(n_tabuas, n_sexos, n_idades))
+    return nomes, cubo
+
+def carregar_cubo_tabuas():
+    """
+    Obtém o cubo de tábuas na ordem de preferência: arquivo binário compilado
+    (recompilado se ausente, corrompido ou mais antigo que o CSV), tabuas_mortalidade.js
+    e, por último, a tábua padrão embutida.
+    """
+    try:
+        if os.path.exists(ARQUIVO_TABUAS_CSV) and (
+                not os.path.exists(ARQUIVO_TABUAS_BIN)
+                or os.path.getmtime(ARQUIVO_TABUAS_CSV) > os.path.getmtime(ARQUIVO_TABUAS_BIN)):
+            print(f"Compilando {ARQUIVO_TABUAS_CSV} -> {ARQUIVO_TABUAS_BIN}...")
+            compilar_tabuas_binarias()
+        try:
+            nomes, cubo = abrir_tabuas_binarias()
+        except ValueError as e:
+            print(f"{e}. Recompilando tábuas...")
+            compilar_tabuas_binarias()
+            nomes, cubo = abrir_tabuas_binarias()
+        print(f"Tábuas mapeadas de {ARQUIVO_TABUAS_BIN}: {len(nomes)} tábuas")
+        return nomes, cubo
+    except Exception as e:
+        print(f"Erro ao carregar tábuas compiladas: {e}. Usando tabuas_mortalidade.js.")
+    
+    try:
+        tabuas_data = ler_tabuas_js()
+        print(f"Tábuas carregadas de tabuas_mortalidade.js: {len(tabuas_data)} tábuas")
+    except Exception as e:
+        print(f"Erro ao carregar tábuas: {e}. Usando tábua padrão.")
+        tabuas_data = {"Tábua Padrão": carregar_tabua_mortalidade_padrao()}
+    
+    return montar_cubo_tabuas(tabuas_data)
+
+def carregar_registro_tabuas():
+    """
+    Retorna o registro de tábuas do processo, carregando-o na primeira chamada.
+    
+    Cada tábua é exposta como {sexo: QxPorIdade}, uma visão sobre o cubo
+    compartilhado, para que todas as instâncias de TabuladeComutacao usem os
+    mesmos dados sem cópia e sem risco de alteração.
+    """
+    global TABUAS_REGISTRO, TABUA_PADRAO_REGISTRO, TABUAS_CUBO, TABUAS_INDICE
+    
+    if TABUAS_REGISTRO is not None:
+        return TABUAS_REGISTRO
+    
+    with _REGISTRO_LOCK:
+        if TABUAS_REGISTRO is None:
+            nomes, cubo = carregar_cubo_tabuas()
+            
+            registro = {}
+            for i, tabua_nome in enumerate(nomes):
+                registro[tabua_nome] = MappingProxyType({
+                    sexo: QxPorIdade(cubo[i, s]) for s, sexo in enumerate(SEXOS_TABUA)
+                })
+            
+            TABUAS_CUBO = cubo
+            TABUAS_INDICE = {nome: i for i, nome in enumerate(nomes)}
+            TABUA_PADRAO_REGISTRO = nomes[0]
+            TABUAS_REGISTRO = MappingProxyType(registro)
+    
+    return TABUAS_REGISTRO
+
+def inicializar_worker_tabuas():
+    """Initializer dos workers do pool: pré-carrega o registro de tábuas no processo filho."""
+    carregar_registro_tabuas()
+
+def carregar_tabua_mortalidade_padrao():
+    """Tábua BR-EMS 2021 simplificada, usada quando tabuas_mortalidade.js não pode ser lido."""
+    dados = {
+        'masculino': {},
+        'feminino': {}
+    }
+    # Dados da tábua BR-EMS 2021 (simplificada)
+    tabua_data = [
+        (0, 0.000371, 0.000355), (1, 0.000242, 0.000226), (2, 0.000213, 0.000195),
+        (3, 0.000199, 0.000180), (4, 0.000192, 0.000171), (5, 0.000188, 0.000165),
+        (6, 0.000186, 0.000162), (7, 0.000185, 0.000160), (8, 0.000185, 0.000159),
+        (9, 0.000186, 0.000159), (10, 0.000188, 0.000160), (11, 0.000191, 0.000162),
+        (12, 0.000195, 0.000165), (13, 0.000200, 0.000169), (14, 0.000206, 0.000174),
+        (15, 0.000213, 0.000180), (16, 0.000221, 0.000187), (17, 0.000230, 0.000195),
+        (18, 0.000240, 0.000204), (19, 0.000251, 0.000214), (20, 0.000263, 0.000225),
+        (21, 0.000276, 0.000237), (22, 0.000290, 0.000250), (23, 0.000305, 0.000264),
+        (24, 0.000321, 0.000279), (25, 0.000338, 0.000295), (26, 0.000356, 0.000312),
+        (27, 0.000375, 0.000330), (28, 0.000395, 0.000349), (29, 0.000416, 0.000369),
+        (30, 0.000438, 0.000390), (31, 0.000461, 0.000412), (32, 0.000485, 0.000435),
+        (33, 0.000510, 0.000459), (34, 0.000536, 0.000484), (35, 0.000563, 0.000510),
+        (36, 0.000591, 0.000537), (37, 0.000620, 0.000565), (38, 0.000650, 0.000594),
+        (39, 0.000681, 0.000624), (40, 0.000713, 0.000655), (41, 0.000746, 0.000687),
+        (42, 0.000780, 0.000720), (43, 0.000815, 0.000754), (44, 0.000851, 0.000789),
+        (45, 0.000888, 0.000825), (46, 0.000926, 0.000862), (47, 0.000965, 0.000900),
+        (48, 0.001005, 0.000939), (49, 0.001046, 0.000979), (50, 0.001088, 0.001020),
+        (51, 0.001131, 0.001062), (52, 0.001175, 0.001105), (53, 0.001220, 0.001149),
+        (54, 0.001266, 0.001194), (55, 0.001313, 0.001240), (56, 0.001361, 0.001287),
+        (57, 0.001410, 0.001335), (58, 0.001460, 0.001384), (59, 0.001511, 0.001434),
+        (60, 0.001563, 0.001485), (61, 0.001616, 0.001537), (62, 0.001670, 0.001590),
+        (63, 0.001725, 0.001644), (64, 0.001781, 0.001699), (65, 0.001838, 0.001755),
+        (66, 0.001896, 0.001812), (67, 0.001955, 0.001870), (68, 0.002015, 0.001989),
+        (69, 0.002076, 0.001989), (70, 0.002138, 0.002050), (71, 0.002201, 0.002112),
+        (72, 0.002265, 0.002175), (73, 0.002330, 0.002239), (74, 0.002396, 0.002304),
+        (75, 0.002463, 0.002370), (76, 0.002531, 0.002437), (77, 0.002600, 0.002505),
+        (78, 0.002670, 0.002574), (79, 0.002741, 0.002644), (80, 0.002813, 0.002715),
+        (81, 0.002886, 0.002787), (82, 0.002960, 0.002860), (83, 0.003035, 0.002934),
+        (84, 0.003111, 0.003009), (85, 0.003188, 0.003085), (86, 0.003266, 0.003162),
+        (87, 0.003345, 0.003240), (88, 0.003425, 0.003319), (89, 0.003506, 0.003399),
+        (90, 0.003588, 0.003480), (91, 0.003671, 0.003562), (92, 0.003755, 0.003645),
+        (93, 0.003840, 0.003729), (94, 0.003926, 0.003814), (95, 0.004013, 0.003900),
+        (96, 0.004101, 0.003987), (97, 0.004190, 0.004075), (98, 0.004280, 0.004164),
+        (99, 0.004371, 0.004254), (100, 0.004463, 0.004345), (101, 0.004556, 0.004437),
+        (102, 0.004650, 0.004530), (103, 0.004745, 0.004624), (104, 0.004841, 0.004719),
+        (105, 0.004938, 0.004815), (106, 0.005036, 0.004912), (107, 0.005135, 0.005010),
+        (108, 0.005235, 0.005109), (109, 0.005336, 0.005209), (110, 0.005438, 0.005310),
+        (111, 0.005541, 0.005412), (112, 0.005645, 0.005515), (113, 0.005750, 0.005619),
+        (114, 0.005856, 0.005724), (115, 0.005963, 0.005830), (116, 0.006071, 0.005937),
+        (117, 0.006180, 0.006045), (118, 0.006290, 0.006154), (119, 0.006401, 0.006264),
+        (120, 0.006513, 0.006375), (121, 0.006626, 0.006487), (122, 0.006740, 0.006600),
+        (123, 0.006855, 0.006714), (124, 0.006971, 0.006829), (125, 1.000000, 1.000000)
+    ]
+    for idade, qx_masc, qx_fem in tabua_data:
+        dados['masculino'][idade] = qx_masc
+        dados['feminino'][idade] = qx_fem
+    return dados
+
 class TabuladeComutacao:
     def __init__(self, taxa_juros, tabua_selecionada=None):
         self.taxa_juros = taxa_juros
@@ -44,99 +406,11 @@ class TabuladeComutacao:
         self.carregar_todas_tabuas()
         self.tabua_selecionada = tabua_selecionada if tabua_selecionada else self.tabua_padrao
         self.dados = self.obter_dados_tabua()
-        self.calcular_tabua_comutacao()
     
     def carregar_todas_tabuas(self):
-        try:
-            # Carregar dados das tábuas internas
-            self.carregar_tabuas_internas()
-        except Exception as e:
-            print(f"Erro ao carregar tábuas: {e}. Usando tábua padrão.")
-            self.carregar_tabua_padrao()
-    
-    def carregar_tabuas_internas(self):
-        """Carrega as tábuas de mortalidade dos dados internos"""
-        try:
-            # Carregar dados do arquivo tabuas_mortalidade.js
-            self.carregar_tabuas_js()
-        except Exception as e:
-            print(f"Erro ao carregar tábuas do JS: {e}. Usando tábua padrão.")
-            self.carregar_tabua_padrao()
-    
-    def carregar_tabuas_js(self):
-        """Carrega as tábuas de mortalidade do arquivo tabuas_mortalidade.js"""
-        try:
-            import json
-            import re
-            
-            # Ler o arquivo tabuas_mortalidade.js
-            with open('tabuas_mortalidade.js', 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            print("Arquivo tabuas_mortalidade.js lido com sucesso")
-            print(f"Tamanho do arquivo: {len(content)} caracteres")
-            
-            # Extrair o objeto TABUAS_MORTALIDADE usando regex mais robusto
-            pattern = r'const TABUAS_MORTALIDADE\s*=\s*({.*?});'
-            match = re.search(pattern, content, re.DOTALL)
-            
-            if match:
-                print("Padrão TABUAS_MORTALIDADE encontrado no arquivo")
-                js_data = match.group(1)
-                print(f"Tamanho dos dados extraídos: {len(js_data)} caracteres")
-                
-                # Converter JavaScript para JSON de forma mais robusta
-                # Primeiro, substituir chaves não quotadas por quotadas
-                js_data = re.sub(r'(\w+):', r'"\1":', js_data)
-                
-                # Substituir aspas simples por aspas duplas
-                js_data = js_data.replace("'", '"')
-                
-                # Converter para Python dict
-                tabuas_data = json.loads(js_data)
-                print(f"JSON parseado com sucesso. {len(tabuas_data)} tábuas encontradas")
-                
-                # Processar dados para o formato esperado
-                for tabua_nome, dados in tabuas_data.items():
-                    self.tabuas_disponiveis[tabua_nome] = dados
-                    if self.tabua_padrao is None:
-                        self.tabua_padrao = tabua_nome
-                
-                print(f"Tábuas carregadas: {list(self.tabuas_disponiveis.keys())}")
-                
-                # Testar acesso a uma tábua específica
-                if 'AT-83' in self.tabuas_disponiveis:
-                    at83_data = self.tabuas_disponiveis['AT-83']
-                    if 'masculino' in at83_data and '30' in at83_data['masculino']:
-                        qx_30_m = at83_data['masculino']['30']
-                        print(f"Teste AT-83 - qx para idade 30, sexo M: {qx_30_m}")
-                    else:
-                        print("AT-83 encontrada mas estrutura de dados incorreta")
-                else:
-                    print("AT-83 não encontrada nas tábuas carregadas")
-                    
-            else:
-                print("Padrão TABUAS_MORTALIDADE NÃO encontrado no arquivo")
-                print("Primeiras 500 caracteres do arquivo:")
-                print(content[:500])
-                raise Exception("Não foi possível extrair TABUAS_MORTALIDADE do arquivo JS")
-                
-        except Exception as e:
-            print(f"Erro ao processar tabuas_mortalidade.js: {e}")
-            import traceback
-            traceback.print_exc()
-            raise
-    
-    def carregar_tabua_padrao(self):
-        # Cria uma tábua padrão genérica
-        tabua_padrao_nome = "Tábua Padrão"
-        self.tabuas_disponiveis[tabua_padrao_nome] = {
-            "masculino": {},
-            "feminino": {}
-        }
-        dados_padrao = self.carregar_tabua_mortalidade()
-        self.tabuas_disponiveis[tabua_padrao_nome] = dados_padrao
-        self.tabua_padrao = tabua_padrao_nome
+        """Usa o registro global de tábuas (somente leitura) em vez de reler o arquivo JS."""
+        self.tabuas_disponiveis = carregar_registro_tabuas()
+        self.tabua_padrao = TABUA_PADRAO_REGISTRO
     
     def obter_dados_tabua(self):
         if self.tabua_selecionada in self.tabuas_disponiveis:
@@ -145,59 +419,7 @@ class TabuladeComutacao:
             return self.carregar_tabua_mortalidade()
     
     def carregar_tabua_mortalidade(self):
-        dados = {
-            'masculino': {},
-            'feminino': {}
-        }
-        # Dados da tábua BR-EMS 2021 (simplificada)
-        tabua_data = [
-            (0, 0.000371, 0.000355), (1, 0.000242, 0.000226), (2, 0.000213, 0.000195),
-            (3, 0.000199, 0.000180), (4, 0.000192, 0.000171), (5, 0.000188, 0.000165),
-            (6, 0.000186, 0.000162), (7, 0.000185, 0.000160), (8, 0.000185, 0.000159),
-            (9, 0.000186, 0.000159), (10, 0.000188, 0.000160), (11, 0.000191, 0.000162),
-            (12, 0.000195, 0.000165), (13, 0.000200, 0.000169), (14, 0.000206, 0.000174),
-            (15, 0.000213, 0.000180), (16, 0.000221, 0.000187), (17, 0.000230, 0.000195),
-            (18, 0.000240, 0.000204), (19, 0.000251, 0.000214), (20, 0.000263, 0.000225),
-            (21, 0.000276, 0.000237), (22, 0.000290, 0.000250), (23, 0.000305, 0.000264),
-            (24, 0.000321, 0.000279), (25, 0.000338, 0.000295), (26, 0.000356, 0.000312),
-            (27, 0.000375, 0.000330), (28, 0.000395, 0.000349), (29, 0.000416, 0.000369),
-            (30, 0.000438, 0.000390), (31, 0.000461, 0.000412), (32, 0.000485, 0.000435),
-            (33, 0.000510, 0.000459), (34, 0.000536, 0.000484), (35, 0.000563, 0.000510),
-            (36, 0.000591, 0.000537), (37, 0.000620, 0.000565), (38, 0.000650, 0.000594),
-            (39, 0.000681, 0.000624), (40, 0.000713, 0.000655), (41, 0.000746, 0.000687),
-            (42, 0.000780, 0.000720), (43, 0.000815, 0.000754), (44, 0.000851, 0.000789),
-            (45, 0.000888, 0.000825), (46, 0.000926, 0.000862), (47, 0.000965, 0.000900),
-            (48, 0.001005, 0.000939), (49, 0.001046, 0.000979), (50, 0.001088, 0.001020),
-            (51, 0.001131, 0.001062), (52, 0.001175, 0.001105), (53, 0.001220, 0.001149),
-            (54, 0.001266, 0.001194), (55, 0.001313, 0.001240), (56, 0.001361, 0.001287),
-            (57, 0.001410, 0.001335), (58, 0.001460, 0.001384), (59, 0.001511, 0.001434),
-            (60, 0.001563, 0.001485), (61, 0.001616, 0.001537), (62, 0.001670, 0.001590),
-            (63, 0.001725, 0.001644), (64, 0.001781, 0.001699), (65, 0.001838, 0.001755),
-            (66, 0.001896, 0.001812), (67, 0.001955, 0.001870), (68, 0.002015, 0.001989),
-            (69, 0.002076, 0.001989), (70, 0.002138, 0.002050), (71, 0.002201, 0.002112),
-            (72, 0.002265, 0.002175), (73, 0.002330, 0.002239), (74, 0.002396, 0.002304),
-            (75, 0.002463, 0.002370), (76, 0.002531, 0.002437), (77, 0.002600, 0.002505),
-            (78, 0.002670, 0.002574), (79, 0.002741, 0.002644), (80, 0.002813, 0.002715),
-            (81, 0.002886, 0.002787), (82, 0.002960, 0.002860), (83, 0.003035, 0.002934),
-            (84, 0.003111, 0.003009), (85, 0.003188, 0.003085), (86, 0.003266, 0.003162),
-            (87, 0.003345, 0.003240), (88, 0.003425, 0.003319), (89, 0.003506, 0.003399),
-            (90, 0.003588, 0.003480), (91, 0.003671, 0.003562), (92, 0.003755, 0.003645),
-            (93, 0.003840, 0.003729), (94, 0.003926, 0.003814), (95, 0.004013, 0.003900),
-            (96, 0.004101, 0.003987), (97, 0.004190, 0.004075), (98, 0.004280, 0.004164),
-            (99, 0.004371, 0.004254), (100, 0.004463, 0.004345), (101, 0.004556, 0.004437),
-            (102, 0.004650, 0.004530), (103, 0.004745, 0.004624), (104, 0.004841, 0.004719),
-            (105, 0.004938, 0.004815), (106, 0.005036, 0.004912), (107, 0.005135, 0.005010),
-            (108, 0.005235, 0.005109), (109, 0.005336, 0.005209), (110, 0.005438, 0.005310),
-            (111, 0.005541, 0.005412), (112, 0.005645, 0.005515), (113, 0.005750, 0.005619),
-            (114, 0.005856, 0.005724), (115, 0.005963, 0.005830), (116, 0.006071, 0.005937),
-            (117, 0.006180, 0.006045), (118, 0.006290, 0.006154), (119, 0.006401, 0.006264),
-            (120, 0.006513, 0.006375), (121, 0.006626, 0.006487), (122, 0.006740, 0.006600),
-            (123, 0.006855, 0.006714), (124, 0.006971, 0.006829), (125, 1.000000, 1.000000)
-        ]
-        for idade, qx_masc, qx_fem in tabua_data:
-            dados['masculino'][idade] = qx_masc
-            dados['feminino'][idade] = qx_fem
-        return dados
+        return carregar_tabua_mortalidade_padrao()
     
     def obter_qx(self, idade, sexo):
         # Converter idade para string para acessar os dados
@@ -208,41 +430,139 @@ class TabuladeComutacao:
         else:
             return self.dados['feminino'].get(idade_str, 1.0)
     
-    def calcular_tabua_comutacao(self):
-        self.l_x = {0: 100000}  # Radix
-        self.d_x = {}
-        self.D_x = {}
-        self.C_x = {}
-        self.N_x = {}
-        self.M_x = {}
-        self.v_x = {}
-        
-        sexo = 'M'  # Default para cálculo inicial, será ajustado na chamada
-        
-        # Calcular l_x e d_x
-        for idade in range(0, 126):
-            if idade > 0:
-                qx_anterior = self.obter_qx(idade - 1, sexo)
-                self.l_x[idade] = self.l_x[idade - 1] * (1 - qx_anterior)
-            
-            qx = self.obter_qx(idade, sexo)
-            self.d_x[idade] = self.l_x[idade] * qx
-        
-        # Calcular D_x, C_x e v_x
-        for idade in range(0, 126):
-            self.D_x[idade] = self.l_x[idade] * (self.v ** idade)
-            self.C_x[idade] = self.d_x[idade] * (self.v ** (idade + 1))
-            self.v_x[idade] = self.v ** idade
-        
-        # Calcular N_x e M_x
-        for idade in range(0, 126):
-            self.N_x[idade] = sum(self.D_x.get(x, 0) for x in range(idade, 126))
-            self.M_x[idade] = sum(self.C_x.get(x, 0) for x in range(idade, 126))
+    def obter_qx_array(self, sexo):
+        """Retorna as probabilidades de morte anuais das idades 0 a 125 como array float64."""
+        dados_sexo = self.dados['masculino'] if sexo == 'M' else self.dados['feminino']
+        if isinstance(dados_sexo, QxPorIdade):
+            return dados_sexo.qx  # Linha do cubo compartilhado, sem cópia
+        return np.array([self.obter_qx(idade, sexo) for idade in range(IDADES_TABUA)], dtype=np.float64)
+    
+    def calcular_tabua_comutacao(self, sexo='M'):
+        """
+        Colunas de comutação (l_x, d_x, D_x, C_x, N_x, M_x, v_x) do sexo informado,
+        do cache compartilhado. Não altera a instância, que pode ser usada ao mesmo
+        tempo por requisições de sexos diferentes.
+        """
+        return obter_colunas_comutacao(self, sexo)
+
+def calcular_colunas_comutacao(qx, v):
+    """
+    Calcula as colunas de comutação a partir das probabilidades de morte anuais.
+    
+    Args:
+        qx: Array com qx das idades 0 a 125
+        v: Fator de desconto anual 1/(1+i)
+    
+    Returns:
+        Dicionário com os arrays l_x, d_x, D_x, C_x, N_x, M_x e v_x
+    """
+    idades = np.arange(len(qx))
+    
+    # Calcular l_x (produto acumulado a partir do radix) e d_x
+    l_x = np.cumprod(np.concatenate(([100000.0], 1 - qx[:-1])))  # Radix
+    d_x = l_x * qx
+    
+    # Calcular D_x, C_x e v_x
+    v_x = v ** idades
+    D_x = l_x * v_x
+    C_x = d_x * (v ** (idades + 1))
+    
+    # Calcular N_x e M_x por somas acumuladas reversas (O(n))
+    N_x = np.cumsum(D_x[::-1])[::-1]
+    M_x = np.cumsum(C_x[::-1])[::-1]
+    
+    colunas = {'l_x': l_x, 'd_x': d_x, 'D_x': D_x, 'C_x': C_x, 'N_x': N_x, 'M_x': M_x, 'v_x': v_x}
+    for coluna in colunas.values():
+        coluna.flags.writeable = False  # Compartilhadas entre chamadas via cache
+    return colunas
+
+def obter_colunas_comutacao(tabua_obj, sexo):
+    """Obtém as colunas de comutação por (tábua, sexo, taxa anual), calculando-as só na primeira vez."""
+    cache_key = (tabua_obj.tabua_selecionada, sexo, tabua_obj.taxa_juros)
+    
+    colunas = COMUTACAO_CACHE.get(cache_key)
+    if colunas is not None:
+        with _COMUTACAO_LOCK:
+            COMUTACAO_ESTATISTICAS['hits'] += 1
+        return colunas
+    
+    colunas = calcular_colunas_comutacao(tabua_obj.obter_qx_array(sexo), tabua_obj.v)
+    with _COMUTACAO_LOCK:
+        COMUTACAO_ESTATISTICAS['misses'] += 1
+        COMUTACAO_CACHE[cache_key] = colunas
+    return colunas
+
+class KernelMensal:
+    """
+    Decrementos mensais pré-calculados de uma tábua e sexo.
+    
+    Os meses são contados a partir do nascimento: o mês k de um segurado com
+    idade inteira x corresponde ao índice 12*x + k, e usa o qx anual da idade
+    int((12*x + k) / 12). Após a idade 125 a morte é certa (q mensal = 1).
+    
+    Atributos:
+        p_mensal: (1 - qx)^(1/12) por mês de idade
+        q_mensal: 1 - p_mensal por mês de idade
+        sobrevivencia: matriz [idade inicial, k] com _kp_x, k = 0..12*126+12
+    """
+    
+    def __init__(self, qx_anual):
+        p_por_idade = (1 - np.asarray(qx_anual, dtype=np.float64)) ** (1/12)
+        janela = MESES_TABUA + 12
+        
+        # Meses após a última idade da tábua: sobrevivência zero
+        self.p_mensal = np.concatenate((np.repeat(p_por_idade, 12), np.zeros(janela)))
+        self.q_mensal = 1 - self.p_mensal
+        
+        # Uma linha por idade inicial (0 a 125, mais uma linha "morta" para idades > 125)
+        janelas = np.lib.stride_tricks.sliding_window_view(self.p_mensal, janela)[::12][:IDADES_TABUA + 1]
+        self.sobrevivencia = np.ones((IDADES_TABUA + 1, janela + 1))
+        np.cumprod(janelas, axis=1, out=self.sobrevivencia[:, 1:])
+        
+        for array in (self.p_mensal, self.q_mensal, self.sobrevivencia):
+            array.flags.writeable = False  # Compartilhados entre chamadas via cache
+    
+    def qx(self, mes):
+        """q mensal no mês de idade informado (escalar ou array)."""
+        return self.q_mensal[np.minimum(mes, len(self.q_mensal) - 1)]
+    
+    def kpx(self, mes_inicial, k):
+        """
+        _kp: probabilidade de sobreviver k meses a partir do mês de idade mes_inicial.
+        
+        Para inícios no meio do ano de idade, é a razão entre duas posições da
+        mesma linha da matriz de sobrevivência.
+        """
+        mes_inicial = np.asarray(mes_inicial)
+        k = np.asarray(k)
+        idade = np.minimum(mes_inicial // 12, IDADES_TABUA)
+        fracao = np.where(idade < IDADES_TABUA, mes_inicial % 12, 0)
+        
+        inicio = self.sobrevivencia[idade, fracao]
+        fim = self.sobrevivencia[idade, np.minimum(fracao + k, self.sobrevivencia.shape[1] - 1)]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            resultado = np.where(inicio > 0, fim / np.where(inicio > 0, inicio, 1), (k == 0) * 1.0)
+        return resultado[()]
+    
+    def kqx_diferido(self, mes_inicial, k):
+        """_{k|}q: sobreviver k meses e morrer no mês seguinte."""
+        return self.kpx(mes_inicial, k) * self.qx(np.asarray(mes_inicial) + k)
+
+def obter_kernel_mensal(tabua_obj, sexo):
+    """Obtém o kernel de decrementos mensais por (tábua, sexo), calculando-o só na primeira vez."""
+    cache_key = (tabua_obj.tabua_selecionada, sexo)
+    
+    kernel = KERNEL_MENSAL_CACHE.get(cache_key)
+    if kernel is None:
+        kernel = KernelMensal(tabua_obj.obter_qx_array(sexo))
+        with _COMUTACAO_LOCK:
+            KERNEL_MENSAL_CACHE[cache_key] = kernel
+    return kernel
 
 def calcular_seguro_anual(tabua_obj, idade, sexo, periodo):
     tabua_obj.dados = tabua_obj.tabuas_disponiveis[tabua_obj.tabua_selecionada]
-    tabua_obj.calcular_tabua_comutacao()  # Recalcular com o sexo correto
-    seguro_anual = (tabua_obj.M_x[idade] - tabua_obj.M_x[idade + periodo]) / tabua_obj.D_x[idade]
+    colunas = obter_colunas_comutacao(tabua_obj, sexo)  # Colunas do sexo correto (cache)
+    seguro_anual = float(colunas['M_x'][idade] - colunas['M_x'][idade + periodo]) / float(colunas['D_x'][idade])
     return seguro_anual
 
 def calcular_seguro_fracionado_total(taxa_juros, fracionamento, seguro_anual):
@@ -251,11 +571,12 @@ def calcular_seguro_fracionado_total(taxa_juros, fracionamento, seguro_anual):
     seguro_fracionado_total = fator_ajuste * seguro_anual
     return seguro_fracionado_total, fator_ajuste, taxa_fracionada
 
-def calcular_premio_mensal(tabua_obj, idade, periodo, valor_fracionado_total, taxa_juros, fracionamento, soma_segurada):
-    N_x = tabua_obj.N_x[idade]
-    N_x_n = tabua_obj.N_x[idade + periodo]
-    D_x = tabua_obj.D_x[idade]
-    D_x_n = tabua_obj.D_x[idade + periodo]
+def calcular_premio_mensal(tabua_obj, idade, periodo, valor_fracionado_total, taxa_juros, fracionamento, soma_segurada, sexo):
+    colunas = obter_colunas_comutacao(tabua_obj, sexo)
+    N_x = float(colunas['N_x'][idade])
+    N_x_n = float(colunas['N_x'][idade + periodo])
+    D_x = float(colunas['D_x'][idade])
+    D_x_n = float(colunas['D_x'][idade + periodo])
     
     anuidade_ajustada = ((N_x - N_x_n) / D_x + (11/24 * (1 - D_x_n / D_x))) * fracionamento
     valor_mensal = valor_fracionado_total / anuidade_ajustada if anuidade_ajustada != 0 else 0
@@ -279,6 +600,157 @@ def calcular_percentual_mensal(valor_mensal, taxa_juros, fracionamento, periodo,
     percentual = valor_mensal / pgto
     return percentual, taxa_fracionada, num_pagamentos, pgto
 
+@lru_cache(maxsize=256)
+def obter_cronograma_price_normalizado(taxa_mensal, num_parcelas):
+    """
+    Cronograma Price de um financiamento de valor 1, por (taxa mensal, prazo).
+    
+    Uma carteira tem milhares de contratos que compartilham poucos prazos, então
+    o cronograma normalizado é calculado uma vez e escalado pelo valor de cada
+    contrato.
+    
+    Returns:
+        Tupla (saldos, juros, amortizacoes, pmt): saldos[t] para t = 0..n e
+        juros/amortizacoes[t-1] da parcela t = 1..n (arrays somente leitura)
+    """
+    periodos = np.arange(num_parcelas + 1)
+    
+    if taxa_mensal == 0:
+        pmt = 1 / num_parcelas
+        saldos = 1 - periodos / num_parcelas
+    else:
+        fator_n = (1 + taxa_mensal)**num_parcelas
+        pmt = taxa_mensal * fator_n / (fator_n - 1)
+        saldos = (fator_n - (1 + taxa_mensal)**periodos) / (fator_n - 1)
+    saldos = np.maximum(saldos, 0)  # Não pode ser negativo
+    
+    juros = saldos[:-1] * taxa_mensal
+    amortizacoes = pmt - juros
+    
+    for array in (saldos, juros, amortizacoes):
+        array.flags.writeable = False  # Compartilhados entre chamadas via cache
+    return saldos, juros, amortizacoes, pmt
+
+def calcular_cronograma_price(principal, taxa_mensal, num_parcelas):
+    """
+    Calcula o cronograma Price (saldo devedor, juros, amortização e PMT).
+    
+    Para um único contrato devolve arrays 1-D; para um lote de contratos
+    (principal, taxa e prazo como arrays, com broadcast) devolve matrizes com
+    uma linha por contrato, completadas com zero após o prazo de cada um.
+    
+    Args:
+        principal: Valor inicial do financiamento (S₀)
+        taxa_mensal: Taxa de juros mensal (i)
+        num_parcelas: Número total de parcelas (n)
+    
+    Returns:
+        Dicionário com 'saldo_devedor' (t = 0..n), 'juros' e 'amortizacao'
+        (parcelas 1..n) e 'pmt'
+    """
+    if np.ndim(principal) == 0 and np.ndim(taxa_mensal) == 0 and np.ndim(num_parcelas) == 0:
+        saldos, juros, amortizacoes, pmt = obter_cronograma_price_normalizado(float(taxa_mensal), int(num_parcelas))
+        return {
+            'saldo_devedor': principal * saldos,
+            'juros': principal * juros,
+            'amortizacao': principal * amortizacoes,
+            'pmt': principal * pmt
+        }
+    
+    principal, taxa_mensal, num_parcelas = np.broadcast_arrays(
+        np.asarray(principal, dtype=np.float64), np.asarray(taxa_mensal, dtype=np.float64), np.asarray(num_parcelas, dtype=np.int64))
+    principal, taxa_mensal, num_parcelas = principal.ravel(), taxa_mensal.ravel(), num_parcelas.ravel()
+    
+    prazo_maximo = int(num_parcelas.max()) if len(num_parcelas) else 0
+    saldo_devedor = np.zeros((len(principal), prazo_maximo + 1))
+    juros = np.zeros((len(principal), prazo_maximo))
+    amortizacao = np.zeros((len(principal), prazo_maximo))
+    pmt = np.zeros(len(principal))
+    
+    # Um cronograma normalizado por combinação distinta de (taxa, prazo)
+    combinacoes, grupos = np.unique(np.column_stack((taxa_mensal, num_parcelas)), axis=0, return_inverse=True)
+    for indice, (taxa, prazo) in enumerate(combinacoes):
+        linhas = np.flatnonzero(grupos.ravel() == indice)
+        prazo = int(prazo)
+        saldos_n, juros_n, amortizacoes_n, pmt_n = obter_cronograma_price_normalizado(float(taxa), prazo)
+        fatores = principal[linhas, None]
+        saldo_devedor[linhas, :prazo + 1] = fatores * saldos_n
+        juros[linhas, :prazo] = fatores * juros_n
+        amortizacao[linhas, :prazo] = fatores * amortizacoes_n
+        pmt[linhas] = principal[linhas] * pmt_n
+    
+    return {
+        'saldo_devedor': saldo_devedor,
+        'juros': juros,
+        'amortizacao': amortizacao,
+        'pmt': pmt
+    }
+
+def calcular_fator_anuidade(taxa, num_parcelas):
+    """
+    Fator de anuidade a(r, n) = (1 - (1+r)^-n) / r e sua derivada em r.
+    
+    Aceita arrays; para taxas próximas de zero usa os limites a = n e
+    a' = -n(n+1)/2.
+    """
+    taxa = np.asarray(taxa, dtype=np.float64)
+    num_parcelas = np.asarray(num_parcelas, dtype=np.float64)
+    perto_de_zero = np.abs(taxa) < 1e-10
+    taxa_segura = np.where(perto_de_zero, 1.0, taxa)
+    
+    desconto_n = (1 + taxa_segura)**(-num_parcelas)
+    fator = (1 - desconto_n) / taxa_segura
+    derivada = (num_parcelas * desconto_n / (1 + taxa_segura) - fator) / taxa_segura
+    
+    fator = np.where(perto_de_zero, num_parcelas, fator)
+    derivada = np.where(perto_de_zero, -num_parcelas * (num_parcelas + 1) / 2, derivada)
+    return fator, derivada
+
+def resolver_taxa_anuidade(valor_presente, pmt, num_parcelas, tolerancia=1e-12, max_iteracoes=50):
+    """
+    Resolve a taxa r tal que pmt * a(r, n) = valor_presente (função TAXA do Excel).
+    
+    Newton-Raphson vetorizado com a derivada analítica do fator de anuidade,
+    resolvendo vários problemas (valor_presente, pmt, n) de uma vez. O chute
+    inicial 2(n*pmt - pv) / (pv(n+1)) já fica muito próximo da raiz para as
+    taxas usuais, de modo que poucas iterações bastam.
+    
+    Args:
+        valor_presente: Valor presente (escalar ou array)
+        pmt: Parcela (escalar ou array)
+        num_parcelas: Número de parcelas (escalar ou array)
+        tolerancia: Tolerância relativa para |pmt*a(r,n) - pv|
+        max_iteracoes: Número máximo de iterações de Newton
+    
+    Returns:
+        Taxa por período (escalar ou array); NaN onde não há solução ou o
+        método não convergiu
+    """
+    valor_presente, pmt, num_parcelas = np.broadcast_arrays(
+        np.asarray(valor_presente, dtype=np.float64), np.asarray(pmt, dtype=np.float64),
+        np.asarray(num_parcelas, dtype=np.float64))
+    
+    validos = (valor_presente > 0) & (pmt > 0) & (num_parcelas > 0)
+    pv = np.where(validos, valor_presente, 1.0)
+    parcela = np.where(validos, pmt, 1.0)
+    n = np.where(validos, num_parcelas, 1.0)
+    
+    with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+        taxa = np.maximum(2 * (n * parcela - pv) / (pv * (n + 1)), -0.99)
+        convergiu = np.zeros(taxa.shape, dtype=bool)
+        
+        for _ in range(max_iteracoes):
+            fator, derivada = calcular_fator_anuidade(taxa, n)
+            residuo = parcela * fator - pv
+            convergiu = np.abs(residuo) <= tolerancia * pv
+            if convergiu.all():
+                break
+            
+            passo = np.where(convergiu, 0.0, residuo / (parcela * derivada))
+            taxa = np.maximum(taxa - passo, -0.99)
+    
+    return np.where(validos & convergiu & np.isfinite(taxa), taxa, np.nan)[()]
+
 def calcular_saldo_devedor_price(soma_segurada, taxa_mensal, num_parcelas, periodo_t):
     """
     Calcula o saldo devedor de um financiamento Price no momento t.
@@ -292,12 +764,11 @@ def calcular_saldo_devedor_price(soma_segurada, taxa_mensal, num_parcelas, perio
     Returns:
         Saldo devedor no momento t
     """
-    if taxa_mensal == 0:
-        return soma_segurada * (1 - periodo_t / num_parcelas)
+    if periodo_t >= num_parcelas:
+        return 0.0
     
-    # Fórmula do saldo devedor Price
-    saldo_devedor = soma_segurada * ((1 + taxa_mensal)**num_parcelas - (1 + taxa_mensal)**periodo_t) / ((1 + taxa_mensal)**num_parcelas - 1)
-    return max(0, saldo_devedor)  # Não pode ser negativo
+    saldos = obter_cronograma_price_normalizado(float(taxa_mensal), int(num_parcelas))[0]
+    return float(soma_segurada * saldos[int(periodo_t)])
 
 def calcular_reserva_matematica_prestamista(tabua_obj, idade, sexo, periodo, taxa_juros, soma_segurada, tempo_t, premio_mensal=None):
     """
@@ -352,20 +823,17 @@ def calcular_reserva_matematica_prestamista(tabua_obj, idade, sexo, periodo, tax
             }
         }
     
-    # Configurar tábua para o sexo correto
+    # Configurar tábua (os dados não dependem do sexo)
     tabua_obj.dados = tabua_obj.tabuas_disponiveis[tabua_obj.tabua_selecionada]
-    tabua_obj.calcular_tabua_comutacao()
     
     # Parâmetros do financiamento
     taxa_mensal = (1 + taxa_juros)**(1/12) - 1
     num_parcelas = periodo
     v_mensal = 1 / (1 + taxa_mensal)
     
-    # Calcular PMT do financiamento
-    if taxa_mensal == 0:
-        pmt_financiamento = soma_segurada / num_parcelas
-    else:
-        pmt_financiamento = soma_segurada * taxa_mensal * (1 + taxa_mensal)**num_parcelas / ((1 + taxa_mensal)**num_parcelas - 1)
+    # Cronograma Price do financiamento (cacheado por taxa e prazo)
+    cronograma = calcular_cronograma_price(soma_segurada, taxa_mensal, num_parcelas)
+    pmt_financiamento = float(cronograma['pmt'])
     
     # Calcular saldo devedor no tempo t
     saldo_devedor_t = calcular_saldo_devedor_price(soma_segurada, taxa_mensal, num_parcelas, tempo_t)
@@ -374,25 +842,12 @@ def calcular_reserva_matematica_prestamista(tabua_obj, idade, sexo, periodo, tax
     idade_atual = idade + tempo_t / 12
     periodo_restante = periodo - tempo_t
     
-    # Cache de probabilidades mensais
-    dados_sexo = tabua_obj.dados['masculino'] if sexo == 'M' else tabua_obj.dados['feminino']
-    cache_qx_mensal = {}
-    
-    # Pré-calcular probabilidades de morte mensais para o período restante
-    for k in range(1, int(periodo_restante) + 1):
-        idade_k = int(idade_atual + k / 12)
-        if idade_k in dados_sexo:
-            qx_anual = tabua_obj.obter_qx(idade_k, sexo)
-            cache_qx_mensal[idade_k] = 1 - (1 - qx_anual)**(1/12)
+    # Probabilidades mensais a partir do kernel pré-calculado da tábua
+    kernel = obter_kernel_mensal(tabua_obj, sexo)
+    mes_idade_t = int(idade) * 12 + int(tempo_t)
     
     # Calcular probabilidade de sobrevivência até o tempo t
-    prob_sobrevivencia_t = 1.0
-    for k in range(1, int(tempo_t) + 1):
-        idade_k_1 = int(idade + (k - 1) / 12)
-        if idade_k_1 in dados_sexo:
-            qx_anual = tabua_obj.obter_qx(idade_k_1, sexo)
-            qx_mensal = 1 - (1 - qx_anual)**(1/12)
-            prob_sobrevivencia_t *= (1 - qx_mensal)
+    prob_sobrevivencia_t = float(kernel.kpx(int(idade) * 12, int(tempo_t)))
     
     # Calcular reserva matemática usando a fórmula mais simples e direta
     # V_t = Σ_{k=t+1}^{n} v^{k-t} ⋅ SD_k ⋅ _{k-t|1}q_{x+t} - Σ_{k=t+1}^{n} v^{k-t} ⋅ P ⋅ _{k-t}p_{x+t}
@@ -402,18 +857,9 @@ def calcular_reserva_matematica_prestamista(tabua_obj, idade, sexo, periodo, tax
         resultado_prestamista = calcular_seguro_prestamista(tabua_obj, idade, sexo, periodo, taxa_juros, soma_segurada)
         premio_mensal = resultado_prestamista['premio_mensal']
     
-    # Função para calcular probabilidade de sobrevivência mensal
-    def calcular_prob_sobrevivencia_mensal(idade_inicial, meses):
-        """Calcula a probabilidade de sobrevivência para 'meses' períodos mensais"""
-        prob = 1.0
-        for i in range(meses):
-            idade_atual = idade_inicial + i / 12
-            idade_int = int(idade_atual)
-            if idade_int in dados_sexo:
-                qx_anual = tabua_obj.obter_qx(idade_int, sexo)
-                qx_mensal = 1 - (1 - qx_anual)**(1/12)
-                prob *= (1 - qx_mensal)
-        return max(0, min(1, prob))
+    # _{k-t}p_{x+t} para todos os meses restantes (e um a mais para o _{k-t|1}q)
+    meses_restantes = np.arange(int(periodo) - int(tempo_t) + 2)
+    sobrevivencia_t = np.clip(kernel.kpx(mes_idade_t, meses_restantes), 0, 1)
     
     # Primeira soma: Σ v^{k-t} ⋅ SD_k ⋅ _{k-t|1}q_{x+t} (benefícios)
     valor_presente_beneficios = 0.0
@@ -425,17 +871,17 @@ def calcular_reserva_matematica_prestamista(tabua_obj, idade, sexo, periodo, tax
     
     for k in range(int(tempo_t) + 1, int(periodo) + 1):
         # SD_k = Saldo devedor no mês k (benefício)
-        SD_k = calcular_saldo_devedor_price(soma_segurada, taxa_mensal, num_parcelas, k)
+        SD_k = float(cronograma['saldo_devedor'][k])
         
         # Fator de desconto v^{k-t}
         v_power = v_mensal ** (k - tempo_t)
         
         # _{k-t}p_{x+t} - probabilidade de sobrevivência por k-t períodos
-        k_t_p_x_t = calcular_prob_sobrevivencia_mensal(idade + tempo_t/12, k - tempo_t)
+        k_t_p_x_t = float(sobrevivencia_t[k - tempo_t])
         
         # _{k-t|1}q_{x+t} - probabilidade de sobreviver k-t períodos e morrer no próximo
         # = _{k-t}p_{x+t} - _{k-t+1}p_{x+t}
-        k_t_1_p_x_t = calcular_prob_sobrevivencia_mensal(idade + tempo_t/12, k - tempo_t + 1)
+        k_t_1_p_x_t = float(sobrevivencia_t[k - tempo_t + 1])
         k_t_1_q_x_t = max(0, k_t_p_x_t - k_t_1_p_x_t)
         
         # Contribuição para benefícios: v^{k-t} ⋅ SD_k ⋅ _{k-t|1}q_{x+t}
@@ -482,10 +928,10 @@ def calcular_reserva_matematica_prestamista(tabua_obj, idade, sexo, periodo, tax
         }
     }
 
-def calcular_seguro_prestamista(tabua_obj, idade, sexo, periodo, taxa_juros, soma_segurada):
+def calcular_seguro_prestamista(tabua_obj, idade, sexo, periodo, taxa_juros, soma_segurada, detalhes=False):
     """
     Calcula o seguro prestamista onde o valor segurado diminui seguindo a amortização Price.
-    VERSÃO SUPER OTIMIZADA - Máxima performance com O(n) linear
+    VERSÃO VETORIZADA - cronograma, sobrevivência, desconto e contribuições como arrays
     
     Args:
         tabua_obj: Objeto da tábua de comutação
@@ -494,115 +940,55 @@ def calcular_seguro_prestamista(tabua_obj, idade, sexo, periodo, taxa_juros, som
         periodo: Período do seguro em meses
         taxa_juros: Taxa de juros anual
         soma_segurada: Soma segurada inicial
+        detalhes: Se True, monta a tabela mês a mês em 'detalhes_calculo'
+            (chamadas em lote só precisam dos prêmios e recebem uma lista vazia)
     
     Returns:
         Dicionário com os resultados do cálculo
     """
-    # Configurar tábua para o sexo correto
+    # Configurar tábua (os dados não dependem do sexo)
     tabua_obj.dados = tabua_obj.tabuas_disponiveis[tabua_obj.tabua_selecionada]
-    tabua_obj.calcular_tabua_comutacao()
+    # Colunas de comutação do sexo em variáveis locais: a mesma instância da tábua
+    # atende requisições de sexos diferentes em paralelo
+    l_x = obter_colunas_comutacao(tabua_obj, sexo)['l_x']
     
     # Parâmetros do financiamento
     taxa_mensal = (1 + taxa_juros)**(1/12) - 1
     num_parcelas = periodo
     v_mensal = 1 / (1 + taxa_mensal)
     
-    # Calcular PMT do financiamento
-    if taxa_mensal == 0:
-        pmt_financiamento = soma_segurada / num_parcelas
-    else:
-        pmt_financiamento = soma_segurada * taxa_mensal * (1 + taxa_mensal)**num_parcelas / ((1 + taxa_mensal)**num_parcelas - 1)
-    
-    # SUPER OTIMIZAÇÃO 1: Pré-calcular TUDO de uma vez
-    # Saldos devedor, probabilidades, fatores de desconto
-    saldos_devedor = [calcular_saldo_devedor_price(soma_segurada, taxa_mensal, num_parcelas, k) for k in range(num_parcelas + 1)]
-    
-    # SUPER OTIMIZAÇÃO 2: Cache otimizado de probabilidades mensais
-    dados_sexo = tabua_obj.dados['masculino'] if sexo == 'M' else tabua_obj.dados['feminino']
-    cache_qx_mensal = {}
-    
-    # Pré-calcular todas as idades necessárias
-    idades_necessarias = set()
-    for k in range(num_parcelas + 1):
-        idades_necessarias.add(int(idade + k / 12))
-    
-    for idade_int in idades_necessarias:
-        if idade_int in dados_sexo:
-            qx_anual = tabua_obj.obter_qx(idade_int, sexo)
-            cache_qx_mensal[idade_int] = 1 - (1 - qx_anual)**(1/12)
-    
-    # SUPER OTIMIZAÇÃO 3: Cálculo vetorizado de probabilidades de sobrevivência
-    prob_sobrevivencias = [1.0]  # Inicia com 100%
-    prob_atual = 1.0
-    
-    # SUPER OTIMIZAÇÃO 4: Cache de fatores de desconto
-    v_powers = [v_mensal ** k for k in range(1, num_parcelas + 1)]
-    
-    # SUPER OTIMIZAÇÃO 5: Cache de lx para anuidade
-    lx_0 = tabua_obj.l_x.get(idade, 1)
-    lx_cache = {}
-    for t in range(1, num_parcelas + 1):
-        idade_t = int(idade + t / 12)
-        if idade_t in tabua_obj.l_x:
-            lx_cache[t] = tabua_obj.l_x[idade_t]
-    
-    # Calcular prêmio único do seguro prestamista
-    premio_unico = 0
-    detalhes_calculo = []
+    # Cronograma Price do financiamento (cacheado por taxa e prazo)
+    cronograma = calcular_cronograma_price(soma_segurada, taxa_mensal, num_parcelas)
+    pmt_financiamento = float(cronograma['pmt'])
     
-    # SUPER OTIMIZAÇÃO 6: Loop principal otimizado
-    for k in range(1, num_parcelas + 1):
-        # Usar arrays pré-calculados
-        saldo_devedor = saldos_devedor[k - 1]
-        fator_desconto = v_powers[k - 1]
-        
-        # SUPER OTIMIZAÇÃO 7: Cálculo otimizado de juros e amortização
-        if k == 1:
-            juros_mes = soma_segurada * taxa_mensal
-        else:
-            juros_mes = saldos_devedor[k - 2] * taxa_mensal
-        
-        amortizacao_mes = pmt_financiamento - juros_mes
-        
-        # SUPER OTIMIZAÇÃO 8: Cálculo incremental de sobrevivência
-        if k > 1:
-            idade_anterior = int(idade + (k - 2) / 12)
-            if idade_anterior in cache_qx_mensal:
-                prob_atual *= (1 - cache_qx_mensal[idade_anterior])
-        
-        prob_sobrevivencias.append(prob_atual)
-        
-        # SUPER OTIMIZAÇÃO 9: Lookup otimizado de probabilidade de morte
-        idade_k_1 = int(idade + (k - 1) / 12)
-        qx_k = cache_qx_mensal.get(idade_k_1, 1.0)
-        
-        # Contribuição para o prêmio único (otimizada)
-        contribuicao = saldo_devedor * prob_atual * qx_k * fator_desconto
-        premio_unico += contribuicao
-        
-        # Detalhes (apenas se necessário)
-        detalhes_calculo.append({
-            'periodo': k,
-            'idade': idade_k_1,
-            'saldo_devedor': saldo_devedor,
-            'pmt': pmt_financiamento,
-            'juros': juros_mes,
-            'amortizacao': amortizacao_mes,
-            'prob_morte': qx_k,
-            'fator_desconto': fator_desconto,
-            'valor_antes_desconto': saldo_devedor * prob_atual * qx_k,
-            'contribuicao': contribuicao
-        })
+    # Meses k = 1..n e mês de idade no início de cada um
+    meses = np.arange(1, num_parcelas + 1)
+    mes_idade_inicial = int(idade) * 12
+    
+    # Saldo devedor no início de cada mês: SD(k-1)
+    saldos_devedor = cronograma['saldo_devedor'][:-1]
+    
+    # Probabilidades mensais do kernel da tábua: _{k-1}p_x e q_{x+k-1}
+    kernel = obter_kernel_mensal(tabua_obj, sexo)
+    prob_sobrevivencias = kernel.kpx(mes_idade_inicial, meses - 1)
+    qx_meses = kernel.qx(mes_idade_inicial + meses - 1)
+    
+    # Fatores de desconto v^k
+    fatores_desconto = v_mensal ** meses
     
-    # SUPER OTIMIZAÇÃO 10: Cálculo vetorizado da anuidade mensal
-    anuidade_mensal = 0
-    v_power = v_mensal
+    # Contribuições para o prêmio único
+    valores_antes_desconto = saldos_devedor * prob_sobrevivencias * qx_meses
+    contribuicoes = valores_antes_desconto * fatores_desconto
+    premio_unico = float(np.sum(contribuicoes))
     
-    for t in range(1, num_parcelas + 1):
-        if t in lx_cache and lx_0 > 0:
-            prob_sobrevivencia = lx_cache[t] / lx_0
-            anuidade_mensal += prob_sobrevivencia * v_power
-        v_power *= v_mensal
+    # Anuidade mensal com a sobrevivência anual da tábua de comutação (l_{x+t}/l_x)
+    lx_0 = l_x[idade] if idade < len(l_x) else 1
+    idades_t = (mes_idade_inicial + meses) // 12
+    dentro_tabua = idades_t < len(l_x)
+    if lx_0 > 0:
+        anuidade_mensal = float(np.sum(l_x[idades_t[dentro_tabua]] / lx_0 * fatores_desconto[dentro_tabua]))
+    else:
+        anuidade_mensal = 0
     
     if anuidade_mensal > 0:
         premio_mensal = premio_unico / anuidade_mensal
@@ -613,33 +999,40 @@ def calcular_seguro_prestamista(tabua_obj, idade, sexo, periodo, taxa_juros, som
     percentual_mensal = (premio_mensal / pmt_financiamento) if pmt_financiamento > 0 else 0
     
     # Calcular soma total das contribuições
-    soma_contribuicoes = sum(item['contribuicao'] for item in detalhes_calculo)
-    
-    # SUPER OTIMIZAÇÃO 11: Taxa de quitação otimizada
-    pv_liquido = -(soma_segurada - premio_unico)
+    soma_contribuicoes = premio_unico
     
-    # Método de Newton-Raphson otimizado
-    taxa_aprox = 0.01
-    for i in range(3):  # Reduzido de 5 para 3 iterações
-        npv = pv_liquido
-        for t in range(1, num_parcelas + 1):
-            npv += pmt_financiamento / ((1 + taxa_aprox) ** t)
-        
-        if abs(npv) < 0.01:
-            break
-            
-        # Derivada numérica otimizada
-        npv_plus = pv_liquido
-        for t in range(1, num_parcelas + 1):
-            npv_plus += pmt_financiamento / ((1 + taxa_aprox + 0.001) ** t)
+    # Tabela mês a mês somente quando solicitada
+    detalhes_calculo = []
+    if detalhes:
+        # Juros sobre o saldo do mês anterior (no primeiro mês, sobre a soma segurada)
+        juros_meses = saldos_devedor[np.maximum(meses - 2, 0)] * taxa_mensal
+        juros_meses[0] = soma_segurada * taxa_mensal
+        amortizacoes = pmt_financiamento - juros_meses
+        idades_meses = (mes_idade_inicial + meses - 1) // 12
         
-        derivada = (npv_plus - npv) / 0.001
-        if abs(derivada) > 1e-10:
-            taxa_aprox = taxa_aprox - npv / derivada
-        else:
-            break
+        for k, idade_k, saldo, juros, amortizacao, qx_k, desconto, valor, contribuicao in zip(
+                meses.tolist(), idades_meses.tolist(), saldos_devedor.tolist(), juros_meses.tolist(),
+                amortizacoes.tolist(), qx_meses.tolist(), fatores_desconto.tolist(),
+                valores_antes_desconto.tolist(), contribuicoes.tolist()):
+            detalhes_calculo.append({
+                'periodo': k,
+                'idade': idade_k,
+                'saldo_devedor': saldo,
+                'pmt': pmt_financiamento,
+                'juros': juros,
+                'amortizacao': amortizacao,
+                'prob_morte': qx_k,
+                'fator_desconto': desconto,
+                'valor_antes_desconto': valor,
+                'contribuicao': contribuicao
+            })
     
-    taxa_quitação_risco_mensal = (1 + taxa_aprox) / (1 + taxa_mensal) - 1
+    # Taxa de quitação: taxa implícita em que as parcelas quitam (soma segurada - prêmio único)
+    taxa_implicita = resolver_taxa_anuidade(soma_segurada - premio_unico, pmt_financiamento, num_parcelas)
+    if np.isnan(taxa_implicita):
+        taxa_quitação_risco_mensal = 0.0
+    else:
+        taxa_quitação_risco_mensal = float((1 + taxa_implicita) / (1 + taxa_mensal) - 1)
     
     return {
         'premio_unico': premio_unico,
@@ -678,46 +1071,38 @@ def calcular_seguro_prestamista_alt(tabua_obj, idade, sexo, periodo, taxa_juros,
     Returns:
         Dicionário com os resultados do cálculo
     """
-    # Configurar tábua para o sexo correto
+    # Configurar tábua (os dados não dependem do sexo)
     tabua_obj.dados = tabua_obj.tabuas_disponiveis[tabua_obj.tabua_selecionada]
-    tabua_obj.calcular_tabua_comutacao()
     
     # Parâmetros do financiamento
     taxa_mensal = (1 + taxa_juros)**(1/12) - 1
     num_parcelas = periodo
     v_mensal = 1 / (1 + taxa_mensal)  # Fator de desconto mensal
     
-    # Calcular PMT do financiamento (Price)
-    if taxa_mensal == 0:
-        pmt_financiamento = soma_segurada / num_parcelas
-    else:
-        pmt_financiamento = soma_segurada * taxa_mensal * (1 + taxa_mensal)**num_parcelas / ((1 + taxa_mensal)**num_parcelas - 1)
+    # Cronograma Price do financiamento (cacheado por taxa e prazo)
+    cronograma = calcular_cronograma_price(soma_segurada, taxa_mensal, num_parcelas)
+    pmt_financiamento = float(cronograma['pmt'])
     
     # Inicializar variáveis para cálculos
     soma_vp_pgto = 0  # Soma da coluna VP PGTO
     soma_vpa_pgto = 0  # Soma da coluna VPA PGTO
     detalhes_calculo = []
     
-    # Calcular lx inicial (probabilidade de sobrevivência na idade inicial)
-    lx_inicial = 1.0
+    # lx e qx mensais de todos os meses a partir do kernel da tábua (O(n))
+    kernel = obter_kernel_mensal(tabua_obj, sexo)
+    meses = np.arange(num_parcelas + 1)
+    lx_meses = kernel.kpx(idade * 12, meses)
+    qx_meses = np.where(meses < num_parcelas, kernel.qx(idade * 12 + meses), 0)  # Não há morte após o último período
     
     for k in range(num_parcelas + 1):  # k vai de 0 até n (incluindo tempo 0)
         # Idade no momento k (idade fracionária)
         idade_k = idade + k / 12
         
-        # Calcular lx (probabilidade de sobrevivência até o momento k)
-        if k == 0:
-            lx_k = 1.0
-        else:
-            # Interpolação linear da tábua anual para mensal
-            lx_k = calcular_lx_mensal(tabua_obj, idade, sexo, k)
+        # lx: probabilidade de sobrevivência até o momento k
+        lx_k = float(lx_meses[k])
         
-        # Calcular qx (probabilidade de morte no mês k+1, condicional em estar vivo no início do mês k+1)
-        if k < num_parcelas:
-            # Interpolação linear da tábua anual para mensal
-            qx_k = calcular_qx_mensal(tabua_obj, idade, sexo, k)
-        else:
-            qx_k = 0  # Não há morte após o último período
+        # qx: probabilidade de morte no mês k+1, condicional em estar vivo no início do mês k+1
+        qx_k = float(qx_meses[k])
         
         # Calcular vx (fator de desconto para o momento k)
         vx_k = v_mensal ** k
@@ -739,10 +1124,7 @@ def calcular_seguro_prestamista_alt(tabua_obj, idade, sexo, periodo, taxa_juros,
         soma_vpa_pgto += vpa_pgto_k
         
         # Saldo devedor no momento k (para referência)
-        if k == 0:
-            saldo_devedor_k = soma_segurada
-        else:
-            saldo_devedor_k = calcular_saldo_devedor_price(soma_segurada, taxa_mensal, num_parcelas, k)
+        saldo_devedor_k = soma_segurada if k == 0 else float(cronograma['saldo_devedor'][k])
         
         # Detalhes do cálculo
         detalhes_calculo.append({
@@ -762,29 +1144,15 @@ def calcular_seguro_prestamista_alt(tabua_obj, idade, sexo, periodo, taxa_juros,
     
     # Calcular Taxa de Cobertura de Risco primeiro
     # Fórmula: (1 + TAXA(nper=PrazoFinanciamento, pgto=Parcela, -vp=SomaColunaVPAPGTO)) / (1+JurosMensal) - 1
-    try:
-        import numpy as np
-        from scipy.optimize import fsolve
-        
-        # Valor presente líquido = -soma_vpa_pgto (negativo para TAXA)
-        pv_liquido = -soma_vpa_pgto
-        
-        # Função para calcular NPV
-        def npv_func(rate):
-            npv = pv_liquido
-            for t in range(1, num_parcelas + 1):
-                npv += pmt_financiamento / ((1 + rate) ** t)
-            return npv
-        
-        # Encontrar a taxa que zera o NPV
-        taxa_implícita = fsolve(npv_func, 0.01)[0]
-        
-        # Ajustar pela taxa de juros mensal
-        taxa_cobertura_risco = (1 + taxa_implícita) / (1 + taxa_mensal) - 1
-        
-    except Exception as e:
-        # Fallback se scipy não estiver disponível
+    # TAXA(nper, pgto, -vp) resolvida pelo solver vetorizado de anuidades
+    taxa_implícita = resolver_taxa_anuidade(soma_vpa_pgto, pmt_financiamento, num_parcelas)
+    
+    if np.isnan(taxa_implícita):
+        # Sem solução (ex.: soma VPA PGTO nula)
         taxa_cobertura_risco = 0.0
+    else:
+        # Ajustar pela taxa de juros mensal
+        taxa_cobertura_risco = float((1 + taxa_implícita) / (1 + taxa_mensal) - 1)
     
     # Calcular prêmio mensal usando a fórmula especificada
     # PGTO((1+JurosMensal)*(1+TaxaCoberturaRisco)-1; PrazoMeses; -PremioUnico)
@@ -823,6 +1191,8 @@ def calcular_lx_mensal(tabua_obj, idade_inicial, sexo, k):
     l3 = l2 * (1 - q2)
     ...
     
+    O produto acumulado vem pronto do kernel mensal da tábua (O(1) por chamada).
+    
     Args:
         tabua_obj: Objeto da tábua de comutação
         idade_inicial: Idade inicial
@@ -835,30 +1205,8 @@ def calcular_lx_mensal(tabua_obj, idade_inicial, sexo, k):
     if k == 0:
         return 1.0
     
-    # Obter dados da tábua
-    dados_sexo = tabua_obj.dados['masculino'] if sexo == 'M' else tabua_obj.dados['feminino']
-    
-    # Calcular lx de forma cumulativa
-    lx = 1.0  # l0 = 1
-    
-    for i in range(k):
-        # Calcular idade no mês i
-        # Do tempo 0 ao 11 = idade atual, do tempo 12 ao 23 = próxima idade, etc.
-        idade_i = idade_inicial + i // 12
-        idade_inteira_i = int(idade_i)
-        
-        # Obter qx anual para a idade inteira
-        if idade_inteira_i in dados_sexo:
-            qx_anual = dados_sexo[idade_inteira_i]
-            # Converter de anual para mensal
-            qx_mensal = 1 - (1 - qx_anual)**(1/12)
-            # Aplicar probabilidade de sobrevivência
-            lx *= (1 - qx_mensal)
-        else:
-            lx = 0.0
-            break
-    
-    return lx
+    kernel = obter_kernel_mensal(tabua_obj, sexo)
+    return float(kernel.kpx(int(idade_inicial) * 12, k))
 
 def calcular_qx_mensal(tabua_obj, idade_inicial, sexo, k):
     """
@@ -874,20 +1222,9 @@ def calcular_qx_mensal(tabua_obj, idade_inicial, sexo, k):
     Returns:
         Probabilidade de morte no mês k+1
     """
-    # Calcular a idade no início do mês k+1
-    idade_k_1 = idade_inicial + k / 12
-    idade_inteira = int(idade_k_1)
-    
-    # Obter qx anual para a idade inteira
-    dados_sexo = tabua_obj.dados['masculino'] if sexo == 'M' else tabua_obj.dados['feminino']
-    
-    if idade_inteira in dados_sexo:
-        qx_anual = dados_sexo[idade_inteira]
-        # Converter de anual para mensal usando aproximação atuarial
-        qx_mensal = 1 - (1 - qx_anual)**(1/12)
-        return qx_mensal
-    else:
-        return 1.0  # Morte certa após idade máxima
+    # Mês de idade no início do mês k+1 (morte certa após idade máxima)
+    kernel = obter_kernel_mensal(tabua_obj, sexo)
+    return float(kernel.qx(int(idade_inicial) * 12 + k))
 
 @lru_cache(maxsize=1000)
 def calcular_taxas_seguro_cached(tabua_nome, idade, sexo, periodo, taxa_juros, soma_segurada=100000):
@@ -904,7 +1241,6 @@ def calcular_taxas_seguro_cached(tabua_nome, idade, sexo, periodo, taxa_juros, s
             tabua_obj = TabuladeComutacao(taxa_juros, tabua_nome)
             tabua_obj.tabua_selecionada = tabua_nome
             tabua_obj.dados = tabua_obj.tabuas_disponiveis[tabua_nome]
-            tabua_obj.calcular_tabua_comutacao()
             TABUAS_CACHE[cache_key] = tabua_obj
         else:
             tabua_obj = TABUAS_CACHE[cache_key]
@@ -920,7 +1256,7 @@ def calcular_taxas_seguro_cached(tabua_nome, idade, sexo, periodo, taxa_juros, s
         
         # Calcular prêmio mensal
         valor_mensal, _, _, _, percentual_mensal_calc = calcular_premio_mensal(
-            tabua_obj, idade, periodo, valor_monetario_vista, taxa_juros, 12, soma_segurada
+            tabua_obj, idade, periodo, valor_monetario_vista, taxa_juros, 12, soma_segurada, sexo
         )
         
         return {
@@ -943,115 +1279,2316 @@ def calcular_taxas_seguro(tabua_obj, idade, sexo, periodo, taxa_juros, soma_segu
         tabua_obj.tabua_selecionada, idade, sexo, periodo, taxa_juros, soma_segurada
     )
 
-def processar_combinacao_paralela(args):
+def calcular_grade_coletiva(tabuas, idades, sexos, periodos, taxa_juros):
     """
-    Função para processar uma única combinação em paralelo.
-    Args: (tabua_nome, idade, sexo, periodo, taxa_juros, tipo_tabua, soma_segurada)
+    Calcula a taxa à vista e a taxa mensal de toda a grade tábua × sexo × idade × período.
+    
+    As duas taxas são diferenças e razões das colunas de comutação, então cada
+    par (tábua, sexo) é resolvido de uma vez com indexação de arrays, com os
+    mesmos resultados de calcular_taxas_seguro_cached célula a célula. Células
+    sem resultado (tábua inexistente, idade + período fora da tábua, D_x nulo ou
+    taxa de juros zero) ficam com taxa 0, como na versão célula a célula.
+    
+    Args:
+        tabuas: Lista de nomes de tábuas
+        idades: Idades (anos)
+        sexos: Lista de sexos ('M' ou 'F')
+        periodos: Períodos de cobertura (anos)
+        taxa_juros: Taxa de juros anual
+    
+    Returns:
+        Dicionário com 'taxa_vista' e 'taxa_mensal', arrays de forma
+        (tábuas, sexos, idades, períodos)
     """
-    try:
-        tabua_nome, idade, sexo, periodo, taxa_juros, tipo_tabua, soma_segurada = args
-        
-        # Calcular taxas usando a versão otimizada
-        taxas = calcular_taxas_seguro_cached(tabua_nome, idade, sexo, periodo, taxa_juros, soma_segurada)
+    idades = np.asarray(idades, dtype=np.int64)
+    periodos = np.asarray(periodos, dtype=np.int64)
+    forma = (len(tabuas), len(sexos), len(idades), len(periodos))
+    taxa_vista = np.zeros(forma)
+    taxa_mensal = np.zeros(forma)
+    
+    if taxa_juros == 0:
+        return {'taxa_vista': taxa_vista, 'taxa_mensal': taxa_mensal}
+    
+    # Ajuste do fracionamento mensal e PMT normalizado de cada período (12 * período parcelas)
+    taxa_fracionada = (1 + taxa_juros)**(1/12) - 1
+    fator_ajuste = taxa_juros / (12 * taxa_fracionada)
+    pmt_periodos = np.array([obter_cronograma_price_normalizado(taxa_fracionada, 12 * int(periodo))[3]
+                             for periodo in periodos])
+    
+    # Índices x e x+n de todas as células idade × período
+    idade_x = idades[:, None]
+    idade_x_n = idade_x + periodos[None, :]
+    dentro_tabua = (idade_x >= 0) & (idade_x_n < IDADES_TABUA)
+    idade_x = np.clip(idade_x, 0, IDADES_TABUA - 1)
+    idade_x_n = np.clip(idade_x_n, 0, IDADES_TABUA - 1)
+    
+    registro = carregar_registro_tabuas()
+    for indice_tabua, tabua_nome in enumerate(tabuas):
+        if tabua_nome not in registro:
+            continue
+        tabua_obj = TabuladeComutacao(taxa_juros, tabua_nome)
         
-        return {
-            "idade": idade,
-            "sexo": sexo,
-            "periodo": periodo,
-            "tipo_tabua": tipo_tabua,
-            "tabua": tabua_nome,
-            "taxa_vista": f"{taxas['taxa_vista']*100:.4f}%",
-            "taxa_mensal": f"{taxas['taxa_mensal']*100:.4f}%"
-        }
-    except Exception as e:
-        return None
+        for indice_sexo, sexo in enumerate(sexos):
+            colunas = obter_colunas_comutacao(tabua_obj, sexo)
+            D_x = colunas['D_x'][idade_x]
+            D_x_n = colunas['D_x'][idade_x_n]
+            
+            with np.errstate(divide='ignore', invalid='ignore'):
+                seguro_anual = (colunas['M_x'][idade_x] - colunas['M_x'][idade_x_n]) / D_x
+                vista = fator_ajuste * seguro_anual
+                anuidade_ajustada = ((colunas['N_x'][idade_x] - colunas['N_x'][idade_x_n]) / D_x + (11/24 * (1 - D_x_n / D_x))) * 12
+                mensal = np.where(anuidade_ajustada != 0, vista / (anuidade_ajustada * pmt_periodos), 0)
+            
+            validas = dentro_tabua & (D_x != 0) & np.isfinite(vista) & np.isfinite(mensal)
+            taxa_vista[indice_tabua, indice_sexo] = np.where(validas, vista, 0)
+            taxa_mensal[indice_tabua, indice_sexo] = np.where(validas, mensal, 0)
+    
+    return {'taxa_vista': taxa_vista, 'taxa_mensal': taxa_mensal}
 
-def calcular_coletivo_paralelo(idade_min, idade_max, sexos, periodo_min, periodo_max, 
-                              taxa_juros, tabuas_validas, tabuas_invalidas, max_workers=None):
+def extrair_parametros_coletivo(data):
     """
-    Versão otimizada do cálculo coletivo usando paralelismo.
+    Extrai e valida os parâmetros do cálculo coletivo enviados no corpo JSON.
+    
+    Returns:
+        Dicionário com idade_min, idade_max, sexos, periodo_min, periodo_max,
+        taxa_juros (decimal), tabuas_validas e tabuas_invalidas
     """
-    if max_workers is None:
-        max_workers = min(mp.cpu_count(), 8)  # Limitar a 8 workers para não sobrecarregar
+    idade_min = int(data['idade_min'])
+    idade_max = int(data['idade_max'])
+    sexos = data['sexos']
+    periodo_min = int(data['periodo_min'])
+    periodo_max = int(data['periodo_max'])
+    taxa_juros = float(data['taxa_juros']) / 100
+    tabuas_validas = data['tabuas_validas']
+    tabuas_invalidas = data['tabuas_invalidas']
     
-    # Preparar todas as combinações
-    combinacoes = []
+    # Validação dos limites
+    if not (0 <= idade_min <= idade_max <= 110):
+        raise ValueError("As idades devem estar entre 0 e 110 anos, e a idade mínima deve ser menor ou igual à máxima.")
     
-    # Adicionar combinações para tábuas válidas
-    for tabua in tabuas_validas:
-        for idade in range(idade_min, idade_max + 1):
-            for sexo in sexos:
-                for periodo in range(periodo_min, periodo_max + 1):
-                    combinacoes.append((tabua, idade, sexo, periodo, taxa_juros, "Válido", 100000))
+    if not (1 <= periodo_min <= periodo_max <= 10):
+        raise ValueError("Os períodos devem estar entre 1 e 120 meses, e o período mínimo deve ser menor ou igual ao máximo.")
     
-    # Adicionar combinações para tábuas inválidas
-    for tabua in tabuas_invalidas:
-        for idade in range(idade_min, idade_max + 1):
-            for sexo in sexos:
-                for periodo in range(periodo_min, periodo_max + 1):
-                    combinacoes.append((tabua, idade, sexo, periodo, taxa_juros, "Inválido", 100000))
+    if not (0 <= taxa_juros <= 0.20):  # 0% a 20%
+        raise ValueError("A taxa de juros deve estar entre 0% e 20%.")
     
-    print(f"Processando {len(combinacoes)} combinacoes com {max_workers} workers paralelos...")
-    inicio = time.time()
+    if len(sexos) == 0:
+        raise ValueError("Selecione pelo menos um sexo.")
     
-    # Processar em paralelo
-    resultados = []
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        # Submeter todas as tarefas
-        future_to_combinacao = {
-            executor.submit(processar_combinacao_paralela, comb): comb 
-            for comb in combinacoes
+    if len(tabuas_validas) == 0 and len(tabuas_invalidas) == 0:
+        raise ValueError("Selecione pelo menos uma tábua válida ou inválida.")
+    
+    return {
+        'idade_min': idade_min,
+        'idade_max': idade_max,
+        'sexos': sexos,
+        'periodo_min': periodo_min,
+        'periodo_max': periodo_max,
+        'taxa_juros': taxa_juros,
+        'tabuas_validas': tabuas_validas,
+        'tabuas_invalidas': tabuas_invalidas
+    }
+
+def iniciar_pool_processos(max_workers=None):
+    """
+    Cria o pool de processos persistente do cálculo coletivo.
+    
+    Os workers pré-carregam as tábuas no initializer, então as requisições já
+    encontram os processos prontos e com o registro de tábuas em memória.
+    """
+    global POOL_PROCESSOS
+    with _POOL_LOCK:
+        if POOL_PROCESSOS is None:
+            POOL_PROCESSOS = ProcessPoolExecutor(max_workers=max_workers or MAX_WORKERS,
+                                                 initializer=inicializar_worker_tabuas)
+    return POOL_PROCESSOS
+
+def encerrar_pool_processos():
+    """Encerra o pool de processos persistente, se existir."""
+    global POOL_PROCESSOS
+    with _POOL_LOCK:
+        if POOL_PROCESSOS is not None:
+            POOL_PROCESSOS.shutdown(cancel_futures=True)
+            POOL_PROCESSOS = None
+
+def processar_fatias_coletivas(args):
+    """
+    Processa um lote de fatias (tábua, sexo) da grade coletiva em um worker.
+    Args: (fatias, idades, periodos, taxa_juros), com fatias = [(indice_tabua, tabua_nome, indice_sexo, sexo), ...]
+    """
+    fatias, idades, periodos, taxa_juros = args
+    resultados = []
+    for indice_tabua, tabua_nome, indice_sexo, sexo in fatias:
+        grade = calcular_grade_coletiva([tabua_nome], idades, [sexo], periodos, taxa_juros)
+        resultados.append((indice_tabua, indice_sexo, grade['taxa_vista'][0, 0], grade['taxa_mensal'][0, 0]))
+    return resultados
+
+def obter_versao_tabua(tabua_nome):
+    """
+    Versão de uma tábua para o cache em disco: VERSAO_CALCULO_COLETIVO mais o
+    hash das suas probabilidades qx. Se a tábua for alterada no CSV (ou o
+    cálculo mudar), os resultados antigos deixam de ser usados.
+    Retorna None para tábuas inexistentes.
+    """
+    versao = VERSOES_TABUAS.get(tabua_nome)
+    if versao is None:
+        carregar_registro_tabuas()
+        if tabua_nome not in TABUAS_INDICE:
+            return None
+        qx = np.ascontiguousarray(TABUAS_CUBO[TABUAS_INDICE[tabua_nome]], dtype=np.float64)
+        versao = f"v{VERSAO_CALCULO_COLETIVO}-{hashlib.sha256(qx.tobytes()).hexdigest()[:16]}"
+        VERSOES_TABUAS[tabua_nome] = versao
+    return versao
+
+class CacheResultadosColetivo:
+    """
+    Cache em disco (SQLite) das taxas da grade coletiva, uma linha por
+    (tábua, versão da tábua, taxa de juros, sexo, idade, período).
+    
+    As leituras e gravações são feitas por fatia (tábua, sexo). Quando o número
+    de linhas passa de max_linhas, as menos usadas recentemente são removidas.
+    """
+    
+    _FILTRO_FATIA = ("tabua = ? AND versao = ? AND taxa_juros = ? AND sexo = ? "
+                     "AND idade BETWEEN ? AND ? AND periodo BETWEEN ? AND ?")
+    
+    def __init__(self, caminho, max_linhas=None):
+        self.caminho = caminho
+        self.max_linhas = max_linhas or MAX_LINHAS_CACHE_RESULTADOS
+        self.estatisticas = {'hits': 0, 'misses': 0, 'remocoes': 0}
+        self._acessos_pendentes = {}
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.execute("""
+            CREATE TABLE IF NOT EXISTS resultados (
+                tabua TEXT NOT NULL,
+                versao TEXT NOT NULL,
+                taxa_juros REAL NOT NULL,
+                sexo TEXT NOT NULL,
+                idade INTEGER NOT NULL,
+                periodo INTEGER NOT NULL,
+                taxa_vista REAL NOT NULL,
+                taxa_mensal REAL NOT NULL,
+                acesso REAL NOT NULL,
+                UNIQUE (tabua, versao, taxa_juros, sexo, idade, periodo)
+            )""")
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS resultados_acesso ON resultados (acesso)")
+        self._conexao.commit()
+        self._linhas = self._conexao.execute("SELECT COUNT(*) FROM resultados").fetchone()[0]
+    
+    def ler_fatia(self, tabua_nome, versao, taxa_juros, sexo, idades, periodos):
+        """
+        Lê a fatia idades × períodos de (tábua, sexo). Retorna (taxa_vista, taxa_mensal)
+        se todas as células estiverem no cache, ou None.
+        """
+        chave = (tabua_nome, versao, round(taxa_juros, 12), sexo, min(idades), max(idades), min(periodos), max(periodos))
+        with self._lock:
+            linhas = self._conexao.execute(
+                f"SELECT idade, periodo, taxa_vista, taxa_mensal FROM resultados WHERE {self._FILTRO_FATIA}", chave
+            ).fetchall()
+            
+            # Posição de cada idade/período da consulta (-1 para os que estão no intervalo mas fora dela)
+            posicao_idade = np.full(chave[5] - chave[4] + 1, -1)
+            posicao_idade[np.asarray(idades) - chave[4]] = np.arange(len(idades))
+            posicao_periodo = np.full(chave[7] - chave[6] + 1, -1)
+            posicao_periodo[np.asarray(periodos) - chave[6]] = np.arange(len(periodos))
+            
+            vistas = np.zeros((len(idades), len(periodos)))
+            mensais = np.zeros((len(idades), len(periodos)))
+            encontradas = np.zeros((len(idades), len(periodos)), dtype=bool)
+            if linhas:
+                dados = np.array(linhas, dtype=np.float64)
+                linha_idade = posicao_idade[dados[:, 0].astype(np.int64) - chave[4]]
+                linha_periodo = posicao_periodo[dados[:, 1].astype(np.int64) - chave[6]]
+                usar = (linha_idade >= 0) & (linha_periodo >= 0)
+                celulas = (linha_idade[usar], linha_periodo[usar])
+                vistas[celulas] = dados[usar, 2]
+                mensais[celulas] = dados[usar, 3]
+                encontradas[celulas] = True
+            
+            if not encontradas.all():
+                self.estatisticas['misses'] += 1
+                return None
+            
+            # O horário de acesso só é gravado na próxima escrita (quando pode haver remoção)
+            self.estatisticas['hits'] += 1
+            self._acessos_pendentes[chave] = time.time()
+            return vistas, mensais
+    
+    def gravar_fatia(self, tabua_nome, versao, taxa_juros, sexo, idades, periodos, vistas, mensais):
+        """Grava a fatia idades × períodos de (tábua, sexo) e aplica o limite de linhas."""
+        agora = time.time()
+        taxa = round(taxa_juros, 12)
+        linhas = [(tabua_nome, versao, taxa, sexo, int(idade), int(periodo),
+                   float(vistas[indice_idade, indice_periodo]), float(mensais[indice_idade, indice_periodo]), agora)
+                  for indice_idade, idade in enumerate(idades)
+                  for indice_periodo, periodo in enumerate(periodos)]
+        with self._lock:
+            with self._conexao:
+                self._conexao.executemany(f"UPDATE resultados SET acesso = ? WHERE {self._FILTRO_FATIA}",
+                                          [(acesso,) + chave for chave, acesso in self._acessos_pendentes.items()])
+                self._acessos_pendentes.clear()
+                self._conexao.executemany("INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", linhas)
+                self._linhas = self._conexao.execute("SELECT COUNT(*) FROM resultados").fetchone()[0]
+                excesso = self._linhas - self.max_linhas
+                if excesso > 0:
+                    self._conexao.execute(
+                        "DELETE FROM resultados WHERE rowid IN "
+                        "(SELECT rowid FROM resultados ORDER BY acesso LIMIT ?)", (excesso,))
+                    self.estatisticas['remocoes'] += excesso
+                    self._linhas -= excesso
+    
+    def limpar(self):
+        """Remove todos os resultados e zera as estatísticas."""
+        with self._lock:
+            with self._conexao:
+                self._conexao.execute("DELETE FROM resultados")
+            self._acessos_pendentes.clear()
+            self._conexao.execute("VACUUM")
+            self._conexao.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._linhas = 0
+            self.estatisticas = {'hits': 0, 'misses': 0, 'remocoes': 0}
+    
+    def obter_estatisticas(self):
+        """Estatísticas do cache (hits e misses contados por fatia)."""
+        with self._lock:
+            tamanho = sum(os.path.getsize(self.caminho + sufixo)
+                          for sufixo in ('', '-wal') if os.path.exists(self.caminho + sufixo))
+            return {
+                "arquivo": self.caminho,
+                "linhas": self._linhas,
+                "max_linhas": self.max_linhas,
+                "tamanho_bytes": tamanho,
+                "hits_fatias": self.estatisticas['hits'],
+                "misses_fatias": self.estatisticas['misses'],
+                "remocoes": self.estatisticas['remocoes']
+            }
+
+def obter_cache_resultados():
+    """Abre (uma vez) o cache em disco dos resultados; None se estiver desativado ou indisponível."""
+    global CACHE_RESULTADOS
+    if CACHE_RESULTADOS is None and ARQUIVO_CACHE_RESULTADOS:
+        with _CACHE_RESULTADOS_LOCK:
+            if CACHE_RESULTADOS is None:
+                try:
+                    CACHE_RESULTADOS = CacheResultadosColetivo(ARQUIVO_CACHE_RESULTADOS)
+                except sqlite3.Error as e:
+                    print(f"Aviso: cache em disco indisponível ({e}); seguindo sem cache")
+                    return None
+    return CACHE_RESULTADOS
+
+def iterar_fatias_coletivas(tabuas, idades, sexos, periodos, taxa_juros):
+    """
+    Gera as fatias (indice_tabua, indice_sexo, taxa_vista, taxa_mensal) da grade coletiva
+    conforme ficam prontas.
+    
+    Fatias completas no cache em disco são lidas dele primeiro; as demais são
+    calculadas por calcular_fatias_coletivas e gravadas no cache.
+    """
+    idades = list(idades)
+    periodos = list(periodos)
+    cache = obter_cache_resultados()
+    
+    pendentes = []
+    for indice_tabua, tabua_nome in enumerate(tabuas):
+        versao = obter_versao_tabua(tabua_nome) if cache is not None else None
+        for indice_sexo, sexo in enumerate(sexos):
+            salvo = None
+            if versao is not None:
+                salvo = cache.ler_fatia(tabua_nome, versao, taxa_juros, sexo, idades, periodos)
+            if salvo is None:
+                pendentes.append((indice_tabua, tabua_nome, indice_sexo, sexo))
+            else:
+                yield (indice_tabua, indice_sexo) + salvo
+    
+    for indice_tabua, indice_sexo, vistas, mensais in calcular_fatias_coletivas(pendentes, idades, periodos, taxa_juros):
+        versao = obter_versao_tabua(tabuas[indice_tabua]) if cache is not None else None
+        if versao is not None:
+            cache.gravar_fatia(tabuas[indice_tabua], versao, taxa_juros, sexos[indice_sexo],
+                               idades, periodos, vistas, mensais)
+        yield indice_tabua, indice_sexo, vistas, mensais
+
+def despachar_fatias(processar, fatias, argumentos, total_celulas):
+    """
+    Executa processar((lote, *argumentos)) em lotes de fatias, gerando os
+    resultados de cada fatia conforme ficam prontos.
+    
+    Trabalhos com pelo menos MIN_CELULAS_POOL células são despachados para o pool
+    persistente, em lotes de TAMANHO_CHUNK fatias (ou, com TAMANHO_CHUNK = 0, em
+    uma tarefa por worker); os menores rodam no próprio processo, onde o custo de
+    serializar as tarefas não compensa.
+    """
+    if POOL_PROCESSOS is None or len(fatias) < 2 or total_celulas < MIN_CELULAS_POOL:
+        yield from processar((fatias,) + tuple(argumentos))
+        return
+    
+    tamanho_lote = TAMANHO_CHUNK or -(-len(fatias) // MAX_WORKERS)
+    lotes = [fatias[indice:indice + tamanho_lote] for indice in range(0, len(fatias), tamanho_lote)]
+    futures = [POOL_PROCESSOS.submit(processar, (lote,) + tuple(argumentos)) for lote in lotes]
+    try:
+        for future in as_completed(futures):
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+def calcular_fatias_coletivas(fatias, idades, periodos, taxa_juros):
+    """
+    Calcula as fatias [(indice_tabua, tabua_nome, indice_sexo, sexo), ...] da grade
+    coletiva, gerando (indice_tabua, indice_sexo, taxa_vista, taxa_mensal) conforme
+    ficam prontas (no pool persistente, para grades grandes).
+    """
+    return despachar_fatias(processar_fatias_coletivas, fatias, (idades, periodos, taxa_juros),
+                            len(fatias) * len(idades) * len(periodos))
+
+def formatar_linhas_coletivo(tabua_nome, tipo_tabua, idade, sexo, periodos, taxas_vista, taxas_mensal):
+    """Monta as linhas de resultado do coletivo de uma (tábua, idade, sexo) para todos os períodos."""
+    return [{
+        "idade": idade,
+        "sexo": sexo,
+        "periodo": periodo,
+        "tipo_tabua": tipo_tabua,
+        "tabua": tabua_nome,
+        "taxa_vista": f"{taxa_vista*100:.4f}%",
+        "taxa_mensal": f"{taxa_mensal*100:.4f}%"
+    } for periodo, taxa_vista, taxa_mensal in zip(periodos, taxas_vista, taxas_mensal)]
+
+def montar_grade_coletiva(tabuas, idades, sexos, periodos, taxa_juros):
+    """
+    Monta a grade coletiva inteira a partir das fatias (tábua, sexo) do cache em
+    disco e do pool, retornando (taxa_vista, taxa_mensal): matrizes numpy de forma
+    (tábua, sexo, idade, período) com as taxas em fração.
+    """
+    forma = (len(tabuas), len(sexos), len(idades), len(periodos))
+    taxa_vista = np.zeros(forma)
+    taxa_mensal = np.zeros(forma)
+    for indice_tabua, indice_sexo, vistas, mensais in iterar_fatias_coletivas(tabuas, idades, sexos, periodos, taxa_juros):
+        taxa_vista[indice_tabua, indice_sexo] = vistas
+        taxa_mensal[indice_tabua, indice_sexo] = mensais
+    return taxa_vista, taxa_mensal
+
+def matriz_para_json(matriz):
+    """Converte uma matriz numpy em listas aninhadas para JSON (valores não finitos viram null)."""
+    finitos = np.isfinite(matriz)
+    if finitos.all():
+        return matriz.tolist()
+    return np.where(finitos, matriz, None).tolist()
+
+def montar_resposta_colunar(parametros):
+    """
+    Resposta compacta do cálculo coletivo: os eixos (idades e períodos) uma única
+    vez e, para cada (tábua, sexo), as matrizes idade × período de taxa_vista e
+    taxa_mensal em fração (sem o "%"; a formatação fica com o cliente).
+    """
+    tabuas = parametros['tabuas_validas'] + parametros['tabuas_invalidas']
+    tipos = ["Válido"] * len(parametros['tabuas_validas']) + ["Inválido"] * len(parametros['tabuas_invalidas'])
+    sexos = parametros['sexos']
+    idades = range(parametros['idade_min'], parametros['idade_max'] + 1)
+    periodos = range(parametros['periodo_min'], parametros['periodo_max'] + 1)
+    
+    taxa_vista, taxa_mensal = montar_grade_coletiva(tabuas, idades, sexos, periodos, parametros['taxa_juros'])
+    
+    return {
+        "success": True,
+        "formato": "columnar",
+        "total_combinacoes": taxa_vista.size,
+        "idades": list(idades),
+        "periodos": list(periodos),
+        "matrizes": [{
+            "tabua": tabua_nome,
+            "tipo_tabua": tipo_tabua,
+            "sexo": sexo,
+            "taxa_vista": matriz_para_json(taxa_vista[indice_tabua, indice_sexo]),
+            "taxa_mensal": matriz_para_json(taxa_mensal[indice_tabua, indice_sexo])
+        } for indice_tabua, (tabua_nome, tipo_tabua) in enumerate(zip(tabuas, tipos))
+          for indice_sexo, sexo in enumerate(sexos)],
+        "tabuas_utilizadas": list(set(tabuas))
+    }
+
+def calcular_coletivo_paralelo(idade_min, idade_max, sexos, periodo_min, periodo_max, 
+                              taxa_juros, tabuas_validas, tabuas_invalidas):
+    """
+    Cálculo coletivo pela grade vetorizada, distribuída em fatias (tábua, sexo)
+    pelo pool de processos persistente.
+    
+    Devolve as linhas na ordem tábua, idade, sexo, período (as mesmas de
+    gerar_lotes_coletivo, usado pelo streaming e pelos jobs).
+    """
+    print(f"Processando {(len(tabuas_validas) + len(tabuas_invalidas)) * len(sexos)} fatias (tábua, sexo) da grade coletiva...")
+    inicio = time.time()
+    
+    parametros = {
+        'idade_min': idade_min,
+        'idade_max': idade_max,
+        'sexos': sexos,
+        'periodo_min': periodo_min,
+        'periodo_max': periodo_max,
+        'taxa_juros': taxa_juros,
+        'tabuas_validas': tabuas_validas,
+        'tabuas_invalidas': tabuas_invalidas
+    }
+    resultados = [linha for lote in gerar_lotes_coletivo(parametros) for linha in lote]
+    
+    tempo_total = time.time() - inicio
+    print(f"Processamento concluido em {tempo_total:.2f} segundos")
+    print(f"Velocidade: {len(resultados)/max(tempo_total, 1e-9):.1f} combinacoes/segundo")
+    
+    return resultados
+
+def gerar_lotes_coletivo(parametros):
+    """
+    Gera as linhas do cálculo coletivo em lotes, um lote por tábua, na ordem
+    tábua, idade, sexo, período. Tábuas inexistentes ficam com taxa 0.
+    
+    As fatias (tábua, sexo) chegam do motor paralelo fora de ordem; cada tábua
+    é enviada assim que as suas fatias e as das tábuas anteriores ficam prontas,
+    então a resposta síncrona, o streaming e os jobs trazem as mesmas linhas.
+    """
+    tabuas = list(parametros['tabuas_validas']) + list(parametros['tabuas_invalidas'])
+    tipos = ["Válido"] * len(parametros['tabuas_validas']) + ["Inválido"] * len(parametros['tabuas_invalidas'])
+    sexos = parametros['sexos']
+    idades = range(parametros['idade_min'], parametros['idade_max'] + 1)
+    periodos = range(parametros['periodo_min'], parametros['periodo_max'] + 1)
+    
+    prontas = {}  # indice_tabua -> {indice_sexo: (vistas, mensais)}
+    proxima_tabua = 0
+    for indice_tabua, indice_sexo, vistas, mensais in iterar_fatias_coletivas(
+            tabuas, idades, sexos, periodos, parametros['taxa_juros']):
+        prontas.setdefault(indice_tabua, {})[indice_sexo] = (vistas, mensais)
+        
+        while proxima_tabua < len(tabuas) and len(prontas.get(proxima_tabua, ())) == len(sexos):
+            fatias = prontas.pop(proxima_tabua)
+            lote = []
+            for indice_idade, idade in enumerate(idades):
+                for indice_sexo, sexo in enumerate(sexos):
+                    vistas, mensais = fatias[indice_sexo]
+                    lote.extend(formatar_linhas_coletivo(
+                        tabuas[proxima_tabua], tipos[proxima_tabua], idade, sexo, periodos,
+                        vistas[indice_idade].tolist(), mensais[indice_idade].tolist()
+                    ))
+            yield lote
+            proxima_tabua += 1
+
+def extrair_parametros_postalis(data):
+    """
+    Extrai e valida os parâmetros do cálculo coletivo prestamista (Postalis).
+    
+    Returns:
+        Dicionário com idade_min, idade_max, sexos, parcelas_min, parcelas_max,
+        taxa_juros (decimal), valor_financiamento, periodo_total,
+        tabuas_validas e tabuas_invalidas
+    """
+    idade_min = int(data['idade_min'])
+    idade_max = int(data['idade_max'])
+    sexos = data['sexos']
+    parcelas_min = int(data['parcelas_min'])
+    parcelas_max = int(data['parcelas_max'])
+    taxa_juros = float(data['taxa_juros']) / 100
+    valor_financiamento = float(data['valor_financiamento'])
+    periodo_total = int(data['periodo_total'])
+    tabuas_validas = data['tabuas_validas']
+    tabuas_invalidas = data['tabuas_invalidas']
+    
+    # Validação dos limites
+    if not (0 <= idade_min <= idade_max <= 99):
+        raise ValueError("As idades devem estar entre 0 e 99 anos, e a idade mínima deve ser menor ou igual à máxima.")
+    
+    if not (1 <= parcelas_min <= parcelas_max <= 120):
+        raise ValueError("As parcelas restantes devem estar entre 1 e 120, e as parcelas mínimas devem ser menores ou iguais às máximas.")
+    
+    if not (0 <= taxa_juros <= 0.30):  # 0% a 30%
+        raise ValueError("A taxa de juros deve estar entre 0% e 30%.")
+    
+    if not (1 <= valor_financiamento <= 500000):
+        raise ValueError("O valor do financiamento deve estar entre R$ 1,00 e R$ 500.000,00.")
+    
+    if not (periodo_total == 120):
+        raise ValueError("O período total deve ser 120 meses.")
+    
+    if len(sexos) == 0:
+        raise ValueError("Selecione pelo menos um sexo.")
+    
+    if len(tabuas_validas) == 0 and len(tabuas_invalidas) == 0:
+        raise ValueError("Selecione pelo menos uma tábua válida ou inválida.")
+    
+    return {
+        'idade_min': idade_min,
+        'idade_max': idade_max,
+        'sexos': sexos,
+        'parcelas_min': parcelas_min,
+        'parcelas_max': parcelas_max,
+        'taxa_juros': taxa_juros,
+        'valor_financiamento': valor_financiamento,
+        'periodo_total': periodo_total,
+        'tabuas_validas': tabuas_validas,
+        'tabuas_invalidas': tabuas_invalidas
+    }
+
+def processar_fatias_postalis(args):
+    """
+    Calcula em um worker os prêmios do prestamista (período total) de um lote de
+    fatias (tábua, sexo), para todas as idades.
+    Args: (fatias, idades, taxa_juros, valor_financiamento, periodo_total), com
+    fatias = [(indice_tabua, tabua_nome, indice_sexo, sexo), ...]. Idades cujo
+    cálculo falha ficam com None.
+    """
+    fatias, idades, taxa_juros, valor_financiamento, periodo_total = args
+    resultados = []
+    for indice_tabua, tabua_nome, indice_sexo, sexo in fatias:
+        tabua_obj = obter_tabua_cached(taxa_juros, tabua_nome)
+        premios_unicos = [None] * len(idades)
+        premios_mensais = [None] * len(idades)
+        for indice_idade, idade in enumerate(idades):
+            try:
+                resultado = calcular_seguro_prestamista(
+                    tabua_obj, idade, sexo, periodo_total, taxa_juros, valor_financiamento
+                )
+                premios_unicos[indice_idade] = resultado['premio_unico']
+                premios_mensais[indice_idade] = resultado['premio_mensal']
+            except Exception as e:
+                print(f"Erro ao calcular {idade}, {sexo}, {tabua_nome}: {e}")
+        resultados.append((indice_tabua, indice_sexo, premios_unicos, premios_mensais))
+    return resultados
+
+def gerar_lotes_postalis(parametros):
+    """
+    Gera as linhas do cálculo coletivo prestamista (Postalis) em lotes,
+    um lote por (tábua, idade, sexo) com todas as parcelas restantes.
+    
+    O prêmio do período total só depende de (tábua, idade, sexo), então é
+    calculado uma única vez por combinação distinta, em fatias (tábua, sexo)
+    despachadas como as da grade coletiva. Os saldos devedores e as taxas de
+    risco de cada quantidade de parcelas restantes saem de uma coluna vetorizada.
+    """
+    taxa_juros = parametros['taxa_juros']
+    valor_financiamento = parametros['valor_financiamento']
+    periodo_total = parametros['periodo_total']
+    idades = list(range(parametros['idade_min'], parametros['idade_max'] + 1))
+    sexos = parametros['sexos']
+    parcelas = np.arange(parametros['parcelas_min'], parametros['parcelas_max'] + 1)
+    
+    # Tábuas não encontradas são substituídas pela AT-83 (ou pela primeira disponível)
+    registro = carregar_registro_tabuas()
+    tabua_substituta = 'AT-83' if 'AT-83' in registro else next(iter(registro), None)
+    tabuas_linhas = [(tipo_tabua, tabua if tabua in registro else tabua_substituta)
+                     for tipo_tabua, tabuas in (("Válido", parametros['tabuas_validas']),
+                                                ("Inválido", parametros['tabuas_invalidas']))
+                     for tabua in tabuas]
+    tabuas_linhas = [(tipo_tabua, tabua) for tipo_tabua, tabua in tabuas_linhas if tabua is not None]
+    
+    # Prêmios de cada (tábua distinta, sexo), para todas as idades
+    tabuas_distintas = list(dict.fromkeys(tabua for _, tabua in tabuas_linhas))
+    fatias = [(indice_tabua, tabua_nome, indice_sexo, sexo)
+              for indice_tabua, tabua_nome in enumerate(tabuas_distintas)
+              for indice_sexo, sexo in enumerate(sexos)]
+    premios = {}
+    for indice_tabua, indice_sexo, premios_unicos, premios_mensais in despachar_fatias(
+            processar_fatias_postalis, fatias, (idades, taxa_juros, valor_financiamento, periodo_total),
+            len(fatias) * len(idades) * periodo_total):
+        premios[tabuas_distintas[indice_tabua], sexos[indice_sexo]] = (premios_unicos, premios_mensais)
+    
+    # Saldo devedor na parcela atual de cada quantidade de parcelas restantes
+    parcela_atual = periodo_total - parcelas + 1
+    taxa_mensal = (1 + taxa_juros)**(1/12) - 1
+    saldos_normalizados = obter_cronograma_price_normalizado(float(taxa_mensal), int(periodo_total))[0]
+    saldos_devedor = np.where(parcela_atual < periodo_total,
+                              valor_financiamento * saldos_normalizados[np.clip(parcela_atual, 0, periodo_total)], 0.0)
+    com_saldo = (saldos_devedor > 0).tolist()
+    parcelas = parcelas.tolist()
+    
+    for tipo_tabua, tabua in tabuas_linhas:
+        for indice_idade, idade in enumerate(idades):
+            for sexo in sexos:
+                premios_unicos, premios_mensais = premios[tabua, sexo]
+                premio_unico = premios_unicos[indice_idade]
+                premio_mensal = premios_mensais[indice_idade]
+                if premio_unico is None:
+                    yield []
+                    continue
+                
+                # Calcular taxas de risco
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    taxas_risco_anual = (premio_unico / saldos_devedor * 100).tolist()
+                    taxas_risco_mensal = (premio_mensal / saldos_devedor * 100).tolist()
+                
+                yield [{
+                    "idade": idade,
+                    "sexo": sexo,
+                    "parcelas_restantes": parcelas_restantes,
+                    "tipo_tabua": tipo_tabua,
+                    "tabua": tabua,
+                    "premio_anual": premio_unico,
+                    "premio_mensal": premio_mensal,
+                    "taxa_risco_anual": taxas_risco_anual[indice] if com_saldo[indice] else 0,
+                    "taxa_risco_mensal": taxas_risco_mensal[indice] if com_saldo[indice] else 0
+                } for indice, parcelas_restantes in enumerate(parcelas)]
+
+def limpar_cache_tabuas():
+    """Limpa o cache de tábuas (memória) e o cache de resultados em disco."""
+    global TABUAS_CACHE
+    TABUAS_CACHE.clear()
+    with _COMUTACAO_LOCK:
+        COMUTACAO_CACHE.clear()
+        COMUTACAO_ESTATISTICAS['hits'] = 0
+        COMUTACAO_ESTATISTICAS['misses'] = 0
+        KERNEL_MENSAL_CACHE.clear()
+    obter_cronograma_price_normalizado.cache_clear()
+    calcular_taxas_seguro_cached.cache_clear()
+    cache = obter_cache_resultados()
+    if cache is not None:
+        cache.limpar()
+    limpar_cache_planilhas()
+    print("🧹 Cache de tábuas limpo")
+
+def obter_estatisticas_cache():
+    """Retorna estatísticas do cache."""
+    cache = obter_cache_resultados()
+    return {
+        "tabulas_em_cache": len(TABUAS_CACHE),
+        "cache_hits": calcular_taxas_seguro_cached.cache_info().hits,
+        "cache_misses": calcular_taxas_seguro_cached.cache_info().misses,
+        "tamanho_cache": calcular_taxas_seguro_cached.cache_info().currsize,
+        "comutacao_em_cache": len(COMUTACAO_CACHE),
+        "comutacao_hits": COMUTACAO_ESTATISTICAS['hits'],
+        "comutacao_misses": COMUTACAO_ESTATISTICAS['misses'],
+        "kernels_mensais_em_cache": len(KERNEL_MENSAL_CACHE),
+        "cronogramas_price_em_cache": obter_cronograma_price_normalizado.cache_info().currsize,
+        "cronogramas_price_hits": obter_cronograma_price_normalizado.cache_info().hits,
+        "resultados_em_disco": cache.obter_estatisticas() if cache is not None else None,
+        "planilhas_em_disco": obter_estatisticas_cache_planilhas()
+    }
+
+def taxa_risco_padrao(idades):
+    """Taxa de risco mensal padrão por faixa de idade, para quando o arquivo de taxas não tem a idade."""
+    return np.where(idades < 30, 0.0001,          # 0.01% ao mês
+                    np.where(idades < 50, 0.0005,  # 0.05% ao mês
+                             np.where(idades < 70, 0.001, 0.002)))  # 0.1% / 0.2% ao mês
+
+class IndiceTaxasRisco:
+    """
+    Índice denso das taxas de risco de um arquivo enviado, compilado uma vez por requisição.
+    
+    As taxas ficam em arrays [situação, sexo, idade, parcela], e cada consulta
+    (escalar ou um lote inteiro de empréstimo × mês) é uma indexação de array em
+    vez de filtros sobre o DataFrame. Havendo chaves repetidas, vale a primeira
+    linha do arquivo, como no filtro original.
+    
+    Atributos:
+        taxas: taxa com a busca de obter_taxa_risco_csv já resolvida (idade
+            exata, senão a mais próxima até 5 anos — primeiro abaixo, depois
+            acima —, senão a taxa padrão da faixa de idade)
+        taxas_exatas: taxa só para a chave exata, 0.001 quando ausente (como o
+            merge de calcular_vabf_vacf_otimizado)
+    """
+    
+    DISTANCIA_MAXIMA_IDADE = 5
+    TAXA_AUSENTE = 0.001
+    
+    def __init__(self, df):
+        import pandas as pd
+        
+        chaves = ['situacao', 'sexo', 'idade', 'parcela']
+        df = df[chaves + ['taxa_risco_mensal']].dropna(subset=chaves)
+        idades = pd.to_numeric(df['idade'], errors='coerce').to_numpy(dtype=np.float64)
+        parcelas = pd.to_numeric(df['parcela'], errors='coerce').to_numpy(dtype=np.float64)
+        # Idades e parcelas não inteiras nunca coincidem com uma consulta
+        inteiras = (idades == np.round(idades)) & (parcelas == np.round(parcelas))
+        df = df[inteiras].assign(idade=idades[inteiras].astype(np.int64), parcela=parcelas[inteiras].astype(np.int64))
+        df = df.drop_duplicates(subset=chaves, keep='first')
+        
+        codigos_situacao, situacoes = pd.factorize(df['situacao'])
+        codigos_sexo, sexos = pd.factorize(df['sexo'])
+        self.situacoes = {valor: indice for indice, valor in enumerate(situacoes)}
+        self.sexos = {valor: indice for indice, valor in enumerate(sexos)}
+        
+        idades = df['idade'].to_numpy()
+        parcelas = df['parcela'].to_numpy()
+        distancia = self.DISTANCIA_MAXIMA_IDADE
+        # Eixo de idades com folga para que o vizinho mais próximo caiba no índice
+        self.idade_inicial = (min(int(idades.min()), 0) if len(idades) else 0) - distancia
+        self.parcela_inicial = int(parcelas.min()) if len(parcelas) else 0
+        eixo_idades = np.arange(self.idade_inicial, (int(idades.max()) if len(idades) else 0) + distancia + 1)
+        total_parcelas = (int(parcelas.max()) - self.parcela_inicial + 1) if len(parcelas) else 0
+        forma = (len(situacoes), len(sexos), len(eixo_idades), total_parcelas)
+        
+        valores = np.full(forma, np.nan)
+        encontradas = np.zeros(forma, dtype=bool)
+        posicao = (codigos_situacao, codigos_sexo, idades - self.idade_inicial, parcelas - self.parcela_inicial)
+        valores[posicao] = pd.to_numeric(df['taxa_risco_mensal'], errors='coerce').to_numpy(dtype=np.float64)
+        encontradas[posicao] = True
+        
+        # Idade mais próxima (só idades >= 0 servem de vizinhas): -1, +1, -2, +2, ...
+        self.taxas = valores.copy()
+        pendentes = ~encontradas
+        vizinhas = encontradas & (eixo_idades >= 0)[:, None]
+        for diferenca in range(1, distancia + 1):
+            for deslocamento in (-diferenca, diferenca):
+                usar = np.zeros(forma, dtype=bool)
+                origem = np.zeros(forma)
+                if deslocamento < 0:
+                    usar[:, :, diferenca:] = pendentes[:, :, diferenca:] & vizinhas[:, :, :-diferenca]
+                    origem[:, :, diferenca:] = valores[:, :, :-diferenca]
+                else:
+                    usar[:, :, :-diferenca] = pendentes[:, :, :-diferenca] & vizinhas[:, :, diferenca:]
+                    origem[:, :, :-diferenca] = valores[:, :, diferenca:]
+                self.taxas[usar] = origem[usar]
+                pendentes &= ~usar
+        
+        # Sem vizinha: taxa padrão da faixa de idade
+        padrao = np.broadcast_to(taxa_risco_padrao(eixo_idades)[:, None], forma)
+        self.taxas[pendentes] = padrao[pendentes]
+        self.taxas_exatas = np.where(encontradas & ~np.isnan(valores), valores, self.TAXA_AUSENTE)
+        
+        for array in (self.taxas, self.taxas_exatas):
+            array.flags.writeable = False
+    
+    def taxas_risco(self, situacao, sexo, idades, parcelas, exatas=False):
+        """
+        Taxas de risco de um lote de consultas (idades e parcelas como arrays, com broadcast).
+        
+        Com exatas=True só vale a chave exata (0.001 quando ausente); senão aplica
+        a busca completa de obter_taxa_risco_csv.
+        """
+        idades, parcelas = np.broadcast_arrays(np.asarray(idades, dtype=np.int64), np.asarray(parcelas, dtype=np.int64))
+        indice_situacao = self.situacoes.get(situacao)
+        indice_sexo = self.sexos.get(sexo)
+        ausente = np.full(idades.shape, self.TAXA_AUSENTE) if exatas else taxa_risco_padrao(idades)
+        if indice_situacao is None or indice_sexo is None:
+            return ausente
+        
+        tabela = (self.taxas_exatas if exatas else self.taxas)[indice_situacao, indice_sexo]
+        posicao_idade = idades - self.idade_inicial
+        posicao_parcela = parcelas - self.parcela_inicial
+        dentro = ((posicao_idade >= 0) & (posicao_idade < tabela.shape[0])
+                  & (posicao_parcela >= 0) & (posicao_parcela < tabela.shape[1]))
+        valores = tabela[np.where(dentro, posicao_idade, 0), np.where(dentro, posicao_parcela, 0)] if tabela.size else ausente
+        return np.where(dentro, valores, ausente)
+    
+    def taxa_risco(self, situacao, sexo, idade, parcela):
+        """Taxa de risco de uma única consulta (busca completa de obter_taxa_risco_csv)."""
+        return float(self.taxas_risco(situacao, sexo, idade, parcela))
+
+def obter_indice_taxas(df):
+    """
+    Compila o DataFrame de taxas de risco em um IndiceTaxasRisco (devolve o próprio
+    índice se já compilado, e None para arquivo ausente ou vazio).
+    """
+    if df is None or isinstance(df, IndiceTaxasRisco):
+        return df
+    if df.empty:
+        return None
+    return IndiceTaxasRisco(df)
+
+def calcular_vabf_vacf_otimizado(tabua_obj, saldo_devedor, parcelas_restantes,
+                                 idade, sexo, situacao, df, taxa_juros, tabua):
+    """Calcula o VABF, o VACF e a reserva matemática (VABF − VACF) de um empréstimo."""
+    try:
+        # ===== PRÉ-COMPUTAÇÕES BÁSICAS =====
+        taxa_mensal = (1 + taxa_juros)**(1/12) - 1
+        v = 1 / (1 + taxa_mensal)
+        
+        # ===== SALDO DEVEDOR (PRICE) NO INÍCIO DE CADA MÊS =====
+        # Cronograma normalizado cacheado por (taxa, prazo), escalado pelo saldo
+        saldos_devedor = calcular_cronograma_price(saldo_devedor, taxa_mensal, parcelas_restantes)['saldo_devedor'][:-1]
+        
+        # ===== PRÉ-COMPUTAÇÃO DAS IDADES E PROBABILIDADES =====
+        meses = np.arange(1, parcelas_restantes + 1)
+        
+        # Probabilidades mensais lidas do kernel pré-calculado da tábua (sem laço)
+        kernel = obter_kernel_mensal(tabua_obj, sexo)
+        meses_idade = int(idade) * 12 + meses - 1
+        qx_mensais = kernel.qx(meses_idade)
+        p_mensais = 1 - qx_mensais
+        
+        # ===== _{t-1}P_x: PRODUTO ACUMULADO JÁ PRONTO NO KERNEL =====
+        prob_sobrevivencia_acumulada = kernel.sobrevivencia[min(int(idade), IDADES_TABUA), :parcelas_restantes]
+        
+        # ===== CÁLCULO ULTRA VETORIZADO DAS TAXAS DE RISCO =====
+        anos_transcorridos = (meses - 1) // 12
+        idades_para_taxa = idade + anos_transcorridos
+        parcelas_para_taxa = parcelas_restantes - (anos_transcorridos * 12)
+        
+        # Lookup no índice denso de taxas (df pode ser o DataFrame ou o índice já compilado)
+        indice_taxas = obter_indice_taxas(df)
+        if indice_taxas is not None:
+            taxas_risco = indice_taxas.taxas_risco(situacao, sexo, idades_para_taxa, parcelas_para_taxa, exatas=True)
+        else:
+            # Taxa padrão vetorizada baseada na idade
+            taxas_risco = taxa_risco_padrao(idades_para_taxa)
+        
+        # ===== CÁLCULOS FINAIS CORRIGIDOS =====
+        # Pré-computar fatores de desconto
+        fatores_desconto = v ** meses
+        
+        # Probabilidade de morte no mês t (como no método iterativo)
+        prob_morte = prob_sobrevivencia_acumulada * qx_mensais
+        
+        # VABF = Σ B_{t-1} × _{t-1}P_x × q_{x+t-1} × v^t
+        vabf_otimizado = np.sum(saldos_devedor * prob_morte * fatores_desconto)
+        
+        # VACF = Σ premio_mes × prob_sobrevivencia_fim_mes × v^t
+        # onde premio_mes = taxa_risco × saldo_devedor
+        premios_mensais = taxas_risco * saldos_devedor
+        prob_sobrevivencia_fim_mes = prob_sobrevivencia_acumulada * p_mensais
+        vacf_otimizado = np.sum(premios_mensais * prob_sobrevivencia_fim_mes * fatores_desconto)
+        
+        # Calcular reserva matemática
+        reserva_otimizada = vabf_otimizado - vacf_otimizado
+        
+        return {
+            'vabf_otimizado': vabf_otimizado,
+            'vacf_otimizado': vacf_otimizado,
+            'reserva_otimizada': reserva_otimizada,
+            'sucesso': True
+        }
+        
+    except Exception as e:
+        return {
+            'vabf_otimizado': None,
+            'vacf_otimizado': None,
+            'reserva_otimizada': None,
+            'sucesso': False,
+            'erro': str(e)
+        }
+
+class ArquivoEnviado:
+    """
+    Arquivo de um upload multipart. O conteúdo fica num SpooledTemporaryFile (em
+    memória até LIMITE_MEMORIA_UPLOAD, depois em disco) e o sha256 é calculado à
+    medida que os blocos chegam, sem reler o arquivo.
+    """
+    
+    def __init__(self, nome, nome_arquivo):
+        self.nome = nome
+        self.nome_arquivo = nome_arquivo
+        self.arquivo = tempfile.SpooledTemporaryFile(max_size=LIMITE_MEMORIA_UPLOAD)
+        self.tamanho = 0
+        self.sha256 = None
+        self._hash = hashlib.sha256()
+    
+    def escrever(self, dados):
+        self.arquivo.write(dados)
+        self._hash.update(dados)
+        self.tamanho += len(dados)
+    
+    def finalizar(self):
+        self.sha256 = self._hash.hexdigest()
+        self.arquivo.seek(0)
+    
+    def abrir(self):
+        """Arquivo posicionado no início, pronto para uma nova leitura (pd.read_excel etc.)."""
+        self.arquivo.seek(0)
+        return self.arquivo
+    
+    def fechar(self):
+        self.arquivo.close()
+
+class FormularioMultipart:
+    """Campos de texto e arquivos (ArquivoEnviado) de um corpo multipart/form-data."""
+    
+    def __init__(self):
+        self.campos = {}
+        self.arquivos = {}
+    
+    def fechar(self):
+        for arquivo in self.arquivos.values():
+            arquivo.fechar()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.fechar()
+
+def extrair_boundary(content_type):
+    """Boundary (bytes) de um Content-Type multipart/form-data, com ou sem aspas."""
+    encontrado = re.search(r'boundary=(?:"([^"]+)"|([^;\s]+))', content_type, re.IGNORECASE)
+    if not encontrado:
+        raise ValueError("Boundary não encontrado no Content-Type")
+    return (encontrado.group(1) or encontrado.group(2)).encode('latin-1')
+
+def ler_cabecalhos_parte(cabecalhos):
+    """(name, filename) do Content-Disposition de uma parte multipart (filename é None para campos)."""
+    texto = cabecalhos.decode('utf-8', 'replace')
+    nome = re.search(r';\s*name="([^"]*)"', texto)
+    nome_arquivo = re.search(r';\s*filename="([^"]*)"', texto)
+    return (nome.group(1) if nome else None), (nome_arquivo.group(1) if nome_arquivo else None)
+
+def ler_multipart(entrada, content_type, content_length, tamanho_bloco=TAMANHO_BLOCO_UPLOAD):
+    """
+    Lê um corpo multipart/form-data de `entrada` (o socket da requisição ou
+    qualquer arquivo) em blocos de tamanho_bloco, consumindo exatamente
+    content_length bytes e sem montar o corpo inteiro em memória.
+    
+    Retorna um FormularioMultipart: campos como texto e partes com filename como
+    ArquivoEnviado (disco acima de LIMITE_MEMORIA_UPLOAD, sha256 já calculado).
+    O delimitador pode chegar partido entre dois blocos: o final de cada bloco
+    que ainda pode ser o início dele só é escrito quando o próximo bloco chega.
+    """
+    delimitador = b'\r\n--' + extrair_boundary(content_type)
+    formulario = FormularioMultipart()
+    restante = content_length
+    # O corpo começa com "--boundary": com \r\n na frente, todos os delimitadores ficam iguais
+    buffer = bytearray(b'\r\n')
+    parte = None  # ArquivoEnviado ou bytearray do campo que está sendo lido
+    nome = None
+    
+    def ler_bloco():
+        nonlocal restante
+        bloco = entrada.read(min(tamanho_bloco, restante)) if restante > 0 else b''
+        restante -= len(bloco)
+        if not bloco:
+            raise ValueError("Corpo multipart incompleto")
+        buffer.extend(bloco)
+    
+    def escrever(dados):
+        if isinstance(parte, ArquivoEnviado):
+            parte.escrever(dados)
+        elif parte is not None:
+            if len(parte) + len(dados) > LIMITE_MEMORIA_UPLOAD:
+                raise ValueError(f"Campo '{nome}' excede o tamanho máximo")
+            parte.extend(dados)
+    
+    try:
+        while True:
+            # Conteúdo da parte (ou preâmbulo) até o próximo delimitador
+            posicao = buffer.find(delimitador)
+            while posicao == -1:
+                seguro = len(buffer) - len(delimitador) + 1
+                if seguro > 0:
+                    escrever(bytes(buffer[:seguro]))
+                    del buffer[:seguro]
+                ler_bloco()
+                posicao = buffer.find(delimitador)
+            escrever(bytes(buffer[:posicao]))
+            del buffer[:posicao + len(delimitador)]
+            
+            if isinstance(parte, ArquivoEnviado):
+                parte.finalizar()
+                anterior = formulario.arquivos.pop(nome, None)
+                if anterior is not None:
+                    anterior.fechar()
+                formulario.arquivos[nome] = parte
+            elif parte is not None:
+                formulario.campos[nome] = parte.decode('utf-8')
+            parte = None
+            
+            # "--" depois do delimitador encerra o corpo; senão vêm os cabeçalhos da próxima parte
+            while len(buffer) < 2:
+                ler_bloco()
+            if buffer[:2] == b'--':
+                break
+            fim_linha = buffer.find(b'\r\n')
+            while fim_linha == -1:
+                ler_bloco()
+                fim_linha = buffer.find(b'\r\n')
+            del buffer[:fim_linha + 2]
+            
+            fim_cabecalhos = buffer.find(b'\r\n\r\n')
+            while fim_cabecalhos == -1:
+                if len(buffer) > MAX_TAMANHO_CABECALHO_UPLOAD:
+                    raise ValueError("Cabeçalhos da parte multipart muito grandes")
+                ler_bloco()
+                fim_cabecalhos = buffer.find(b'\r\n\r\n')
+            nome, nome_arquivo = ler_cabecalhos_parte(bytes(buffer[:fim_cabecalhos]))
+            del buffer[:fim_cabecalhos + 4]
+            if nome is not None:
+                parte = ArquivoEnviado(nome, nome_arquivo) if nome_arquivo is not None else bytearray()
+        
+        # Epílogo (normalmente só o \r\n final): consumido para não sobrar no socket
+        while restante > 0:
+            bloco = entrada.read(min(tamanho_bloco, restante))
+            if not bloco:
+                break
+            restante -= len(bloco)
+    except BaseException:
+        if isinstance(parte, ArquivoEnviado):
+            parte.fechar()
+        formulario.fechar()
+        raise
+    
+    return formulario
+
+def caminho_cache_planilha(sha256, tipo, extensao):
+    """Caminho no cache de planilhas para o conteúdo (sha256), o tipo de leitura e a versão."""
+    return Path(DIRETORIO_CACHE_PLANILHAS) / f"{tipo}-v{VERSAO_CACHE_PLANILHAS}-{sha256}.{extensao}"
+
+def gravar_cache_planilha(caminho, gravar):
+    """
+    Grava um arquivo do cache de planilhas de forma atômica (arquivo temporário +
+    os.replace) e remove os menos usados acima de MAX_ARQUIVOS_CACHE_PLANILHAS.
+    """
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=caminho.parent, suffix='.tmp')
+    try:
+        with os.fdopen(descritor, 'wb') as arquivo:
+            gravar(arquivo)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.unlink(temporario)
+        raise
+    
+    arquivos = sorted((item for item in caminho.parent.iterdir() if item.suffix != '.tmp'),
+                      key=lambda item: item.stat().st_mtime)
+    for antigo in arquivos[:max(0, len(arquivos) - MAX_ARQUIVOS_CACHE_PLANILHAS)]:
+        antigo.unlink(missing_ok=True)
+
+def salvar_dataframe_npz(df, arquivo):
+    """
+    Grava um DataFrame em formato colunar (.npz, sem pickle): colunas numéricas e
+    de datas como arrays numpy, colunas de texto como strings + máscara de ausentes.
+    Levanta ValueError para colunas que não voltariam idênticas (tipos misturados).
+    """
+    import pandas as pd
+    
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        raise ValueError("Índice do DataFrame não suportado pelo cache")
+    
+    colunas = {}
+    descricao = []
+    for posicao, nome in enumerate(df.columns):
+        coluna = df[nome]
+        if isinstance(coluna.dtype, np.dtype) and coluna.dtype.kind in 'biufcmM':
+            colunas[f'coluna_{posicao}'] = coluna.to_numpy()
+            descricao.append([nome, 'numero', str(coluna.dtype)])
+            continue
+        
+        ausentes = coluna.isna().to_numpy()
+        valores = coluna.to_numpy(dtype=object)
+        if not all(isinstance(valor, str) for valor in valores[~ausentes]):
+            raise ValueError(f"Coluna '{nome}' com tipos misturados não suportada pelo cache")
+        colunas[f'coluna_{posicao}'] = np.array(np.where(ausentes, '', valores).tolist(), dtype=str)
+        colunas[f'ausentes_{posicao}'] = ausentes
+        descricao.append([nome, 'texto', str(coluna.dtype)])
+    
+    colunas['descricao'] = np.array(json.dumps({'colunas': descricao, 'linhas': len(df)}, ensure_ascii=False))
+    np.savez_compressed(arquivo, **colunas)
+
+def carregar_dataframe_npz(caminho):
+    """Lê um DataFrame gravado por salvar_dataframe_npz."""
+    import pandas as pd
+    
+    with np.load(caminho, allow_pickle=False) as arquivo:
+        descricao = json.loads(str(arquivo['descricao']))
+        dados = {}
+        for posicao, (nome, tipo, dtype) in enumerate(descricao['colunas']):
+            valores = arquivo[f'coluna_{posicao}']
+            if tipo == 'texto':
+                valores = np.where(arquivo[f'ausentes_{posicao}'], np.nan, valores.astype(object))
+                dados[nome] = pd.Series(valores, dtype=object).astype(dtype)
+            else:
+                dados[nome] = valores
+    return pd.DataFrame(dados, index=pd.RangeIndex(descricao['linhas']))
+
+def ler_planilha_cached(enviado, tipo, ler):
+    """
+    DataFrame normalizado de uma planilha enviada (ArquivoEnviado): do cache em
+    disco quando o mesmo arquivo (mesmo sha256) já foi lido com a mesma função de
+    leitura (tipo); senão, ler(arquivo) e grava o resultado no cache.
+    """
+    if not DIRETORIO_CACHE_PLANILHAS:
+        return ler(enviado.abrir())
+    
+    caminho = caminho_cache_planilha(enviado.sha256, tipo, 'npz')
+    if caminho.exists():
+        try:
+            df = carregar_dataframe_npz(caminho)
+            os.utime(caminho)  # Marca como usado recentemente
+            print(f"Planilha '{tipo}' lida do cache ({caminho.name[:24]}...)")
+            return df
+        except Exception as e:
+            print(f"Cache de planilha ignorado ({caminho.name}): {e}")
+    
+    df = ler(enviado.abrir())
+    try:
+        gravar_cache_planilha(caminho, lambda arquivo: salvar_dataframe_npz(df, arquivo))
+    except Exception as e:
+        print(f"Planilha '{tipo}' não gravada no cache: {e}")
+    return df
+
+def obter_preview_cached(enviado, tipo, gerar):
+    """Preview (JSON) gerar(arquivo, tipo) de uma planilha enviada, do cache em disco pelo sha256 do arquivo."""
+    if not DIRETORIO_CACHE_PLANILHAS:
+        return gerar(enviado.abrir(), tipo)
+    
+    caminho = caminho_cache_planilha(enviado.sha256, f'preview-{tipo}', 'json')
+    if caminho.exists():
+        try:
+            preview = json.loads(caminho.read_text(encoding='utf-8'))
+            os.utime(caminho)
+            return preview
+        except Exception as e:
+            print(f"Cache de preview ignorado ({caminho.name}): {e}")
+    
+    preview = gerar(enviado.abrir(), tipo)
+    try:
+        gravar_cache_planilha(caminho, lambda arquivo: arquivo.write(json.dumps(preview, ensure_ascii=False).encode('utf-8')))
+    except Exception as e:
+        print(f"Preview não gravado no cache: {e}")
+    return preview
+
+def limpar_cache_planilhas():
+    """Remove os arquivos do cache de planilhas em disco."""
+    if DIRETORIO_CACHE_PLANILHAS and os.path.isdir(DIRETORIO_CACHE_PLANILHAS):
+        for item in Path(DIRETORIO_CACHE_PLANILHAS).iterdir():
+            item.unlink(missing_ok=True)
+
+def obter_estatisticas_cache_planilhas():
+    """Número de arquivos e bytes do cache de planilhas em disco (None se desativado)."""
+    if not DIRETORIO_CACHE_PLANILHAS:
+        return None
+    arquivos = list(Path(DIRETORIO_CACHE_PLANILHAS).iterdir()) if os.path.isdir(DIRETORIO_CACHE_PLANILHAS) else []
+    return {
+        "diretorio": DIRETORIO_CACHE_PLANILHAS,
+        "arquivos": len(arquivos),
+        "bytes": sum(item.stat().st_size for item in arquivos),
+        "max_arquivos": MAX_ARQUIVOS_CACHE_PLANILHAS
+    }
+
+def ler_planilha_taxas(arquivo):
+    """Lê o arquivo de taxas de risco (xlsx) da reserva coletiva e normaliza as colunas."""
+    import pandas as pd
+    
+    # Processar arquivo de taxas de risco
+    df_taxas = pd.read_excel(arquivo, engine='openpyxl')
+    
+    # Mapear colunas do arquivo de taxas
+    colunas_esperadas_taxas = ['idade', 'sexo', 'situacao', 'parcela', 'taxa_risco_mensal']
+    colunas_originais_taxas = list(df_taxas.columns)
+    
+    if not all(col in df_taxas.columns for col in colunas_esperadas_taxas):
+        # Mapear colunas
+        mapeamento_taxas = {
+            'Idade': 'idade',
+            'Sexo': 'sexo',
+            'Parcelas Restantes': 'parcela',
+            'Tipo Tábua': 'situacao',
+            'Taxa Risco Mensal (%)': 'taxa_risco_mensal'
+        }
+        
+        colunas_mapeadas_taxas = {}
+        for col_original, col_nova in mapeamento_taxas.items():
+            if col_original in df_taxas.columns:
+                colunas_mapeadas_taxas[col_original] = col_nova
+        
+        if colunas_mapeadas_taxas:
+            df_taxas = df_taxas.rename(columns=colunas_mapeadas_taxas)
+            df_taxas['situacao'] = df_taxas['situacao'].map({'Válido': 'valido', 'Inválido': 'invalido'})
+            df_taxas['sexo'] = df_taxas['sexo'].map({'Masculino': 'M', 'Feminino': 'F'})
+            df_taxas['parcela'] = df_taxas['parcela'].astype(int)
+            df_taxas['taxa_risco_mensal'] = df_taxas['taxa_risco_mensal'].astype(float) / 100
+        else:
+            raise ValueError("Não foi possível mapear as colunas do arquivo de taxas")
+    
+    return df_taxas
+
+def ler_planilha_emprestimos(arquivo):
+    """Lê o arquivo de empréstimos (xlsx) da reserva coletiva e normaliza as colunas."""
+    import pandas as pd
+    
+    # Processar arquivo de empréstimos
+    return normalizar_emprestimos(pd.read_excel(arquivo, engine='openpyxl'))
+
+def normalizar_emprestimos(df_emprestimos):
+    """
+    Mapeia e converte as colunas do arquivo de empréstimos: a mesma regra vale
+    para a planilha inteira e para cada bloco da leitura em streaming.
+    """
+    # Mapear colunas do arquivo de empréstimos
+    colunas_esperadas_emprestimos = ['saldo_adimplente', 'prazo_restante', 'idade', 'sexo']
+    colunas_originais_emprestimos = list(df_emprestimos.columns)
+    
+    if not all(col in df_emprestimos.columns for col in colunas_esperadas_emprestimos):
+        # Mapear colunas
+        mapeamento_emprestimos = {
+            'Saldo Adimplente': 'saldo_adimplente',
+            'Prazo Restante': 'prazo_restante',
+            'Idade': 'idade',
+            'Sexo': 'sexo'
+        }
+        
+        colunas_mapeadas_emprestimos = {}
+        for col_original, col_nova in mapeamento_emprestimos.items():
+            if col_original in df_emprestimos.columns:
+                colunas_mapeadas_emprestimos[col_original] = col_nova
+        
+        if colunas_mapeadas_emprestimos:
+            df_emprestimos = df_emprestimos.rename(columns=colunas_mapeadas_emprestimos)
+            df_emprestimos['sexo'] = df_emprestimos['sexo'].map({'Masculino': 'M', 'Feminino': 'F'})
+            df_emprestimos['saldo_adimplente'] = df_emprestimos['saldo_adimplente'].astype(float)
+            df_emprestimos['prazo_restante'] = df_emprestimos['prazo_restante'].astype(int)
+            df_emprestimos['idade'] = df_emprestimos['idade'].astype(int)
+        else:
+            raise ValueError("Não foi possível mapear as colunas do arquivo de empréstimos")
+    
+    return df_emprestimos
+
+def arquivo_eh_xlsx(arquivo):
+    """True se o arquivo começa com a assinatura zip de um .xlsx; senão é tratado como CSV."""
+    arquivo.seek(0)
+    assinatura = arquivo.read(4)
+    arquivo.seek(0)
+    return assinatura == b'PK\x03\x04'
+
+def converter_celula_csv(valor, decimal_virgula):
+    """Valor de uma célula CSV: vazio vira None e números viram int/float (com vírgula decimal se o separador for ';')."""
+    valor = valor.strip()
+    if not valor:
+        return None
+    numero = valor.replace('.', '').replace(',', '.') if decimal_virgula and ',' in valor else valor
+    for conversao in (int, float):
+        try:
+            return conversao(numero)
+        except ValueError:
+            pass
+    return valor
+
+def abrir_linhas_emprestimos(arquivo):
+    """
+    Abre o arquivo de empréstimos para leitura linha a linha, sem carregá-lo
+    inteiro: xlsx pelo iterador do openpyxl em modo read_only (primeira
+    planilha, como o pd.read_excel) ou CSV separado por ',', ';' ou tab.
+    
+    Retorna (colunas, linhas, total_estimado). As colunas seguem os nomes do
+    pd.read_excel ('Unnamed: n' para cabeçalhos vazios); total_estimado vem da
+    dimensão gravada na planilha e é None para CSV.
+    """
+    if arquivo_eh_xlsx(arquivo):
+        workbook = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+        planilha = workbook.worksheets[0]
+        total_estimado = planilha.max_row - 1 if planilha.max_row else None
+        
+        def iterar_linhas():
+            try:
+                yield from planilha.iter_rows(values_only=True)
+            finally:
+                workbook.close()
+    else:
+        texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+        primeira_linha = texto.readline()
+        try:
+            dialeto = csv.Sniffer().sniff(primeira_linha, delimiters=',;\t')
+        except csv.Error:
+            dialeto = csv.excel
+        total_estimado = None
+        
+        def iterar_linhas():
+            try:
+                linhas_csv = csv.reader(itertools.chain([primeira_linha], texto), dialeto)
+                cabecalho = next(linhas_csv, None)
+                if cabecalho is not None:
+                    yield tuple(valor.strip() or None for valor in cabecalho)
+                for linha in linhas_csv:
+                    yield tuple(converter_celula_csv(valor, dialeto.delimiter == ';') for valor in linha)
+            finally:
+                if not arquivo.closed:
+                    texto.detach()  # Não fecha o arquivo do upload junto com o leitor de texto
+    
+    linhas = iterar_linhas()
+    cabecalho = next(linhas, None)
+    if cabecalho is None:
+        raise ValueError("Arquivo de empréstimos vazio")
+    
+    colunas = []
+    for posicao, nome in enumerate(cabecalho):
+        nome = f'Unnamed: {posicao}' if nome is None else nome
+        original, repeticao = nome, 0
+        while nome in colunas:
+            repeticao += 1
+            nome = f'{original}.{repeticao}'
+        colunas.append(nome)
+    return colunas, linhas, total_estimado
+
+def gerar_blocos_emprestimos(colunas, linhas, tamanho_bloco=None):
+    """
+    DataFrames normalizados de até tamanho_bloco empréstimos, montados à medida
+    que as linhas são lidas. Como no pd.read_excel, linhas em branco no meio
+    viram linhas vazias e as do final são descartadas.
+    """
+    import pandas as pd
+    
+    tamanho_bloco = tamanho_bloco or TAMANHO_BLOCO_INGESTAO
+    largura = len(colunas)
+    linha_vazia = (np.nan,) * largura
+    bloco = []
+    em_branco = 0
+    for linha in linhas:
+        if all(valor is None for valor in linha):
+            em_branco += 1
+            continue
+        bloco.extend([linha_vazia] * em_branco)
+        em_branco = 0
+        linha = tuple(np.nan if valor is None else valor for valor in linha[:largura])
+        bloco.append(linha + (np.nan,) * (largura - len(linha)))
+        
+        if len(bloco) >= tamanho_bloco:
+            yield normalizar_emprestimos(pd.DataFrame(bloco, columns=colunas))
+            bloco = []
+    
+    if bloco:
+        yield normalizar_emprestimos(pd.DataFrame(bloco, columns=colunas))
+
+def produzir_em_segundo_plano(itens, tamanho_fila=None):
+    """
+    Itera `itens` numa thread produtora e entrega cada item por uma fila
+    limitada: o próximo bloco é lido enquanto o atual é calculado, com no máximo
+    tamanho_fila blocos prontos em memória. Erros da produção são relançados no
+    consumidor; fechar o gerador (ou abandoná-lo) interrompe a produção.
+    """
+    fila = queue.Queue(maxsize=tamanho_fila or TAMANHO_FILA_INGESTAO)
+    parar = threading.Event()
+    
+    def entregar(mensagem):
+        while not parar.is_set():
+            try:
+                fila.put(mensagem, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def produzir():
+        try:
+            for item in itens:
+                if not entregar(('item', item)):
+                    return
+            entregar(('fim', None))
+        except BaseException as e:
+            entregar(('erro', e))
+        finally:
+            fechar = getattr(itens, 'close', None)
+            if fechar is not None:
+                fechar()
+    
+    produtor = threading.Thread(target=produzir, name='ingestao-emprestimos', daemon=True)
+    produtor.start()
+    try:
+        while True:
+            tipo, valor = fila.get()
+            if tipo == 'fim':
+                return
+            if tipo == 'erro':
+                raise valor
+            yield valor
+    finally:
+        parar.set()
+        produtor.join()
+
+def ler_planilha_taxas_individual(arquivo):
+    """Lê o arquivo de taxas de risco (xlsx) da reserva individual e normaliza as colunas."""
+    import pandas as pd
+    
+    # Ler arquivo XLSX do upload
+    try:
+        df = pd.read_excel(arquivo, engine='openpyxl')
+    except Exception as e:
+        # Erro ao ler arquivo
+        raise ValueError(f"Erro ao ler arquivo XLSX: {str(e)}")
+    
+    # Verificar se as colunas já estão no formato correto
+    colunas_esperadas = ['idade', 'sexo', 'situacao', 'parcela', 'taxa_risco_mensal']
+    colunas_originais = list(df.columns)
+    
+    # Verificando colunas do arquivo
+    
+    # Se as colunas já estão corretas, não precisa mapear
+    if not all(col in df.columns for col in colunas_esperadas):
+        # Tentar mapear colunas do arquivo para o formato esperado
+        mapeamento_colunas = {
+            'Idade': 'idade',
+            'Sexo': 'sexo', 
+            'Parcelas Restantes': 'parcela',
+            'Tipo Tábua': 'situacao',
+            'Taxa Risco Mensal (%)': 'taxa_risco_mensal'
+        }
+        
+        colunas_mapeadas = {}
+        
+        for col_original, col_nova in mapeamento_colunas.items():
+            if col_original in df.columns:
+                colunas_mapeadas[col_original] = col_nova
+                # Mapeando coluna
+        
+        if colunas_mapeadas:
+            # Renomear colunas
+            df = df.rename(columns=colunas_mapeadas)
+            
+            # Converter tipos de dados
+            df['idade'] = df['idade'].astype(int)
+            df['sexo'] = df['sexo'].map({'Masculino': 'M', 'Feminino': 'F'})
+            df['situacao'] = df['situacao'].map({'Válido': 'valido', 'Inválido': 'invalido'})
+            df['parcela'] = df['parcela'].astype(int)
+            df['taxa_risco_mensal'] = df['taxa_risco_mensal'].astype(float) / 100  # Converter de % para decimal
+        else:
+            raise ValueError("Não foi possível mapear as colunas do arquivo")
+    
+    return df
+
+def gerar_preview_planilha(arquivo, file_type):
+    """Preview das primeiras 10 linhas de uma planilha (xlsx) enviada, no formato da resposta JSON."""
+    import pandas as pd
+    
+    # Ler arquivo Excel
+    df = pd.read_excel(arquivo, engine='openpyxl')
+    
+    # Pegar apenas as primeiras 10 linhas
+    df_preview = df.head(10)
+    
+    # Converter para formato JSON
+    colunas = df_preview.columns.tolist()
+    dados = df_preview.values.tolist()
+    
+    # Formatar dados para exibição
+    dados_formatados = []
+    for linha in dados:
+        linha_formatada = []
+        for i, celula in enumerate(linha):
+            if pd.isna(celula):
+                linha_formatada.append('')
+            elif isinstance(celula, (int, float)):
+                if file_type == 'taxas' and i == 4:  # Taxa Risco Mensal
+                    linha_formatada.append(f"{celula:.6f}%")
+                elif file_type == 'emprestimos' and i == 0:  # Saldo Adimplente
+                    linha_formatada.append(f"R$ {celula:,.2f}")
+                else:
+                    linha_formatada.append(str(celula))
+            else:
+                linha_formatada.append(str(celula))
+        dados_formatados.append(linha_formatada)
+    
+    response = {
+        "success": True,
+        "colunas": colunas,
+        "dados": dados_formatados,
+        "total_linhas": len(df),
+        "tipo": file_type
+    }
+    
+    return response
+
+def ler_dados_reserva_coletiva(formulario):
+    """
+    Lê o upload multipart da reserva matemática coletiva (FormularioMultipart com os
+    arquivos de taxas de risco e de empréstimos) e devolve os DataFrames
+    normalizados, os parâmetros e as tábuas.
+    
+    Empréstimos em CSV, acima de LIMITE_INGESTAO_STREAMING bytes ou com o campo
+    ingestao=streaming são lidos em streaming: em vez de 'df_emprestimos', os
+    dados trazem 'blocos_emprestimos' (DataFrames produzidos por uma thread
+    enquanto o cálculo anda; o formulário precisa ficar aberto até o fim) e
+    'total_emprestimos' é só uma estimativa (None para CSV). O campo
+    ingestao=completa força a leitura da planilha inteira.
+    """
+    import pandas as pd
+    
+    form_data = {nome: valor.strip() for nome, valor in formulario.campos.items()}
+    taxas_file = formulario.arquivos.get('taxas_file')
+    emprestimos_file = formulario.arquivos.get('emprestimos_file')
+    
+    # Extrair parâmetros
+    taxa_juros = float(form_data.get('taxa_juros', 6.5)) / 100.0
+    tabua_validos = form_data.get('tabua_validos', 'AT-83')
+    tabua_invalidos = form_data.get('tabua_invalidos', 'AT-83')
+    
+    if not taxas_file or not taxas_file.tamanho or not emprestimos_file or not emprestimos_file.tamanho:
+        raise ValueError("Arquivos não encontrados no upload")
+    
+    # Planilhas normalizadas (do cache em disco quando o mesmo arquivo já foi lido)
+    df_taxas = ler_planilha_cached(taxas_file, 'taxas', ler_planilha_taxas)
+    
+    ingestao = form_data.get('ingestao', '')
+    if not arquivo_eh_xlsx(emprestimos_file.abrir()) or ingestao == 'streaming' or (
+            ingestao != 'completa' and emprestimos_file.tamanho > LIMITE_INGESTAO_STREAMING):
+        colunas, linhas, total_emprestimos = abrir_linhas_emprestimos(emprestimos_file.abrir())
+        try:
+            normalizar_emprestimos(pd.DataFrame(columns=colunas))  # Cabeçalho inválido falha antes do cálculo
+        except Exception:
+            linhas.close()
+            raise
+        df_emprestimos = None
+        blocos_emprestimos = produzir_em_segundo_plano(gerar_blocos_emprestimos(colunas, linhas))
+        print(f"Empréstimos em streaming (blocos de {TAMANHO_BLOCO_INGESTAO} linhas)")
+    else:
+        df_emprestimos = ler_planilha_cached(emprestimos_file, 'emprestimos', ler_planilha_emprestimos)
+        total_emprestimos = len(df_emprestimos)
+        blocos_emprestimos = None
+    
+    # OTIMIZAÇÃO: Usar cache para tábuas de mortalidade
+    print(f"Carregando tábuas de mortalidade...")
+    tabua_obj_validos = obter_tabua_cached(taxa_juros, tabua_validos)
+    tabua_obj_invalidos = obter_tabua_cached(taxa_juros, tabua_invalidos)
+    print(f"Tábuas carregadas com sucesso!")
+    
+    return {
+        'df_emprestimos': df_emprestimos,
+        'blocos_emprestimos': blocos_emprestimos,
+        'total_emprestimos': total_emprestimos,
+        'df_taxas': df_taxas,
+        'taxa_juros': taxa_juros,
+        'tabua_validos': tabua_validos,
+        'tabua_invalidos': tabua_invalidos,
+        'tabua_obj_validos': tabua_obj_validos,
+        'tabua_obj_invalidos': tabua_obj_invalidos
+    }
+
+def calcular_reservas_carteira(saldos, prazos, idades, sexos, tabua_obj, df_taxas, taxa_juros, situacao='valido'):
+    """
+    Motor vetorizado da reserva matemática coletiva: VABF e VACF da carteira inteira.
+    
+    Os empréstimos são agrupados por (sexo, prazo) e cada grupo vira uma matriz
+    empréstimo × mês (em blocos de até CELULAS_BLOCO_RESERVA células), com saldos,
+    sobrevivência, desconto e taxas de risco calculados por operações de array.
+    As fórmulas são as de calcular_vabf_vacf_otimizado, com os mesmos resultados.
+    
+    As taxas de risco de cada bloco vêm de uma única indexação no IndiceTaxasRisco.
+    Grupos que não podem ser calculados assim (sexo sem tábua, prazo inválido)
+    ficam com sucesso=False, para serem refeitos empréstimo a empréstimo.
+    
+    Args:
+        saldos, prazos, idades: Arrays com um valor por empréstimo (prazos e idades inteiros)
+        sexos: Array de strings ('M' ou 'F')
+        df_taxas: DataFrame de taxas de risco ou IndiceTaxasRisco já compilado
+    
+    Returns:
+        Tupla (vabf, vacf, sucesso) de arrays com uma posição por empréstimo
+    """
+    import pandas as pd
+    
+    total = len(saldos)
+    vabf = np.zeros(total)
+    vacf = np.zeros(total)
+    sucesso = np.zeros(total, dtype=bool)
+    
+    taxa_mensal = (1 + taxa_juros)**(1/12) - 1
+    v = 1 / (1 + taxa_mensal)
+    indice_taxas = obter_indice_taxas(df_taxas)
+    
+    # Preparação de cada grupo (sexo, prazo): kernel, cronograma normalizado e desconto
+    grupos = []
+    for (sexo, prazo), linhas_grupo in pd.DataFrame({'sexo': sexos, 'prazo': prazos}).groupby(['sexo', 'prazo'], sort=False).indices.items():
+        try:
+            prazo = int(prazo)
+            kernel = obter_kernel_mensal(tabua_obj, sexo)
+            if kernel.sobrevivencia.shape[1] < prazo:
+                raise ValueError("Prazo maior que a tábua")
+            meses = np.arange(1, prazo + 1)
+            grupos.append({
+                'sexo': sexo,
+                'prazo': prazo,
+                'linhas': linhas_grupo,
+                'kernel': kernel,
+                'saldos_normalizados': obter_cronograma_price_normalizado(float(taxa_mensal), prazo)[0][:-1],
+                'meses': meses,
+                'fatores_desconto': v ** meses,
+                'anos_transcorridos': (meses - 1) // 12
+            })
+        except Exception:
+            continue
+    
+    for grupo in grupos:
+        prazo = grupo['prazo']
+        kernel = grupo['kernel']
+        meses = grupo['meses']
+        fatores_desconto = grupo['fatores_desconto']
+        anos_transcorridos = grupo['anos_transcorridos']
+        tamanho_bloco = max(1, CELULAS_BLOCO_RESERVA // prazo)
+        
+        for inicio in range(0, len(grupo['linhas']), tamanho_bloco):
+            linhas = grupo['linhas'][inicio:inicio + tamanho_bloco]
+            idades_bloco = idades[linhas]
+            
+            # Taxas de risco do bloco inteiro numa única indexação do índice denso
+            idades_para_taxa = idades_bloco[:, None] + anos_transcorridos
+            if indice_taxas is not None:
+                taxas_risco = indice_taxas.taxas_risco(situacao, grupo['sexo'],
+                                                       idades_para_taxa, prazo - anos_transcorridos * 12, exatas=True)
+            else:
+                # Taxa padrão vetorizada baseada na idade
+                taxas_risco = taxa_risco_padrao(idades_para_taxa)
+            
+            # Saldo devedor no início de cada mês, probabilidades e sobrevivência (matrizes)
+            saldos_devedor = saldos[linhas, None] * grupo['saldos_normalizados']
+            qx_mensais = kernel.qx(idades_bloco[:, None] * 12 + meses - 1)
+            p_mensais = 1 - qx_mensais
+            prob_sobrevivencia_acumulada = kernel.sobrevivencia[np.minimum(idades_bloco, IDADES_TABUA)[:, None], meses - 1]
+            
+            prob_morte = prob_sobrevivencia_acumulada * qx_mensais
+            vabf[linhas] = np.sum(saldos_devedor * prob_morte * fatores_desconto, axis=1)
+            
+            premios_mensais = taxas_risco * saldos_devedor
+            prob_sobrevivencia_fim_mes = prob_sobrevivencia_acumulada * p_mensais
+            vacf[linhas] = np.sum(premios_mensais * prob_sobrevivencia_fim_mes * fatores_desconto, axis=1)
+            sucesso[linhas] = True
+    
+    return vabf, vacf, sucesso
+
+def calcular_reserva_emprestimo(row, dados, indice_taxas=None):
+    """
+    Reserva matemática de um único empréstimo (linha do DataFrame), pelo cálculo
+    empréstimo a empréstimo (indice_taxas: IndiceTaxasRisco já compilado, se houver).
+    """
+    try:
+        saldo_devedor = float(row['saldo_adimplente'])
+        parcelas_restantes = int(row['prazo_restante'])
+        idade = int(row['idade'])
+        sexo = str(row['sexo'])
+        
+        # Determinar situação e tábua baseado no sexo
+        situacao = 'valido'  # Assumir válido por padrão
+        tabua = dados['tabua_validos'] if situacao == 'valido' else dados['tabua_invalidos']
+        
+        # Usar instância já criada (OTIMIZAÇÃO)
+        tabua_obj = dados['tabua_obj_validos'] if situacao == 'valido' else dados['tabua_obj_invalidos']
+        
+        # Calcular VABF e VACF usando o método otimizado
+        resultado_otimizado = calcular_vabf_vacf_otimizado(
+            tabua_obj, saldo_devedor, parcelas_restantes, idade, sexo, 
+            situacao, indice_taxas if indice_taxas is not None else dados['df_taxas'], dados['taxa_juros'], tabua
+        )
+        
+        if resultado_otimizado['sucesso']:
+            return {
+                'saldo_adimplente': saldo_devedor,
+                'prazo_restante': parcelas_restantes,
+                'idade': idade,
+                'sexo': sexo,
+                'vabf': resultado_otimizado['vabf_otimizado'],
+                'vacf': resultado_otimizado['vacf_otimizado'],
+                'reserva_matematica': resultado_otimizado['reserva_otimizada']
+            }
+        
+        # Em caso de erro, adicionar valores zero
+        return {
+            'saldo_adimplente': saldo_devedor,
+            'prazo_restante': parcelas_restantes,
+            'idade': idade,
+            'sexo': sexo,
+            'vabf': 0,
+            'vacf': 0,
+            'reserva_matematica': 0,
+            'erro': resultado_otimizado.get('erro', 'Erro desconhecido')
+        }
+        
+    except Exception as e:
+        # Em caso de erro, adicionar valores zero
+        return {
+            'saldo_adimplente': float(row.get('saldo_adimplente', 0)),
+            'prazo_restante': int(row.get('prazo_restante', 0)),
+            'idade': int(row.get('idade', 0)),
+            'sexo': str(row.get('sexo', '')),
+            'vabf': 0,
+            'vacf': 0,
+            'reserva_matematica': 0,
+            'erro': str(e)
+        }
+
+def gerar_lotes_reserva_coletiva(dados, tamanho_lote=None):
+    """
+    Gera os resultados da reserva matemática coletiva em lotes de até tamanho_lote
+    empréstimos, a partir dos dados devolvidos por ler_dados_reserva_coletiva.
+    
+    A carteira (ou cada bloco dela, na ingestão em streaming) é calculada de uma
+    vez por calcular_reservas_bloco.
+    """
+    tamanho_lote = tamanho_lote or TAMANHO_LOTE_STREAM
+    # Arquivo de taxas compilado uma vez para a carteira inteira
+    indice_taxas = obter_indice_taxas(dados['df_taxas'])
+    # Em streaming, os blocos chegam da thread produtora enquanto os anteriores são calculados
+    blocos = dados.get('blocos_emprestimos')
+    if blocos is None:
+        blocos = [dados['df_emprestimos']]
+    
+    lote = []
+    try:
+        for df_emprestimos in blocos:
+            for resultado in calcular_reservas_bloco(df_emprestimos, dados, indice_taxas):
+                lote.append(resultado)
+                
+                if len(lote) >= tamanho_lote:
+                    yield lote
+                    lote = []
+    finally:
+        if dados.get('blocos_emprestimos') is not None:
+            dados['blocos_emprestimos'].close()  # Interrompe a thread produtora se o consumo parar antes
+    
+    if lote:
+        yield lote
+
+def calcular_reservas_bloco(df_emprestimos, dados, indice_taxas):
+    """
+    Resultados da reserva matemática (um dict por empréstimo, na ordem do
+    DataFrame) de um conjunto de empréstimos.
+    
+    O conjunto é calculado de uma vez por calcular_reservas_carteira; só os
+    empréstimos que o motor vetorizado não cobre (valores ausentes ou inválidos)
+    passam pelo cálculo empréstimo a empréstimo.
+    """
+    import pandas as pd
+    
+    total = len(df_emprestimos)
+    try:
+        saldos = pd.to_numeric(df_emprestimos['saldo_adimplente'], errors='coerce').to_numpy(dtype=np.float64)
+        prazos = pd.to_numeric(df_emprestimos['prazo_restante'], errors='coerce').to_numpy(dtype=np.float64)
+        idades = pd.to_numeric(df_emprestimos['idade'], errors='coerce').to_numpy(dtype=np.float64)
+        sexos = df_emprestimos['sexo'].astype(str).to_numpy()
+        
+        # Mesmas conversões de float()/int() do cálculo empréstimo a empréstimo
+        validos = np.isfinite(saldos) & np.isfinite(prazos) & np.isfinite(idades)
+        prazos = np.trunc(np.where(validos, prazos, 0)).astype(np.int64)
+        idades = np.trunc(np.where(validos, idades, 0)).astype(np.int64)
+        
+        vabf, vacf, sucesso = np.zeros(total), np.zeros(total), np.zeros(total, dtype=bool)
+        posicoes = np.flatnonzero(validos & (prazos >= 1))
+        vabf[posicoes], vacf[posicoes], sucesso[posicoes] = calcular_reservas_carteira(
+            saldos[posicoes], prazos[posicoes], idades[posicoes], sexos[posicoes],
+            dados['tabua_obj_validos'], indice_taxas, dados['taxa_juros']
+        )
+    except KeyError:
+        # Colunas ausentes: tudo empréstimo a empréstimo (que registra o erro de cada um)
+        sucesso = np.zeros(total, dtype=bool)
+    
+    for posicao in range(total):
+        if sucesso[posicao]:
+            yield {
+                'saldo_adimplente': float(saldos[posicao]),
+                'prazo_restante': int(prazos[posicao]),
+                'idade': int(idades[posicao]),
+                'sexo': sexos[posicao],
+                'vabf': vabf[posicao],
+                'vacf': vacf[posicao],
+                'reserva_matematica': vabf[posicao] - vacf[posicao]
+            }
+        else:
+            yield calcular_reserva_emprestimo(df_emprestimos.iloc[posicao], dados, indice_taxas)
+
+def preparar_job_coletivo(corpo, content_type):
+    """
+    Prepara o job da grade coletiva (mesmo corpo JSON de /calcular_coletivo): as
+    linhas vêm de gerar_lotes_coletivo, o mesmo caminho da resposta síncrona.
+    """
+    parametros = extrair_parametros_coletivo(json.loads(corpo.decode('utf-8')))
+    total_combinacoes = ((parametros['idade_max'] - parametros['idade_min'] + 1)
+                         * (parametros['periodo_max'] - parametros['periodo_min'] + 1)
+                         * len(parametros['sexos'])
+                         * (len(parametros['tabuas_validas']) + len(parametros['tabuas_invalidas'])))
+    return {
+        'total': total_combinacoes,
+        'cabecalho': {
+            "success": True,
+            "total_combinacoes": total_combinacoes,
+            "idade_min": parametros['idade_min'],
+            "idade_max": parametros['idade_max'],
+            "periodo_min": parametros['periodo_min'],
+            "periodo_max": parametros['periodo_max'],
+            "tabuas_utilizadas": list(set(parametros['tabuas_validas'] + parametros['tabuas_invalidas']))
+        },
+        'lotes': gerar_lotes_coletivo(parametros),
+        'tipo_resultado': 'coletivo',
+        'resumo': lambda lotes, total: {
+            "combinacoes_processadas": total,
+            "progresso": 100.0,
+            "otimizado": True,
+            **referencia_resultado('coletivo', lotes[0])
+        }
+    }
+
+def preparar_job_postalis(corpo, content_type):
+    """Prepara o job do coletivo prestamista (mesmo corpo JSON de /calcular_coletivo_postalis)."""
+    parametros = extrair_parametros_postalis(json.loads(corpo.decode('utf-8')))
+    total_combinacoes = ((parametros['idade_max'] - parametros['idade_min'] + 1)
+                         * (parametros['parcelas_max'] - parametros['parcelas_min'] + 1)
+                         * len(parametros['sexos'])
+                         * (len(parametros['tabuas_validas']) + len(parametros['tabuas_invalidas'])))
+    return {
+        'total': total_combinacoes,
+        'cabecalho': {
+            "success": True,
+            "total_combinacoes": total_combinacoes,
+            "idade_min": parametros['idade_min'],
+            "idade_max": parametros['idade_max'],
+            "parcelas_min": parametros['parcelas_min'],
+            "parcelas_max": parametros['parcelas_max'],
+            "tabuas_utilizadas": list(set(parametros['tabuas_validas'] + parametros['tabuas_invalidas']))
+        },
+        'lotes': gerar_lotes_postalis(parametros),
+        'tipo_resultado': 'postalis',
+        'resumo': lambda lotes, total: {
+            "combinacoes_processadas": total,
+            "progresso": 100.0,
+            **referencia_resultado('postalis', lotes[0])
+        }
+    }
+
+def preparar_job_reserva_coletiva(corpo, content_type):
+    """
+    Prepara o job da reserva matemática coletiva (mesmo upload de
+    /calcular_reserva_matematica_coletiva, já lido como FormularioMultipart).
+    """
+    dados = ler_dados_reserva_coletiva(corpo)
+    
+    def resumo(lotes, total):
+        vabf_total = sum(r['vabf'] for lote in lotes for r in lote)
+        vacf_total = sum(r['vacf'] for lote in lotes for r in lote)
+        return {
+            "total_emprestimos": total,
+            "vabf_total": vabf_total,
+            "vacf_total": vacf_total,
+            "reserva_total": vabf_total - vacf_total
         }
+    
+    total = dados['total_emprestimos']
+    return {
+        'total': total,
+        'cabecalho': {"success": True},
+        # Lotes de ~1% da carteira para o progresso andar (sem exceder o lote de streaming)
+        'lotes': gerar_lotes_reserva_coletiva(
+            dados, min(TAMANHO_LOTE_STREAM, max(1, total // 100)) if total else TAMANHO_LOTE_STREAM
+        ),
+        'resumo': resumo
+    }
+
+# Tipos de job aceitos em POST /jobs/<tipo>
+TIPOS_JOB = {
+    'calcular_coletivo': preparar_job_coletivo,
+    'calcular_coletivo_postalis': preparar_job_postalis,
+    'calcular_reserva_matematica_coletiva': preparar_job_reserva_coletiva
+}
+
+def iniciar_executor_jobs(max_workers=None):
+    """Cria o executor dos jobs assíncronos."""
+    global EXECUTOR_JOBS
+    if EXECUTOR_JOBS is None:
+        EXECUTOR_JOBS = ThreadPoolExecutor(max_workers=max_workers or MAX_JOBS_SIMULTANEOS,
+                                           thread_name_prefix='job')
+    return EXECUTOR_JOBS
+
+def encerrar_executor_jobs():
+    """Encerra o executor dos jobs, cancelando os que ainda não começaram."""
+    global EXECUTOR_JOBS
+    if EXECUTOR_JOBS is not None:
+        EXECUTOR_JOBS.shutdown(wait=False, cancel_futures=True)
+        EXECUTOR_JOBS = None
+
+def remover_jobs_expirados():
+    """Remove os jobs finalizados há mais de JOB_TTL segundos."""
+    limite = time.time() - JOB_TTL
+    with _JOBS_LOCK:
+        for job_id in [job_id for job_id, job in JOBS.items()
+                       if job['finalizado_em'] is not None and job['finalizado_em'] < limite]:
+            del JOBS[job_id]
+
+def submeter_job(tipo, corpo, content_type=''):
+    """
+    Enfileira um job do tipo informado e retorna o seu ID imediatamente.
+    
+    A leitura dos parâmetros (e das planilhas, na reserva coletiva) também
+    acontece no executor de jobs; erros de entrada aparecem no status do job.
+    Uploads multipart chegam já lidos (FormularioMultipart), e seus arquivos
+    temporários são removidos quando o job termina.
+    
+    Levanta RuntimeError se já houver MAX_JOBS_GUARDADOS jobs e nenhum deles
+    tiver terminado (não há o que remover para abrir espaço).
+    """
+    if tipo not in TIPOS_JOB:
+        raise KeyError(f"Tipo de job desconhecido: '{tipo}'")
+    remover_jobs_expirados()
+    
+    job_id = uuid.uuid4().hex
+    with _JOBS_LOCK:
+        # Limite de jobs guardados: os finalizados mais antigos saem primeiro
+        finalizados = sorted((job for job in JOBS.values() if job['finalizado_em'] is not None),
+                             key=lambda job: job['finalizado_em'])
+        while len(JOBS) >= MAX_JOBS_GUARDADOS and finalizados:
+            del JOBS[finalizados.pop(0)['id']]
+        lotado = len(JOBS) >= MAX_JOBS_GUARDADOS
+        if not lotado:
+            JOBS[job_id] = {
+                'id': job_id,
+                'tipo': tipo,
+                'status': 'pendente',
+                'total': None,
+                'processados': 0,
+                'criado_em': time.time(),
+                'iniciado_em': None,
+                'finalizado_em': None,
+                'erro': None,
+                'cabecalho': None,
+                'lotes': [],
+                'resumo': None
+            }
+    if lotado:
+        if isinstance(corpo, FormularioMultipart):
+            corpo.fechar()
+        raise RuntimeError(f"Limite de {MAX_JOBS_GUARDADOS} jobs em andamento atingido; tente novamente mais tarde")
+    
+    iniciar_executor_jobs().submit(executar_job, job_id, corpo, content_type)
+    print(f"Job {job_id} ({tipo}) enfileirado")
+    return job_id
+
+def executar_job(job_id, corpo, content_type):
+    """
+    Executa um job no executor das rotas pesadas (ou direto, sem executor), para
+    que jobs e requisições síncronas dividam o mesmo limite de cálculo pesado.
+    O job fica 'pendente' enquanto espera uma vaga nesse executor.
+    """
+    try:
+        if EXECUTOR_PESADO is None:
+            processar_job(job_id, corpo, content_type)
+        else:
+            EXECUTOR_PESADO.submit(processar_job, job_id, corpo, content_type).result()
+    except Exception as e:
+        # Executor encerrado antes de o job começar
+        with _JOBS_LOCK:
+            job = JOBS.get(job_id)
+            if job is not None and job['finalizado_em'] is None:
+                job['status'] = 'erro'
+                job['erro'] = str(e)
+                job['finalizado_em'] = time.time()
+    finally:
+        if isinstance(corpo, FormularioMultipart):
+            corpo.fechar()  # Remove os arquivos temporários do upload
+
+def processar_job(job_id, corpo, content_type):
+    """Calcula um job, acumulando os lotes e atualizando o progresso a cada lote."""
+    job = JOBS[job_id]
+    with _JOBS_LOCK:
+        job['status'] = 'executando'
+        job['iniciado_em'] = time.time()
+    
+    try:
+        plano = TIPOS_JOB[job['tipo']](corpo, content_type)
+        with _JOBS_LOCK:
+            job['total'] = plano['total']
+            job['cabecalho'] = plano['cabecalho']
         
-        # Coletar resultados conforme completam
-        for i, future in enumerate(as_completed(future_to_combinacao)):
-            resultado = future.result()
-            if resultado is not None:
-                resultados.append(resultado)
-            
-            # Mostrar progresso
-            if (i + 1) % 50 == 0 or i == len(combinacoes) - 1:
-                progresso = ((i + 1) / len(combinacoes)) * 100
-                print(f"Progresso: {progresso:.1f}% ({i + 1}/{len(combinacoes)})")
+        for lote in plano['lotes']:
+            with _JOBS_LOCK:
+                job['lotes'].append(lote)
+                job['processados'] += len(lote)
+        if plano.get('tipo_resultado'):
+            # Linhas do job guardadas em forma colunar, como as do download por ID
+            compacto = ResultadoCompacto(plano['tipo_resultado'], [linha for lote in job['lotes'] for linha in lote])
+            with _JOBS_LOCK:
+                job['lotes'] = [compacto]
+        resumo = plano['resumo'](job['lotes'], job['processados'])
+        with _JOBS_LOCK:
+            job['resumo'] = resumo
+            job['status'] = 'concluido'
+            job['finalizado_em'] = time.time()
+        print(f"Job {job_id} concluído em {job['finalizado_em'] - job['iniciado_em']:.2f} segundos")
+    except Exception as e:
+        with _JOBS_LOCK:
+            job['status'] = 'erro'
+            job['erro'] = str(e)
+            job['finalizado_em'] = time.time()
+        print(f"Job {job_id} falhou: {e}")
+
+def obter_status_job(job_id):
+    """Retorna o status público de um job (sem os resultados), ou None se não existir."""
+    with _JOBS_LOCK:
+        job = JOBS.get(job_id)
+        if job is None:
+            return None
+        
+        total = job['total']
+        agora = job['finalizado_em'] or time.time()
+        return {
+            "job_id": job_id,
+            "tipo": job['tipo'],
+            "status": job['status'],
+            "total": total,
+            "processados": job['processados'],
+            "progresso": 100.0 if job['status'] == 'concluido' else
+                         (job['processados'] / total * 100 if total else 0.0),
+            "tempo_decorrido": agora - job['iniciado_em'] if job['iniciado_em'] else 0.0,
+            "erro": job['erro'],
+            "resultado_url": f"/jobs/{job_id}/resultado"
+        }
+
+class ResultadoCompacto:
+    """
+    Linhas de um cálculo ('coletivo' ou 'postalis') guardadas em colunas numpy.
     
-    fim = time.time()
-    tempo_total = fim - inicio
-    print(f"Processamento concluido em {tempo_total:.2f} segundos")
-    print(f"Velocidade: {len(combinacoes)/tempo_total:.1f} combinacoes/segundo")
+    Só os campos de COLUNAS_EXPORTACAO são guardados: números em arrays e textos
+    como códigos de um dicionário (tábua, sexo, taxas formatadas). Iterar devolve
+    as linhas como dicionários de novo, uma por vez, para a exportação e para
+    /jobs/<id>/resultado.
+    """
     
-    return resultados
+    def __init__(self, tipo, resultados):
+        self.tipo = tipo
+        self.total = len(resultados)
+        self.colunas = {}
+        for _, campo, tipo_coluna, _ in COLUNAS_EXPORTACAO[tipo]['colunas']:
+            valores = [resultado[campo] for resultado in resultados]
+            if tipo_coluna == 'str':
+                categorias, codigos = np.unique(np.array([valor.encode('utf-8') for valor in valores], dtype=bytes),
+                                                return_inverse=True)
+                self.colunas[campo] = (categorias, codigos.astype(np.min_scalar_type(max(len(categorias) - 1, 0))))
+            else:
+                self.colunas[campo] = np.array(valores, dtype=np.int32 if tipo_coluna == 'int' else np.float64)
+        self.tamanho_bytes = sum(sum(parte.nbytes for parte in coluna) if isinstance(coluna, tuple) else coluna.nbytes
+                                 for coluna in self.colunas.values())
+    
+    def __len__(self):
+        return self.total
+    
+    def __iter__(self):
+        colunas = {}
+        for campo, coluna in self.colunas.items():
+            if isinstance(coluna, tuple):
+                categorias = [categoria.decode('utf-8') for categoria in coluna[0]]
+                colunas[campo] = [categorias[codigo] for codigo in coluna[1].tolist()]
+            else:
+                colunas[campo] = coluna.tolist()
+        campos = list(colunas)
+        for valores in zip(*colunas.values()):
+            yield dict(zip(campos, valores))
 
-def limpar_cache_tabuas():
-    """Limpa o cache de tábuas para liberar memória."""
-    global TABUAS_CACHE
-    TABUAS_CACHE.clear()
-    calcular_taxas_seguro_cached.cache_clear()
-    print("🧹 Cache de tábuas limpo")
+def guardar_resultado(tipo, resultados):
+    """
+    Guarda as linhas de um cálculo ('coletivo' ou 'postalis') em forma colunar
+    para download posterior e retorna o ID opaco do resultado, ou None se o
+    resultado sozinho passar de MAX_BYTES_RESULTADOS_GUARDADOS.
+    """
+    if not isinstance(resultados, ResultadoCompacto):
+        resultados = ResultadoCompacto(tipo, resultados)
+    if resultados.tamanho_bytes > MAX_BYTES_RESULTADOS_GUARDADOS:
+        return None
+    
+    resultado_id = uuid.uuid4().hex
+    agora = time.time()
+    with _RESULTADOS_LOCK:
+        for chave in [chave for chave, guardado in RESULTADOS_GUARDADOS.items()
+                      if guardado['expira_em'] < agora]:
+            del RESULTADOS_GUARDADOS[chave]
+        # Os mais antigos saem até o novo resultado caber no limite de bytes
+        while (RESULTADOS_GUARDADOS and resultados.tamanho_bytes + sum(
+                guardado['resultados'].tamanho_bytes for guardado in RESULTADOS_GUARDADOS.values())
+               > MAX_BYTES_RESULTADOS_GUARDADOS):
+            del RESULTADOS_GUARDADOS[next(iter(RESULTADOS_GUARDADOS))]
+        RESULTADOS_GUARDADOS[resultado_id] = {
+            'tipo': tipo,
+            'resultados': resultados,
+            'expira_em': agora + RESULTADO_TTL
+        }
+    return resultado_id
 
-def obter_estatisticas_cache():
-    """Retorna estatísticas do cache."""
+def obter_resultado_guardado(resultado_id):
+    """Retorna (tipo, resultados) de um resultado guardado, ou None se não existir ou tiver expirado."""
+    with _RESULTADOS_LOCK:
+        guardado = RESULTADOS_GUARDADOS.get(resultado_id)
+        if guardado is None or guardado['expira_em'] < time.time():
+            RESULTADOS_GUARDADOS.pop(resultado_id, None)
+            return None
+        return guardado['tipo'], guardado['resultados']
+
+def referencia_resultado(tipo, resultados):
+    """
+    Guarda o resultado e retorna os campos resultado_id e download_url para a
+    resposta (nenhum campo, se o resultado for grande demais para ser guardado).
+    """
+    resultado_id = guardar_resultado(tipo, resultados)
+    if resultado_id is None:
+        return {}
+    rota = '/download_excel' if tipo == 'coletivo' else '/download_excel_postalis'
     return {
-        "tabulas_em_cache": len(TABUAS_CACHE),
-        "cache_hits": calcular_taxas_seguro_cached.cache_info().hits,
-        "cache_misses": calcular_taxas_seguro_cached.cache_info().misses,
-        "tamanho_cache": calcular_taxas_seguro_cached.cache_info().currsize
+        "resultado_id": resultado_id,
+        "download_url": f"{rota}?resultado_id={resultado_id}"
+    }
+
+# Exportação dos resultados: colunas de cada tipo (cabeçalho, campo, tipo, largura)
+COLUNAS_EXPORTACAO = {
+    'coletivo': {
+        'titulo': "Resultados Análise Coletiva",
+        'arquivo': "resultados_analise_coletiva",
+        'colunas': [
+            ('Idade', 'idade', 'int', 8),
+            ('Sexo', 'sexo', 'str', 12),
+            ('Período', 'periodo', 'int', 10),
+            ('Tipo Tábua', 'tipo_tabua', 'str', 12),
+            ('Tábua', 'tabua', 'str', 15),
+            ('Taxa à Vista', 'taxa_vista', 'str', 15),
+            ('Taxa Mensal', 'taxa_mensal', 'str', 15)
+        ]
+    },
+    'postalis': {
+        'titulo': "Resultados Seguro Prestamista Coletivo",
+        'arquivo': "resultados_seguro_prestamista_coletivo",
+        'colunas': [
+            ('Idade', 'idade', 'int', 8),
+            ('Sexo', 'sexo', 'str', 12),
+            ('Parcelas Restantes', 'parcelas_restantes', 'int', 15),
+            ('Tipo Tábua', 'tipo_tabua', 'str', 12),
+            ('Tábua', 'tabua', 'str', 15),
+            ('Prêmio Anual (R$)', 'premio_anual', 'float', 18),
+            ('Prêmio Mensal (R$)', 'premio_mensal', 'float', 18),
+            ('Taxa Risco Anual (%)', 'taxa_risco_anual', 'float', 18),
+            ('Taxa Risco Mensal (%)', 'taxa_risco_mensal', 'float', 18)
+        ]
+    }
+}
+
+# Formatos de exportação: (extensão, Content-Type)
+FORMATOS_EXPORTACAO = {
+    'xlsx': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('csv', 'text/csv; charset=utf-8'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet')
+}
+
+# Linhas por lote na exportação em Parquet
+TAMANHO_LOTE_PARQUET = 50000
+
+def gerar_linhas_exportacao(tipo, resultados):
+    """Gera as linhas (tuplas na ordem de COLUNAS_EXPORTACAO) a partir dos resultados."""
+    campos = [campo for _, campo, _, _ in COLUNAS_EXPORTACAO[tipo]['colunas']]
+    for resultado in resultados:
+        linha = [resultado[campo] for campo in campos]
+        linha[1] = 'Masculino' if resultado['sexo'] == 'M' else 'Feminino'
+        yield linha
+
+def escrever_excel_streaming(tipo, linhas, destino):
+    """
+    Grava as linhas num workbook write-only do openpyxl (memória constante:
+    as linhas vão direto para o arquivo temporário do workbook).
+    """
+    especificacao = COLUNAS_EXPORTACAO[tipo]
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(especificacao['titulo'][:31])
+    
+    # Larguras precisam ser definidas antes da primeira linha
+    for col, (_, _, _, largura) in enumerate(especificacao['colunas'], 1):
+        ws.column_dimensions[openpyxl.utils.get_column_letter(col)].width = largura
+    
+    ws.append([cabecalho for cabecalho, _, _, _ in especificacao['colunas']])
+    for linha in linhas:
+        ws.append(linha)
+    wb.save(destino)
+
+def escrever_parquet(tipo, linhas, destino):
+    """Grava as linhas em Parquet, em lotes de TAMANHO_LOTE_PARQUET linhas (requer pyarrow)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("A exportação em Parquet requer o pacote pyarrow (pip install pyarrow)")
+    
+    tipos_arrow = {'int': pa.int64(), 'float': pa.float64(), 'str': pa.string()}
+    colunas = COLUNAS_EXPORTACAO[tipo]['colunas']
+    schema = pa.schema([(cabecalho, tipos_arrow[tipo_coluna]) for cabecalho, _, tipo_coluna, _ in colunas])
+    
+    def gravar_lote(writer, lote):
+        writer.write_batch(pa.RecordBatch.from_arrays(
+            [pa.array([linha[indice] for linha in lote], type=campo.type) for indice, campo in enumerate(schema)],
+            schema=schema
+        ))
+    
+    with pq.ParquetWriter(destino, schema) as writer:
+        lote = []
+        for linha in linhas:
+            lote.append(linha)
+            if len(lote) >= TAMANHO_LOTE_PARQUET:
+                gravar_lote(writer, lote)
+                lote = []
+        if lote:
+            gravar_lote(writer, lote)
+
+def gerar_csv(tipo, linhas, tamanho_bloco=65536):
+    """Gera o CSV (UTF-8) em blocos de bytes, sem montar o arquivo inteiro em memória."""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([cabecalho for cabecalho, _, _, _ in COLUNAS_EXPORTACAO[tipo]['colunas']])
+    for linha in linhas:
+        writer.writerow(linha)
+        if buffer.tell() >= tamanho_bloco:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+# Respostas cacheáveis (páginas estáticas, /tabuas e tábuas completas): corpos
+# pré-comprimidos em memória, com ETag forte para revalidação (If-None-Match → 304)
+TIPOS_COMPRIMIVEIS = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+TAMANHO_MINIMO_COMPRESSAO = 1024
+MAX_TAMANHO_ESTATICO_CACHE = 8 * 1024 * 1024
+# Páginas não têm nome versionado: o navegador guarda, mas revalida a cada uso
+CACHE_CONTROL_ESTATICOS = 'no-cache'
+# Tábuas só mudam quando o CSV é recompilado (o que exige reiniciar o servidor)
+CACHE_CONTROL_TABUAS = 'public, max-age=3600'
+CACHE_RESPOSTAS = {}
+_CACHE_RESPOSTAS_LOCK = threading.Lock()
+
+def preparar_resposta_cacheavel(dados, content_type):
+    """
+    Pré-calcula as representações de um corpo: original, gzip e (com o pacote
+    brotli instalado) br, cada uma com seu ETag forte.
+    """
+    corpos = {'identity': dados}
+    if len(dados) >= TAMANHO_MINIMO_COMPRESSAO and content_type.startswith(TIPOS_COMPRIMIVEIS):
+        corpos['gzip'] = gzip.compress(dados, compresslevel=9, mtime=0)
+        if brotli is not None:
+            corpos['br'] = brotli.compress(dados, quality=11)
+    
+    digest = hashlib.sha256(dados).hexdigest()[:32]
+    return {
+        'content_type': content_type,
+        'corpos': corpos,
+        'etags': {
+            codificacao: f'"{digest}"' if codificacao == 'identity' else f'"{digest}-{codificacao}"'
+            for codificacao in corpos
+        }
     }
 
+def obter_resposta_cacheavel(chave, assinatura, gerar):
+    """
+    Retorna a resposta cacheável de chave, gerando-a com gerar() -> (dados, content_type)
+    na primeira vez ou quando a assinatura (ex.: mtime e tamanho do arquivo) muda.
+    """
+    with _CACHE_RESPOSTAS_LOCK:
+        entrada = CACHE_RESPOSTAS.get(chave)
+    if entrada is not None and entrada['assinatura'] == assinatura:
+        return entrada
+    
+    dados, content_type = gerar()
+    entrada = preparar_resposta_cacheavel(dados, content_type)
+    entrada['assinatura'] = assinatura
+    with _CACHE_RESPOSTAS_LOCK:
+        CACHE_RESPOSTAS[chave] = entrada
+    return entrada
+
 class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
     def do_GET(self):
-        if self.path == '/':
+        if self.path.startswith('/jobs/'):
+            # /jobs/<id> (status) ou /jobs/<id>/resultado
+            partes = urllib.parse.urlsplit(self.path).path.strip('/').split('/')
+            if len(partes) == 2:
+                return self.handle_consultar_job(partes[1])
+            if len(partes) == 3 and partes[2] == 'resultado':
+                return self.handle_resultado_job(partes[1])
+            self.send_response(404)
+            self.end_headers()
+        elif self.path == '/':
             self.path = '/index.html'
-            return super().do_GET()
+            return self.enviar_arquivo_estatico()
         elif self.path == '/index.html':
-            return super().do_GET()
+            return self.enviar_arquivo_estatico()
         elif self.path == '/calculadora_individual.html':
-            return super().do_GET()
+            return self.enviar_arquivo_estatico()
         elif self.path == '/calculadora_coletiva.html':
-            return super().do_GET()
+            return self.enviar_arquivo_estatico()
         elif self.path == '/tabuas':
             self.obter_tabuas_disponiveis()
-        elif self.path == '/download_excel':
-            self.handle_download_excel()
+        elif self.path.startswith('/obter_tabua_completa?'):
+            # Versão GET (cacheável pelo navegador): /obter_tabua_completa?tabua=<nome>
+            consulta = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+            self.handle_obter_tabua_completa(consulta.get('tabua', [None])[0])
+        elif self.path.startswith('/download_excel_postalis?'):
+            self.executar_pesado(self.handle_download_excel_postalis)
+        elif self.path == '/download_excel' or self.path.startswith('/download_excel?'):
+            self.executar_pesado(self.handle_download_excel)
         elif self.path == '/cache_stats':
             self.handle_cache_stats()
         elif self.path == '/limpar_cache':
@@ -1061,25 +3598,119 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
         elif self.path == '/calcular_prestamista_alt':
             self.handle_calcular_prestamista_alt()
         else:
+            return self.enviar_arquivo_estatico()
+    
+    def enviar_arquivo_estatico(self):
+        """
+        Serve um arquivo estático a partir do cache de respostas (comprimido e com
+        ETag). Diretórios, arquivos inexistentes e arquivos muito grandes seguem
+        pelo SimpleHTTPRequestHandler.
+        """
+        caminho = self.translate_path(self.path)
+        if self.caminho_protegido(caminho):
+            return self.send_error(404, "File not found")
+        try:
+            info = os.stat(caminho)
+        except OSError:
             return super().do_GET()
+        if not os.path.isfile(caminho) or info.st_size > MAX_TAMANHO_ESTATICO_CACHE:
+            return super().do_GET()
+        
+        entrada = obter_resposta_cacheavel(
+            ('arquivo', caminho), (info.st_mtime_ns, info.st_size),
+            lambda: (Path(caminho).read_bytes(), self.guess_type(caminho))
+        )
+        self.enviar_resposta_cacheavel(entrada, CACHE_CONTROL_ESTATICOS)
+    
+    def caminho_protegido(self, caminho):
+        """
+        Indica se o caminho é um arquivo de execução do servidor que não pode ser
+        servido: o cache das planilhas enviadas, o cache SQLite da grade coletiva
+        e o cubo binário das tábuas.
+        """
+        caminho = os.path.realpath(caminho)
+        protegidos = [ARQUIVO_TABUAS_BIN, ARQUIVO_TABUAS_BIN + '.tmp']
+        if ARQUIVO_CACHE_RESULTADOS:
+            protegidos += [ARQUIVO_CACHE_RESULTADOS + sufixo for sufixo in ('', '-wal', '-shm', '-journal')]
+        if caminho in {os.path.realpath(arquivo) for arquivo in protegidos}:
+            return True
+        if DIRETORIO_CACHE_PLANILHAS:
+            diretorio = os.path.realpath(DIRETORIO_CACHE_PLANILHAS)
+            return caminho == diretorio or caminho.startswith(diretorio + os.sep)
+        return False
+    
+    def send_head(self):
+        """Recusa (404) os arquivos de execução do servidor também no GET/HEAD padrão."""
+        if self.caminho_protegido(self.translate_path(self.path)):
+            self.send_error(404, "File not found")
+            return None
+        return super().send_head()
+    
+    def escolher_codificacao(self, corpos):
+        """Escolhe br, gzip ou identity conforme o Accept-Encoding do cliente."""
+        aceitas = {}
+        for item in self.headers.get('Accept-Encoding', '').split(','):
+            nome, _, parametros = item.strip().partition(';')
+            qualidade = 1.0
+            if parametros.strip().startswith('q='):
+                try:
+                    qualidade = float(parametros.strip()[2:])
+                except ValueError:
+                    qualidade = 0.0
+            if nome:
+                aceitas[nome.strip().lower()] = qualidade
+        
+        for codificacao in ('br', 'gzip'):
+            if codificacao in corpos and aceitas.get(codificacao, aceitas.get('*', 0)) > 0:
+                return codificacao
+        return 'identity'
+    
+    def enviar_resposta_cacheavel(self, entrada, cache_control):
+        """
+        Envia uma resposta do cache de respostas: 304 quando o If-None-Match
+        bate com o ETag; senão, o corpo pré-comprimido na melhor codificação aceita.
+        """
+        codificacao = self.escolher_codificacao(entrada['corpos'])
+        etag = entrada['etags'][codificacao]
+        
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            pedidos = {valor.strip()[2:] if valor.strip().startswith('W/') else valor.strip()
+                       for valor in if_none_match.split(',')}
+            if '*' in pedidos or pedidos & set(entrada['etags'].values()):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', cache_control)
+                self.send_header('Vary', 'Accept-Encoding')
+                self.end_headers()
+                return
+        
+        corpo = entrada['corpos'][codificacao]
+        self.send_response(200)
+        self.send_header('Content-Type', entrada['content_type'])
+        self.send_header('Content-Length', str(len(corpo)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', cache_control)
+        self.send_header('Vary', 'Accept-Encoding')
+        if codificacao != 'identity':
+            self.send_header('Content-Encoding', codificacao)
+        self.end_headers()
+        self.wfile.write(corpo)
     
     def obter_tabuas_disponiveis(self):
         try:
-            # Criar instância temporária para obter tábuas
-            tabua_obj = TabuladeComutacao(0.1)  # Taxa temporária
-            tabuas = list(tabua_obj.tabuas_disponiveis.keys())
-            
-            response = {
-                "success": True,
-                "tabuas": tabuas,
-                "tabua_padrao": tabua_obj.tabua_padrao
-            }
+            # Usar o registro global de tábuas (já carregado na inicialização)
+            def gerar():
+                response = {
+                    "success": True,
+                    "tabuas": list(carregar_registro_tabuas().keys()),
+                    "tabua_padrao": TABUA_PADRAO_REGISTRO
+                }
+                return json.dumps(response, ensure_ascii=False).encode('utf-8'), 'application/json'
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+            # O registro é carregado uma vez por processo: o corpo não muda
+            entrada = obter_resposta_cacheavel(('tabuas',), None, gerar)
+            self.enviar_resposta_cacheavel(entrada, CACHE_CONTROL_TABUAS)
             
         except Exception as e:
             error_response = {"success": False, "error": str(e)}
@@ -1089,18 +3720,109 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps(error_response, ensure_ascii=False).encode('utf-8'))
     
-    def end_headers(self):
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        super().end_headers()
+    def cliente_pediu_ndjson(self):
+        """Streaming opt-in: ?formato=ndjson na URL ou Accept: application/x-ndjson."""
+        consulta = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        return (consulta.get('formato', [''])[0] == 'ndjson'
+                or 'application/x-ndjson' in self.headers.get('Accept', ''))
     
-    def do_OPTIONS(self):
+    def iniciar_resposta_em_blocos(self, content_type, cabecalhos=None):
+        """
+        Envia os cabeçalhos de uma resposta de tamanho desconhecido e retorna
+        (escrever, finalizar). Para clientes HTTP/1.1 usa Transfer-Encoding:
+        chunked; para HTTP/1.0 o fim da resposta é o fechamento da conexão.
+        """
+        chunked = self.request_version == 'HTTP/1.1'
+        if chunked:
+            self.protocol_version = 'HTTP/1.1'
+        
         self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
         self.end_headers()
+        
+        def escrever(dados):
+            if not dados:
+                return
+            if chunked:
+                self.wfile.write(f"{len(dados):X}\r\n".encode('ascii') + dados + b"\r\n")
+            else:
+                self.wfile.write(dados)
+            self.wfile.flush()
+        
+        def finalizar():
+            if chunked:
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+        
+        return escrever, finalizar
     
-    def handle_calcular_coletivo(self):
+    def enviar_ndjson(self, cabecalho, lotes, resumo):
+        """
+        Envia uma resposta NDJSON (um objeto JSON por linha) à medida que os lotes ficam prontos.
+        
+        A primeira linha é o cabeçalho, seguida de uma linha por resultado e, por
+        fim, da linha de resumo (resumo(total_linhas) é chamado depois do último
+        lote). Só um lote fica em memória por vez.
+        """
+        escrever_bloco, finalizar = self.iniciar_resposta_em_blocos(
+            'application/x-ndjson; charset=utf-8', {'Cache-Control': 'no-cache'}
+        )
+        
+        def escrever(linhas):
+            escrever_bloco(''.join(json.dumps(linha, ensure_ascii=False) + '\n' for linha in linhas).encode('utf-8'))
+        
+        escrever([cabecalho])
+        total_linhas = 0
         try:
+            for lote in lotes:
+                escrever(lote)
+                total_linhas += len(lote)
+            escrever([resumo(total_linhas)])
+        except Exception as e:
+            escrever([{"success": False, "error": str(e)}])
+        
+        finalizar()
+    
+    def enviar_json_comprimido(self, response):
+        """Envia uma resposta JSON, comprimida com gzip quando o cliente aceita (Accept-Encoding)."""
+        corpo = json.dumps(response, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        comprimir = self.escolher_codificacao({'identity': corpo, 'gzip': None}) == 'gzip'
+        if comprimir:
+            corpo = gzip.compress(corpo, compresslevel=6)
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Vary', 'Accept-Encoding')
+        if comprimir:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+    
+    def obter_formato_exportacao(self, data=None):
+        """Formato de exportação pedido em ?formato= ou no campo "formato" do corpo (padrão: xlsx)."""
+        consulta = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        formato = consulta.get('formato', [None])[0] or (data or {}).get('formato') or 'xlsx'
+        return formato.lower()
+    
+    def ler_resultados_exportacao(self, tipo):
+        """
+        Obtém os resultados a exportar: pelo resultado_id (na query string ou no
+        corpo) quando o cálculo ficou guardado no servidor, ou pelas linhas
+        enviadas no corpo do POST. Retorna (tipo, resultados, data), ou None se
+        o ID não existir mais (a resposta 404 já foi enviada).
+        """
+        consulta = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        resultado_id = consulta.get('resultado_id', [None])[0]
+        data = {}
+        
+        if resultado_id is None:
             # Ler dados do POST
             content_length = int(self.headers.get('Content-Length', 0))
             if content_length == 0:
@@ -1111,32 +3833,209 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
                 raise ValueError("No data received")
             
             data = json.loads(post_data.decode('utf-8'))
+            resultado_id = data.get('resultado_id')
+        
+        if resultado_id:
+            guardado = obter_resultado_guardado(resultado_id)
+            if guardado is None:
+                self.send_response(404)
+                self.send_header('Content-type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                self.wfile.write(json.dumps({
+                    "success": False,
+                    "error": "Resultado não encontrado ou expirado; refaça o cálculo"
+                }, ensure_ascii=False).encode('utf-8'))
+                return None
+            tipo, resultados = guardado
+        else:
+            resultados = data.get('resultados', [])
+        
+        if not resultados:
+            raise ValueError("Nenhum resultado para exportar")
+        
+        return tipo, resultados, data
+    
+    def enviar_exportacao(self, tipo, resultados, formato='xlsx'):
+        """
+        Exporta os resultados em xlsx, csv ou parquet sem montar o arquivo em memória.
+        
+        Excel e Parquet só ficam válidos depois de finalizados, então são gravados
+        em streaming num arquivo temporário e copiados para a conexão em blocos,
+        com Content-Length. O CSV é gerado e enviado em blocos (chunked).
+        """
+        if formato not in FORMATOS_EXPORTACAO:
+            raise ValueError(f"Formato de exportação inválido: '{formato}' (use {', '.join(FORMATOS_EXPORTACAO)})")
+        
+        extensao, content_type = FORMATOS_EXPORTACAO[formato]
+        nome_arquivo = f"{COLUNAS_EXPORTACAO[tipo]['arquivo']}.{extensao}"
+        disposicao = {'Content-Disposition': f'attachment; filename="{nome_arquivo}"'}
+        linhas = gerar_linhas_exportacao(tipo, resultados)
+        
+        if formato == 'csv':
+            escrever, finalizar = self.iniciar_resposta_em_blocos(content_type, disposicao)
+            for bloco in gerar_csv(tipo, linhas):
+                escrever(bloco)
+            finalizar()
+            return
+        
+        with tempfile.TemporaryDirectory(prefix='exportacao_') as pasta:
+            caminho = os.path.join(pasta, nome_arquivo)
+            if formato == 'xlsx':
+                escrever_excel_streaming(tipo, linhas, caminho)
+            else:
+                escrever_parquet(tipo, linhas, caminho)
             
-            # Extrair parâmetros
-            idade_min = int(data['idade_min'])
-            idade_max = int(data['idade_max'])
-            sexos = data['sexos']
-            periodo_min = int(data['periodo_min'])
-            periodo_max = int(data['periodo_max'])
-            taxa_juros = float(data['taxa_juros']) / 100
-            tabuas_validas = data['tabuas_validas']
-            tabuas_invalidas = data['tabuas_invalidas']
-            
-            # Validação dos limites
-            if not (0 <= idade_min <= idade_max <= 110):
-                raise ValueError("As idades devem estar entre 0 e 110 anos, e a idade mínima deve ser menor ou igual à máxima.")
-            
-            if not (1 <= periodo_min <= periodo_max <= 10):
-                raise ValueError("Os períodos devem estar entre 1 e 120 meses, e o período mínimo deve ser menor ou igual ao máximo.")
-            
-            if not (0 <= taxa_juros <= 0.20):  # 0% a 20%
-                raise ValueError("A taxa de juros deve estar entre 0% e 20%.")
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Disposition', disposicao['Content-Disposition'])
+            self.send_header('Content-Length', str(os.path.getsize(caminho)))
+            self.end_headers()
+            with open(caminho, 'rb') as arquivo:
+                shutil.copyfileobj(arquivo, self.wfile, 65536)
+    
+    def ler_formulario_multipart(self):
+        """Lê o corpo multipart/form-data da requisição em blocos, direto do socket (ver ler_multipart)."""
+        content_length = int(self.headers.get('Content-Length', 0))
+        if content_length == 0:
+            raise ValueError("Content-Length is 0")
+        return ler_multipart(self.rfile, self.headers.get('Content-Type', ''), content_length)
+    
+    def executar_pesado(self, handler):
+        """Executa a rota de cálculo pesado no executor limitado (ou direto, sem executor)."""
+        if EXECUTOR_PESADO is None:
+            return handler()
+        return EXECUTOR_PESADO.submit(handler).result()
+    
+    def handle_submeter_job(self, tipo):
+        """POST /jobs/<tipo>: enfileira o cálculo e responde na hora (202) com o ID do job."""
+        try:
+            if tipo not in TIPOS_JOB:
+                status = 404
+                response = {"success": False, "error": f"Tipo de job desconhecido: '{tipo}'",
+                            "tipos_disponiveis": list(TIPOS_JOB)}
+            else:
+                content_type = self.headers.get('Content-Type', '')
+                if content_type.startswith('multipart/form-data'):
+                    # Upload lido do socket em blocos; o job recebe os arquivos já em disco
+                    corpo = self.ler_formulario_multipart()
+                else:
+                    content_length = int(self.headers.get('Content-Length', 0))
+                    if content_length == 0:
+                        raise ValueError("Content-Length is 0")
+                    
+                    corpo = self.rfile.read(content_length)
+                    if not corpo:
+                        raise ValueError("No data received")
+                
+                job_id = submeter_job(tipo, corpo, content_type)
+                status = 202
+                response = {
+                    "success": True,
+                    "job_id": job_id,
+                    "status": "pendente",
+                    "status_url": f"/jobs/{job_id}",
+                    "resultado_url": f"/jobs/{job_id}/resultado"
+                }
+        except RuntimeError as e:
+            # Limite de jobs guardados atingido só com jobs em andamento
+            status = 503
+            response = {"success": False, "error": str(e), "error_type": type(e).__name__}
+        except Exception as e:
+            status = 400
+            response = {"success": False, "error": str(e), "error_type": type(e).__name__}
+        
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json; charset=utf-8')
+        if status == 202:
+            self.send_header('Location', response['status_url'])
+        self.end_headers()
+        self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+    
+    def handle_consultar_job(self, job_id):
+        """GET /jobs/<id>: status e progresso do job."""
+        job = obter_status_job(job_id)
+        if job is None:
+            status = 404
+            response = {"success": False, "error": f"Job '{job_id}' não encontrado"}
+        else:
+            status = 200
+            response = {"success": True, **job}
+        
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+    
+    def handle_resultado_job(self, job_id):
+        """
+        GET /jobs/<id>/resultado: resultado do job concluído, no mesmo formato da
+        rota síncrona correspondente (ou em NDJSON, se o cliente pedir).
+        """
+        with _JOBS_LOCK:
+            job = JOBS.get(job_id)
+            if job is not None:
+                situacao = job['status']
+                cabecalho, lotes, resumo, erro = job['cabecalho'], job['lotes'], job['resumo'], job['erro']
+        
+        if job is None:
+            status = 404
+            response = {"success": False, "error": f"Job '{job_id}' não encontrado"}
+        elif situacao == 'erro':
+            status = 500
+            response = {"success": False, "error": erro, "job_id": job_id}
+        elif situacao != 'concluido':
+            # Ainda em execução: o cliente deve continuar consultando /jobs/<id>
+            status = 409
+            response = {"success": False, "error": "Job ainda não concluído", **obter_status_job(job_id)}
+        elif self.cliente_pediu_ndjson():
+            self.enviar_ndjson(cabecalho, iter(lotes), lambda total: {"completo": True, **resumo})
+            return
+        else:
+            status = 200
+            response = dict(cabecalho)
+            response["resultados"] = [resultado for lote in lotes for resultado in lote]
+            response.update(resumo)
+        
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json; charset=utf-8')
+        self.end_headers()
+        self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+    
+    def end_headers(self):
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        super().end_headers()
+    
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.end_headers()
+    
+    def handle_calcular_coletivo(self):
+        try:
+            # Ler dados do POST
+            content_length = int(self.headers.get('Content-Length', 0))
+            if content_length == 0:
+                raise ValueError("Content-Length is 0")
             
-            if len(sexos) == 0:
-                raise ValueError("Selecione pelo menos um sexo.")
+            post_data = self.rfile.read(content_length)
+            if not post_data:
+                raise ValueError("No data received")
+            
+            data = json.loads(post_data.decode('utf-8'))
             
-            if len(tabuas_validas) == 0 and len(tabuas_invalidas) == 0:
-                raise ValueError("Selecione pelo menos uma tábua válida ou inválida.")
+            # Extrair e validar parâmetros
+            parametros = extrair_parametros_coletivo(data)
+            idade_min = parametros['idade_min']
+            idade_max = parametros['idade_max']
+            sexos = parametros['sexos']
+            periodo_min = parametros['periodo_min']
+            periodo_max = parametros['periodo_max']
+            taxa_juros = parametros['taxa_juros']
+            tabuas_validas = parametros['tabuas_validas']
+            tabuas_invalidas = parametros['tabuas_invalidas']
             
             # Calcular total de combinações
             total_idades = idade_max - idade_min + 1
@@ -1152,7 +4051,31 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
             print(f"   • Tábuas: {len(tabuas_validas)} válidas + {len(tabuas_invalidas)} inválidas")
             print(f"   • Total: {total_combinacoes} combinações")
             
-            # Usar versão paralela otimizada
+            consulta = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+            if (consulta.get('formato', [None])[0] or data.get('formato')) == 'columnar':
+                # Formato compacto: eixos uma vez + matrizes idade × período por (tábua, sexo)
+                self.enviar_json_comprimido(montar_resposta_colunar(parametros))
+                return
+            
+            if self.cliente_pediu_ndjson():
+                # Streaming: linhas enviadas conforme cada tábua fica pronta (mesma ordem do JSON)
+                cabecalho = {
+                    "success": True,
+                    "total_combinacoes": total_combinacoes,
+                    "idade_min": idade_min,
+                    "idade_max": idade_max,
+                    "periodo_min": periodo_min,
+                    "periodo_max": periodo_max,
+                    "tabuas_utilizadas": list(set(tabuas_validas + tabuas_invalidas))
+                }
+                self.enviar_ndjson(cabecalho, gerar_lotes_coletivo(parametros), lambda total: {
+                    "completo": True,
+                    "combinacoes_processadas": total,
+                    "progresso": 100.0
+                })
+                return
+            
+            # Calcular a grade inteira de forma vetorizada (pool persistente para grades grandes)
             resultados = calcular_coletivo_paralelo(
                 idade_min, idade_max, sexos, periodo_min, periodo_max,
                 taxa_juros, tabuas_validas, tabuas_invalidas
@@ -1174,7 +4097,8 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
                 "periodo_max": periodo_max,
                 "tabuas_utilizadas": list(set(tabuas_validas + tabuas_invalidas)),
                 "otimizado": True,
-                "cache_hits": len(TABUAS_CACHE)
+                "cache_hits": len(TABUAS_CACHE),
+                **referencia_resultado('coletivo', resultados_validos)
             }
             
             # Enviar resposta
@@ -1205,31 +4129,15 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
             
             data = json.loads(post_data.decode('utf-8'))
             
-            # Extrair parâmetros
-            idade_min = int(data['idade_min'])
-            idade_max = int(data['idade_max'])
-            sexos = data['sexos']
-            periodo_min = int(data['periodo_min'])
-            periodo_max = int(data['periodo_max'])
-            taxa_juros = float(data['taxa_juros']) / 100
-            tabuas_validas = data['tabuas_validas']
-            tabuas_invalidas = data['tabuas_invalidas']
-            
-            # Validação dos limites
-            if not (0 <= idade_min <= idade_max <= 110):
-                raise ValueError("As idades devem estar entre 0 e 110 anos, e a idade mínima deve ser menor ou igual à máxima.")
-            
-            if not (1 <= periodo_min <= periodo_max <= 10):
-                raise ValueError("Os períodos devem estar entre 1 e 120 meses, e o período mínimo deve ser menor ou igual ao máximo.")
-            
-            if not (0 <= taxa_juros <= 0.20):  # 0% a 20%
-                raise ValueError("A taxa de juros deve estar entre 0% e 20%.")
-            
-            if len(sexos) == 0:
-                raise ValueError("Selecione pelo menos um sexo.")
-            
-            if len(tabuas_validas) == 0 and len(tabuas_invalidas) == 0:
-                raise ValueError("Selecione pelo menos uma tábua válida ou inválida.")
+            # Extrair e validar parâmetros
+            parametros = extrair_parametros_coletivo(data)
+            idade_min = parametros['idade_min']
+            idade_max = parametros['idade_max']
+            sexos = parametros['sexos']
+            periodo_min = parametros['periodo_min']
+            periodo_max = parametros['periodo_max']
+            tabuas_validas = parametros['tabuas_validas']
+            tabuas_invalidas = parametros['tabuas_invalidas']
             
             # Calcular total de combinações para progresso
             total_idades = idade_max - idade_min + 1
@@ -1242,136 +4150,53 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
             self.send_response(200)
             self.send_header('Content-Type', 'text/event-stream')
             self.send_header('Cache-Control', 'no-cache')
-            self.send_header('Connection', 'keep-alive')
+            self.send_header('Connection', 'close')
             self.send_header('Access-Control-Allow-Origin', '*')
             self.end_headers()
             
-            # Calcular todas as combinações
-            resultados = []
-            tabuas_utilizadas = set()
+            # Lotes (um por tábua) do mesmo motor paralelo de /calcular_coletivo;
+            # progresso e lotes parciais são enviados no máximo a cada INTERVALO_SSE segundos
             combinacoes_processadas = 0
+            resultados_enviados = 0
+            lote = []
+            todas_linhas = []  # Guardadas no servidor para o download por ID
+            ultimo_envio = time.monotonic()
+            
+            for linhas in gerar_lotes_coletivo(parametros):
+                lote.extend(linhas)
+                todas_linhas.extend(linhas)
+                combinacoes_processadas += len(linhas)
+                
+                agora = time.monotonic()
+                if agora - ultimo_envio >= INTERVALO_SSE or combinacoes_processadas == total_combinacoes:
+                    # Enviar atualização de progresso com o lote de resultados prontos
+                    progress_data = {
+                        "progresso": (combinacoes_processadas / total_combinacoes) * 100,
+                        "combinacoes_processadas": combinacoes_processadas,
+                        "total_combinacoes": total_combinacoes,
+                        "resultados_parciais": lote,
+                        "completo": False
+                    }
+                    self.wfile.write(f"data: {json.dumps(progress_data)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                    resultados_enviados += len(lote)
+                    lote = []
+                    ultimo_envio = agora
             
-            # Processar tábuas válidas
-            for tabua in tabuas_validas:
-                tabuas_utilizadas.add(tabua)
-                for idade in range(idade_min, idade_max + 1):
-                    for sexo in sexos:
-                        for periodo in range(periodo_min, periodo_max + 1):
-                            try:
-                                # Calcular seguro usando a nova função unificada
-                                tabua_obj = TabuladeComutacao(taxa_juros, tabua)
-                                tabua_obj.tabua_selecionada = tabua
-                                
-                                if tabua not in tabua_obj.tabuas_disponiveis:
-                                    # Se a tábua não for encontrada, usar AT-83 como padrão
-                                    if 'AT-83' in tabua_obj.tabuas_disponiveis:
-                                        tabua = 'AT-83'
-                                        tabua_obj.tabua_selecionada = tabua
-                                    elif tabua_obj.tabuas_disponiveis:
-                                        tabua = list(tabua_obj.tabuas_disponiveis.keys())[0]
-                                        tabua_obj.tabua_selecionada = tabua
-                                    else:
-                                        continue
-                                
-                                # Usar a função unificada para calcular as taxas
-                                taxas = calcular_taxas_seguro(tabua_obj, idade, sexo, periodo, taxa_juros, 100000)
-                                
-                                resultado = {
-                                    "idade": idade,
-                                    "sexo": sexo,
-                                    "periodo": periodo,
-                                    "tipo_tabua": "Válido",
-                                    "tabua": tabua,
-                                    "taxa_vista": f"{taxas['taxa_vista']*100:.4f}%",
-                                    "taxa_mensal": f"{taxas['taxa_mensal']*100:.4f}%"
-                                }
-                                resultados.append(resultado)
-                                
-                            except Exception as e:
-                                pass
-                            
-                            # Atualizar progresso e enviar via SSE
-                            combinacoes_processadas += 1
-                            progresso = (combinacoes_processadas / total_combinacoes) * 100
-                            
-                            # Enviar atualização de progresso
-                            progress_data = {
-                                "progresso": progresso,
-                                "combinacoes_processadas": combinacoes_processadas,
-                                "total_combinacoes": total_combinacoes,
-                                "completo": False
-                            }
-                            
-                            self.wfile.write(f"data: {json.dumps(progress_data)}\n\n".encode('utf-8'))
-                            self.wfile.flush()
-            
-            # Processar tábuas inválidas
-            for tabua in tabuas_invalidas:
-                tabuas_utilizadas.add(tabua)
-                for idade in range(idade_min, idade_max + 1):
-                    for sexo in sexos:
-                        for periodo in range(periodo_min, periodo_max + 1):
-                            try:
-                                # Calcular seguro usando a nova função unificada
-                                tabua_obj = TabuladeComutacao(taxa_juros, tabua)
-                                tabua_obj.tabua_selecionada = tabua
-                                
-                                if tabua not in tabua_obj.tabuas_disponiveis:
-                                    # Se a tábua não for encontrada, usar AT-83 como padrão
-                                    if 'AT-83' in tabua_obj.tabuas_disponiveis:
-                                        tabua = 'AT-83'
-                                        tabua_obj.tabua_selecionada = tabua
-                                    elif tabua_obj.tabuas_disponiveis:
-                                        tabua = list(tabua_obj.tabuas_disponiveis.keys())[0]
-                                        tabua_obj.tabua_selecionada = tabua
-                                    else:
-                                        continue
-                                
-                                # Usar a função unificada para calcular as taxas
-                                taxas = calcular_taxas_seguro(tabua_obj, idade, sexo, periodo, taxa_juros, 100000)
-                                
-                                resultado = {
-                                    "idade": idade,
-                                    "sexo": sexo,
-                                    "periodo": periodo,
-                                    "tipo_tabua": "Inválido",
-                                    "tabua": tabua,
-                                    "taxa_vista": f"{taxas['taxa_vista']*100:.4f}%",
-                                    "taxa_mensal": f"{taxas['taxa_mensal']*100:.4f}%"
-                                }
-                                resultados.append(resultado)
-                                
-                            except Exception as e:
-                                pass
-                            
-                            # Atualizar progresso e enviar via SSE
-                            combinacoes_processadas += 1
-                            progresso = (combinacoes_processadas / total_combinacoes) * 100
-                            
-                            # Enviar atualização de progresso
-                            progress_data = {
-                                "progresso": progresso,
-                                "combinacoes_processadas": combinacoes_processadas,
-                                "total_combinacoes": total_combinacoes,
-                                "completo": False
-                            }
-                            
-                            self.wfile.write(f"data: {json.dumps(progress_data)}\n\n".encode('utf-8'))
-                            self.wfile.flush()
-            
-            # Enviar resultado final
+            # Enviar resumo final (os resultados já foram enviados nos lotes parciais)
             final_data = {
                 "success": True,
-                "resultados": resultados,
                 "total_combinacoes": total_combinacoes,
                 "combinacoes_processadas": combinacoes_processadas,
+                "resultados_enviados": resultados_enviados,
                 "progresso": 100.0,
                 "idade_min": idade_min,
                 "idade_max": idade_max,
                 "periodo_min": periodo_min,
                 "periodo_max": periodo_max,
-                "tabuas_utilizadas": list(tabuas_utilizadas),
-                "completo": True
+                "tabuas_utilizadas": list(set(tabuas_validas + tabuas_invalidas)),
+                "completo": True,
+                **referencia_resultado('coletivo', todas_linhas)
             }
             
             self.wfile.write(f"data: {json.dumps(final_data)}\n\n".encode('utf-8'))
@@ -1388,31 +4213,13 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
     
     def handle_download_excel(self):
         try:
-            # Ler dados do POST
-            content_length = int(self.headers.get('Content-Length', 0))
-            if content_length == 0:
-                raise ValueError("Content-Length is 0")
-            
-            post_data = self.rfile.read(content_length)
-            if not post_data:
-                raise ValueError("No data received")
-            
-            data = json.loads(post_data.decode('utf-8'))
-            resultados = data.get('resultados', [])
+            leitura = self.ler_resultados_exportacao('coletivo')
+            if leitura is None:
+                return
+            tipo, resultados, data = leitura
             
-            if not resultados:
-                raise ValueError("Nenhum resultado para exportar")
-            
-            # Criar arquivo Excel
-            excel_data = self.create_excel_data(resultados)
-            
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            self.send_header('Content-Disposition', 'attachment; filename="resultados_analise_coletiva.xlsx"')
-            self.send_header('Content-Length', str(len(excel_data)))
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(excel_data)
+            # Exportar (xlsx por padrão; csv ou parquet via ?formato= ou campo "formato")
+            self.enviar_exportacao(tipo, resultados, self.obter_formato_exportacao(data))
             
         except Exception as e:
             error_response = {
@@ -1425,80 +4232,6 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps(error_response, ensure_ascii=False).encode('utf-8'))
     
-    def create_excel_data(self, resultados):
-        """Cria dados Excel a partir dos resultados"""
-        try:
-            # Criar workbook e worksheet
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Resultados Análise Coletiva"
-            
-            # Definir cabeçalhos
-            headers = ['Idade', 'Sexo', 'Período', 'Tipo Tábua', 'Tábua', 'Taxa à Vista', 'Taxa Mensal']
-            
-            # Escrever cabeçalhos (sem formatação complexa por enquanto)
-            for col, header in enumerate(headers, 1):
-                ws.cell(row=1, column=col, value=header)
-            
-            # Escrever dados
-            for row, resultado in enumerate(resultados, 2):
-                sexo_texto = 'Masculino' if resultado['sexo'] == 'M' else 'Feminino'
-                
-                ws.cell(row=row, column=1, value=resultado['idade'])
-                ws.cell(row=row, column=2, value=sexo_texto)
-                ws.cell(row=row, column=3, value=resultado['periodo'])
-                ws.cell(row=row, column=4, value=resultado['tipo_tabua'])
-                ws.cell(row=row, column=5, value=resultado['tabua'])
-                ws.cell(row=row, column=6, value=resultado['taxa_vista'])
-                ws.cell(row=row, column=7, value=resultado['taxa_mensal'])
-            
-            # Ajustar largura das colunas
-            column_widths = [8, 12, 10, 12, 15, 15, 15]
-            for col, width in enumerate(column_widths, 1):
-                ws.column_dimensions[openpyxl.utils.get_column_letter(col)].width = width
-            
-            # Salvar em BytesIO
-            output = BytesIO()
-            wb.save(output)
-            output.seek(0)
-            
-            # Retornar os dados como bytes
-            excel_bytes = output.getvalue()
-            output.close()
-            
-            return excel_bytes
-            
-        except Exception as e:
-            print(f"Erro ao criar Excel: {e}")
-            # Fallback: criar um arquivo simples
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Resultados"
-            
-            # Cabeçalhos simples
-            headers = ['Idade', 'Sexo', 'Período', 'Tipo Tábua', 'Tábua', 'Taxa à Vista', 'Taxa Mensal']
-            for col, header in enumerate(headers, 1):
-                ws.cell(row=1, column=col, value=header)
-            
-            # Dados simples
-            for row, resultado in enumerate(resultados, 2):
-                sexo_texto = 'Masculino' if resultado['sexo'] == 'M' else 'Feminino'
-                ws.cell(row=row, column=1, value=resultado['idade'])
-                ws.cell(row=row, column=2, value=sexo_texto)
-                ws.cell(row=row, column=3, value=resultado['periodo'])
-                ws.cell(row=row, column=4, value=resultado['tipo_tabua'])
-                ws.cell(row=row, column=5, value=resultado['tabua'])
-                ws.cell(row=row, column=6, value=resultado['taxa_vista'])
-                ws.cell(row=row, column=7, value=resultado['taxa_mensal'])
-            
-            output = BytesIO()
-            wb.save(output)
-            output.seek(0)
-            excel_bytes = output.getvalue()
-            output.close()
-            
-            return excel_bytes
-    
     def handle_cache_stats(self):
         """Retorna estatísticas do cache."""
         try:
@@ -1553,39 +4286,15 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
             
             data = json.loads(post_data.decode('utf-8'))
             
-            # Extrair parâmetros
-            idade_min = int(data['idade_min'])
-            idade_max = int(data['idade_max'])
-            sexos = data['sexos']
-            parcelas_min = int(data['parcelas_min'])
-            parcelas_max = int(data['parcelas_max'])
-            taxa_juros = float(data['taxa_juros']) / 100
-            valor_financiamento = float(data['valor_financiamento'])
-            periodo_total = int(data['periodo_total'])
-            tabuas_validas = data['tabuas_validas']
-            tabuas_invalidas = data['tabuas_invalidas']
-            
-            # Validação dos limites
-            if not (0 <= idade_min <= idade_max <= 99):
-                raise ValueError("As idades devem estar entre 0 e 99 anos, e a idade mínima deve ser menor ou igual à máxima.")
-            
-            if not (1 <= parcelas_min <= parcelas_max <= 120):
-                raise ValueError("As parcelas restantes devem estar entre 1 e 120, e as parcelas mínimas devem ser menores ou iguais às máximas.")
-            
-            if not (0 <= taxa_juros <= 0.30):  # 0% a 30%
-                raise ValueError("A taxa de juros deve estar entre 0% e 30%.")
-            
-            if not (1 <= valor_financiamento <= 500000):
-                raise ValueError("O valor do financiamento deve estar entre R$ 1,00 e R$ 500.000,00.")
-            
-            if not (periodo_total == 120):
-                raise ValueError("O período total deve ser 120 meses.")
-            
-            if len(sexos) == 0:
-                raise ValueError("Selecione pelo menos um sexo.")
-            
-            if len(tabuas_validas) == 0 and len(tabuas_invalidas) == 0:
-                raise ValueError("Selecione pelo menos uma tábua válida ou inválida.")
+            # Extrair e validar parâmetros
+            parametros = extrair_parametros_postalis(data)
+            idade_min = parametros['idade_min']
+            idade_max = parametros['idade_max']
+            sexos = parametros['sexos']
+            parcelas_min = parametros['parcelas_min']
+            parcelas_max = parametros['parcelas_max']
+            tabuas_validas = parametros['tabuas_validas']
+            tabuas_invalidas = parametros['tabuas_invalidas']
             
             # Calcular total de combinações
             total_idades = idade_max - idade_min + 1
@@ -1601,119 +4310,27 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
             print(f"   • Tábuas: {len(tabuas_validas)} válidas + {len(tabuas_invalidas)} inválidas")
             print(f"   • Total: {total_combinacoes} combinações")
             
+            cabecalho = {
+                "success": True,
+                "total_combinacoes": total_combinacoes,
+                "idade_min": idade_min,
+                "idade_max": idade_max,
+                "parcelas_min": parcelas_min,
+                "parcelas_max": parcelas_max,
+                "tabuas_utilizadas": list(set(tabuas_validas + tabuas_invalidas))
+            }
+            
+            if self.cliente_pediu_ndjson():
+                # Streaming: linhas enviadas a cada (tábua, idade, sexo) calculado
+                self.enviar_ndjson(cabecalho, gerar_lotes_postalis(parametros), lambda total: {
+                    "completo": True,
+                    "combinacoes_processadas": total,
+                    "progresso": 100.0
+                })
+                return
+            
             # Processar combinações
-            resultados = []
-            tabuas_utilizadas = set()
-            
-            # Processar tábuas válidas
-            for tabua in tabuas_validas:
-                tabuas_utilizadas.add(tabua)
-                for idade in range(idade_min, idade_max + 1):
-                    for sexo in sexos:
-                        for parcelas_restantes in range(parcelas_min, parcelas_max + 1):
-                            try:
-                                # Calcular seguro prestamista
-                                tabua_obj = TabuladeComutacao(taxa_juros, tabua)
-                                tabua_obj.tabua_selecionada = tabua
-                                
-                                if tabua not in tabua_obj.tabuas_disponiveis:
-                                    # Se a tábua não for encontrada, usar AT-83 como padrão
-                                    if 'AT-83' in tabua_obj.tabuas_disponiveis:
-                                        tabua = 'AT-83'
-                                        tabua_obj.tabua_selecionada = tabua
-                                    elif tabua_obj.tabuas_disponiveis:
-                                        tabua = list(tabua_obj.tabuas_disponiveis.keys())[0]
-                                        tabua_obj.tabua_selecionada = tabua
-                                    else:
-                                        continue
-                                
-                                # Calcular seguro prestamista
-                                resultado_prestamista = calcular_seguro_prestamista(
-                                    tabua_obj, idade, sexo, periodo_total, taxa_juros, valor_financiamento
-                                )
-                                
-                                # Calcular saldo devedor na parcela atual
-                                parcela_atual = periodo_total - parcelas_restantes + 1
-                                taxa_mensal = (1 + taxa_juros)**(1/12) - 1
-                                saldo_devedor_atual = calcular_saldo_devedor_price(
-                                    valor_financiamento, taxa_mensal, periodo_total, parcela_atual
-                                )
-                                
-                                # Calcular taxas de risco
-                                taxa_risco_anual = (resultado_prestamista['premio_unico'] / saldo_devedor_atual) * 100 if saldo_devedor_atual > 0 else 0
-                                taxa_risco_mensal = (resultado_prestamista['premio_mensal'] / saldo_devedor_atual) * 100 if saldo_devedor_atual > 0 else 0
-                                
-                                resultado = {
-                                    "idade": idade,
-                                    "sexo": sexo,
-                                    "parcelas_restantes": parcelas_restantes,
-                                    "tipo_tabua": "Válido",
-                                    "tabua": tabua,
-                                    "premio_anual": resultado_prestamista['premio_unico'],
-                                    "premio_mensal": resultado_prestamista['premio_mensal'],
-                                    "taxa_risco_anual": taxa_risco_anual,
-                                    "taxa_risco_mensal": taxa_risco_mensal
-                                }
-                                resultados.append(resultado)
-                                
-                            except Exception as e:
-                                print(f"Erro ao calcular {idade}, {sexo}, {parcelas_restantes}, {tabua}: {e}")
-                                pass
-            
-            # Processar tábuas inválidas
-            for tabua in tabuas_invalidas:
-                tabuas_utilizadas.add(tabua)
-                for idade in range(idade_min, idade_max + 1):
-                    for sexo in sexos:
-                        for parcelas_restantes in range(parcelas_min, parcelas_max + 1):
-                            try:
-                                # Calcular seguro prestamista
-                                tabua_obj = TabuladeComutacao(taxa_juros, tabua)
-                                tabua_obj.tabua_selecionada = tabua
-                                
-                                if tabua not in tabua_obj.tabuas_disponiveis:
-                                    # Se a tábua não for encontrada, usar AT-83 como padrão
-                                    if 'AT-83' in tabua_obj.tabuas_disponiveis:
-                                        tabua = 'AT-83'
-                                        tabua_obj.tabua_selecionada = tabua
-                                    elif tabua_obj.tabuas_disponiveis:
-                                        tabua = list(tabua_obj.tabuas_disponiveis.keys())[0]
-                                        tabua_obj.tabua_selecionada = tabua
-                                    else:
-                                        continue
-                                
-                                # Calcular seguro prestamista
-                                resultado_prestamista = calcular_seguro_prestamista(
-                                    tabua_obj, idade, sexo, periodo_total, taxa_juros, valor_financiamento
-                                )
-                                
-                                # Calcular saldo devedor na parcela atual
-                                parcela_atual = periodo_total - parcelas_restantes + 1
-                                taxa_mensal = (1 + taxa_juros)**(1/12) - 1
-                                saldo_devedor_atual = calcular_saldo_devedor_price(
-                                    valor_financiamento, taxa_mensal, periodo_total, parcela_atual
-                                )
-                                
-                                # Calcular taxas de risco
-                                taxa_risco_anual = (resultado_prestamista['premio_unico'] / saldo_devedor_atual) * 100 if saldo_devedor_atual > 0 else 0
-                                taxa_risco_mensal = (resultado_prestamista['premio_mensal'] / saldo_devedor_atual) * 100 if saldo_devedor_atual > 0 else 0
-                                
-                                resultado = {
-                                    "idade": idade,
-                                    "sexo": sexo,
-                                    "parcelas_restantes": parcelas_restantes,
-                                    "tipo_tabua": "Inválido",
-                                    "tabua": tabua,
-                                    "premio_anual": resultado_prestamista['premio_unico'],
-                                    "premio_mensal": resultado_prestamista['premio_mensal'],
-                                    "taxa_risco_anual": taxa_risco_anual,
-                                    "taxa_risco_mensal": taxa_risco_mensal
-                                }
-                                resultados.append(resultado)
-                                
-                            except Exception as e:
-                                print(f"Erro ao calcular {idade}, {sexo}, {parcelas_restantes}, {tabua}: {e}")
-                                pass
+            resultados = [linha for lote in gerar_lotes_postalis(parametros) for linha in lote]
             
             # Preparar resposta
             response = {
@@ -1726,7 +4343,8 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
                 "idade_max": idade_max,
                 "parcelas_min": parcelas_min,
                 "parcelas_max": parcelas_max,
-                "tabuas_utilizadas": list(tabuas_utilizadas)
+                "tabuas_utilizadas": cabecalho["tabuas_utilizadas"],
+                **referencia_resultado('postalis', resultados)
             }
             
             # Enviar resposta
@@ -1747,31 +4365,13 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
     def handle_download_excel_postalis(self):
         """Gera arquivo Excel para resultados do seguro prestamista coletivo."""
         try:
-            # Ler dados do POST
-            content_length = int(self.headers.get('Content-Length', 0))
-            if content_length == 0:
-                raise ValueError("Content-Length is 0")
-            
-            post_data = self.rfile.read(content_length)
-            if not post_data:
-                raise ValueError("No data received")
-            
-            data = json.loads(post_data.decode('utf-8'))
-            resultados = data.get('resultados', [])
+            leitura = self.ler_resultados_exportacao('postalis')
+            if leitura is None:
+                return
+            tipo, resultados, data = leitura
             
-            if not resultados:
-                raise ValueError("Nenhum resultado para exportar")
-            
-            # Criar arquivo Excel
-            excel_data = self.create_excel_data_postalis(resultados)
-            
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            self.send_header('Content-Disposition', 'attachment; filename="resultados_seguro_prestamista_coletivo.xlsx"')
-            self.send_header('Content-Length', str(len(excel_data)))
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(excel_data)
+            # Exportar (xlsx por padrão; csv ou parquet via ?formato= ou campo "formato")
+            self.enviar_exportacao(tipo, resultados, self.obter_formato_exportacao(data))
             
         except Exception as e:
             error_response = {
@@ -1784,84 +4384,6 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps(error_response, ensure_ascii=False).encode('utf-8'))
     
-    def create_excel_data_postalis(self, resultados):
-        """Cria dados Excel para resultados do seguro prestamista coletivo."""
-        try:
-            # Criar workbook e worksheet
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Resultados Seguro Prestamista Coletivo"
-            
-            # Definir cabeçalhos
-            headers = ['Idade', 'Sexo', 'Parcelas Restantes', 'Tipo Tábua', 'Tábua', 'Prêmio Anual (R$)', 'Prêmio Mensal (R$)', 'Taxa Risco Anual (%)', 'Taxa Risco Mensal (%)']
-            
-            # Escrever cabeçalhos
-            for col, header in enumerate(headers, 1):
-                ws.cell(row=1, column=col, value=header)
-            
-            # Escrever dados
-            for row, resultado in enumerate(resultados, 2):
-                sexo_texto = 'Masculino' if resultado['sexo'] == 'M' else 'Feminino'
-                
-                ws.cell(row=row, column=1, value=resultado['idade'])
-                ws.cell(row=row, column=2, value=sexo_texto)
-                ws.cell(row=row, column=3, value=resultado['parcelas_restantes'])
-                ws.cell(row=row, column=4, value=resultado['tipo_tabua'])
-                ws.cell(row=row, column=5, value=resultado['tabua'])
-                ws.cell(row=row, column=6, value=resultado['premio_anual'])
-                ws.cell(row=row, column=7, value=resultado['premio_mensal'])
-                ws.cell(row=row, column=8, value=resultado['taxa_risco_anual'])
-                ws.cell(row=row, column=9, value=resultado['taxa_risco_mensal'])
-            
-            # Ajustar largura das colunas
-            column_widths = [8, 12, 15, 12, 15, 18, 18, 18, 18]
-            for col, width in enumerate(column_widths, 1):
-                ws.column_dimensions[openpyxl.utils.get_column_letter(col)].width = width
-            
-            # Salvar em BytesIO
-            output = BytesIO()
-            wb.save(output)
-            output.seek(0)
-            
-            # Retornar os dados como bytes
-            excel_bytes = output.getvalue()
-            output.close()
-            
-            return excel_bytes
-            
-        except Exception as e:
-            print(f"Erro ao criar Excel: {e}")
-            # Fallback: criar um arquivo simples
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Resultados"
-            
-            # Cabeçalhos simples
-            headers = ['Idade', 'Sexo', 'Parcelas Restantes', 'Tipo Tábua', 'Tábua', 'Prêmio Anual (R$)', 'Prêmio Mensal (R$)', 'Taxa Risco Anual (%)', 'Taxa Risco Mensal (%)']
-            for col, header in enumerate(headers, 1):
-                ws.cell(row=1, column=col, value=header)
-            
-            # Dados simples
-            for row, resultado in enumerate(resultados, 2):
-                sexo_texto = 'Masculino' if resultado['sexo'] == 'M' else 'Feminino'
-                ws.cell(row=row, column=1, value=resultado['idade'])
-                ws.cell(row=row, column=2, value=sexo_texto)
-                ws.cell(row=row, column=3, value=resultado['parcelas_restantes'])
-                ws.cell(row=row, column=4, value=resultado['tipo_tabua'])
-                ws.cell(row=row, column=5, value=resultado['tabua'])
-                ws.cell(row=row, column=6, value=resultado['premio_anual'])
-                ws.cell(row=row, column=7, value=resultado['premio_mensal'])
-                ws.cell(row=row, column=8, value=resultado['taxa_risco_anual'])
-                ws.cell(row=row, column=9, value=resultado['taxa_risco_mensal'])
-            
-            output = BytesIO()
-            wb.save(output)
-            output.seek(0)
-            excel_bytes = output.getvalue()
-            output.close()
-            
-            return excel_bytes
-    
     def handle_calcular_prestamista(self):
         """Calcula seguro prestamista."""
         try:
@@ -1905,7 +4427,7 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
             if tabua_selecionada not in tabua_obj.tabuas_disponiveis:
                 raise KeyError(f"Tábua '{tabua_selecionada}' não encontrada. Tábuas disponíveis: {list(tabua_obj.tabuas_disponiveis.keys())}")
             
-            resultado_prestamista = calcular_seguro_prestamista(tabua_obj, idade, sexo, periodo, taxa_juros, soma_segurada)
+            resultado_prestamista = calcular_seguro_prestamista(tabua_obj, idade, sexo, periodo, taxa_juros, soma_segurada, detalhes=True)
             
             # Preparar resposta
             response = {
@@ -2171,7 +4693,10 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
             self.wfile.write(json.dumps(error_response, ensure_ascii=False).encode('utf-8'))
     
     def do_POST(self):
-        if self.path == '/calcular':
+        # Rotas comparadas sem a query string (ex.: ?formato=ndjson)
+        caminho = urllib.parse.urlsplit(self.path).path
+        
+        if caminho == '/calcular':
             try:
                 # Ler dados do POST
                 content_length = int(self.headers.get('Content-Length', 0))
@@ -2216,13 +4741,13 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
                     raise KeyError(f"Tábua '{tabua_selecionada}' não encontrada. Tábuas disponíveis: {list(tabua_obj.tabuas_disponiveis.keys())}")
                 
                 tabua_obj.dados = tabua_obj.tabuas_disponiveis[tabua_selecionada]
-                tabua_obj.calcular_tabua_comutacao()
+                colunas = tabua_obj.calcular_tabua_comutacao(sexo)
                 
                 seguro_anual = calcular_seguro_anual(tabua_obj, idade, sexo, periodo)
                 seguro_fracionado_total, fator_ajuste, taxa_fracionada_calc = calcular_seguro_fracionado_total(taxa_juros, fracionamento, seguro_anual)
                 valor_monetario_vista = soma_segurada * seguro_fracionado_total
                 
-                valor_mensal, N_x, N_x_n, anuidade_ajustada, percentual_mensal_calc = calcular_premio_mensal(tabua_obj, idade, periodo, valor_monetario_vista, taxa_juros, fracionamento, soma_segurada)
+                valor_mensal, N_x, N_x_n, anuidade_ajustada, percentual_mensal_calc = calcular_premio_mensal(tabua_obj, idade, periodo, valor_monetario_vista, taxa_juros, fracionamento, soma_segurada, sexo)
                 
                 # Preparar resposta
                 response = {
@@ -2241,9 +4766,9 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
                             "soma_segurada": f"R$ {soma_segurada:,.2f}"
                         },
                         "calculo_seguro_anual": {
-                            "M_x": f"{tabua_obj.M_x[idade]:.2f}",
-                            "M_x_n": f"{tabua_obj.M_x[idade + periodo]:.2f}",
-                            "D_x": f"{tabua_obj.D_x[idade]:.2f}",
+                            "M_x": f"{colunas['M_x'][idade]:.2f}",
+                            "M_x_n": f"{colunas['M_x'][idade + periodo]:.2f}",
+                            "D_x": f"{colunas['D_x'][idade]:.2f}",
                             "formula": r"A_{x:n}^1 = \frac{M_x - M_{x+n}}{D_x}",
                             "valor": f"{seguro_anual:.8f}"
                         },
@@ -2262,8 +4787,8 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
                         "calculo_premio_mensal": {
                             "N_x": f"{N_x:.2f}",
                             "N_x_n": f"{N_x_n:.2f}",
-                            "D_x": f"{tabua_obj.D_x[idade]:.2f}",
-                            "D_x_n": f"{tabua_obj.D_x[idade + periodo]:.2f}",
+                            "D_x": f"{colunas['D_x'][idade]:.2f}",
+                            "D_x_n": f"{colunas['D_x'][idade + periodo]:.2f}",
                             "anuidade_ajustada_formula": r"\text{Anuidade Ajustada} = \left( \frac{N_x - N_{x+n}}{D_x} + \frac{11}{24} \times \left(1 - \frac{D_{x+n}}{D_x}\right) \right) \times k",
                             "anuidade_ajustada_valor": f"{anuidade_ajustada:.6f}",
                             "valor_mensal_formula": r"\text{Valor Mensal} = \frac{\text{Valor Monetário (à vista)}}{\text{Anuidade Ajustada}}",
@@ -2272,13 +4797,13 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
                             "percentual_mensal_valor": f"{percentual_mensal_calc[0]*100:.4f}%"
                         },
                         "tabua_comutacao": {
-                            "l_x": {str(k): f"{v:.2f}" for k, v in tabua_obj.l_x.items()},
-                            "d_x": {str(k): f"{v:.2f}" for k, v in tabua_obj.d_x.items()},
-                            "D_x": {str(k): f"{v:.2f}" for k, v in tabua_obj.D_x.items()},
-                            "C_x": {str(k): f"{v:.2f}" for k, v in tabua_obj.C_x.items()},
-                            "N_x": {str(k): f"{v:.2f}" for k, v in tabua_obj.N_x.items()},
-                            "M_x": {str(k): f"{v:.2f}" for k, v in tabua_obj.M_x.items()},
-                            "v_x": {str(k): f"{v:.6f}" for k, v in tabua_obj.v_x.items()}
+                            "l_x": {str(k): f"{v:.2f}" for k, v in enumerate(colunas['l_x'])},
+                            "d_x": {str(k): f"{v:.2f}" for k, v in enumerate(colunas['d_x'])},
+                            "D_x": {str(k): f"{v:.2f}" for k, v in enumerate(colunas['D_x'])},
+                            "C_x": {str(k): f"{v:.2f}" for k, v in enumerate(colunas['C_x'])},
+                            "N_x": {str(k): f"{v:.2f}" for k, v in enumerate(colunas['N_x'])},
+                            "M_x": {str(k): f"{v:.2f}" for k, v in enumerate(colunas['M_x'])},
+                            "v_x": {str(k): f"{v:.6f}" for k, v in enumerate(colunas['v_x'])}
                         }
                     }
                 }
@@ -2297,220 +4822,68 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
                 self.send_header('Access-Control-Allow-Origin', '*')
                 self.end_headers()
                 self.wfile.write(json.dumps(error_response, ensure_ascii=False).encode('utf-8'))
-        elif self.path == '/calcular_coletivo':
-            self.handle_calcular_coletivo()
-        elif self.path == '/calcular_coletivo_progress':
-            self.handle_calcular_coletivo_progress()
-        elif self.path == '/calcular_coletivo_postalis':
-            self.handle_calcular_coletivo_postalis()
-        elif self.path == '/download_excel':
-            self.handle_download_excel()
-        elif self.path == '/download_excel_postalis':
-            self.handle_download_excel_postalis()
-        elif self.path == '/calcular_prestamista':
+        elif caminho == '/calcular_coletivo':
+            self.executar_pesado(self.handle_calcular_coletivo)
+        elif caminho == '/calcular_coletivo_progress':
+            self.executar_pesado(self.handle_calcular_coletivo_progress)
+        elif caminho == '/calcular_coletivo_postalis':
+            self.executar_pesado(self.handle_calcular_coletivo_postalis)
+        elif caminho == '/download_excel':
+            self.executar_pesado(self.handle_download_excel)
+        elif caminho == '/download_excel_postalis':
+            self.executar_pesado(self.handle_download_excel_postalis)
+        elif caminho == '/calcular_prestamista':
             self.handle_calcular_prestamista()
-        elif self.path == '/calcular_prestamista_alt':
+        elif caminho == '/calcular_prestamista_alt':
             self.handle_calcular_prestamista_alt()
-        elif self.path == '/calcular_reserva_matematica':
+        elif caminho == '/calcular_reserva_matematica':
             self.handle_calcular_reserva_matematica()
-        elif self.path == '/calcular_reserva_matematica_individual':
-            self.handle_calcular_reserva_matematica_individual()
-        elif self.path == '/calcular_reserva_matematica_coletiva':
-            self.handle_calcular_reserva_matematica_coletiva()
-        elif self.path == '/preview_planilha':
-            self.handle_preview_planilha()
-        elif self.path == '/obter_qx':
+        elif caminho == '/calcular_reserva_matematica_individual':
+            self.executar_pesado(self.handle_calcular_reserva_matematica_individual)
+        elif caminho == '/calcular_reserva_matematica_coletiva':
+            self.executar_pesado(self.handle_calcular_reserva_matematica_coletiva)
+        elif caminho == '/preview_planilha':
+            self.executar_pesado(self.handle_preview_planilha)
+        elif caminho == '/obter_qx':
             self.handle_obter_qx()
-        elif self.path == '/obter_tabua_completa':
+        elif caminho == '/obter_tabua_completa':
             self.handle_obter_tabua_completa()
+        elif caminho.startswith('/jobs/'):
+            self.handle_submeter_job(caminho[len('/jobs/'):])
         else:
             self.send_response(404)
             self.end_headers()
 
     def handle_calcular_reserva_matematica_coletiva(self):
+        formulario = None
         try:
-            import pandas as pd
-            import io
-            
-            # Ler dados do POST
-            content_length = int(self.headers.get('Content-Length', 0))
-            if content_length == 0:
-                raise ValueError("Content-Length is 0")
-            
-            post_data = self.rfile.read(content_length)
-            if not post_data:
-                raise ValueError("No data received")
-            
-            # Parse multipart/form-data
-            content_type = self.headers.get('Content-Type', '')
-            if 'boundary=' not in content_type:
-                raise ValueError("Boundary não encontrado no Content-Type")
-            
-            boundary = content_type.split('boundary=')[1]
-            parts = post_data.split(f'--{boundary}'.encode())
-            
-            form_data = {}
-            taxas_file_data = None
-            emprestimos_file_data = None
-            
-            for part in parts:
-                if b'Content-Disposition: form-data' in part:
-                    if b'name="taxas_file"' in part:
-                        # Extrair arquivo de taxas
-                        header_end = part.find(b'\r\n\r\n')
-                        if header_end != -1:
-                            taxas_file_data = part[header_end + 4:-2]  # Remove \r\n do final
-                    elif b'name="emprestimos_file"' in part:
-                        # Extrair arquivo de empréstimos
-                        header_end = part.find(b'\r\n\r\n')
-                        if header_end != -1:
-                            emprestimos_file_data = part[header_end + 4:-2]  # Remove \r\n do final
-                    elif b'name=' in part:
-                        # Extrair campos de formulário
-                        lines = part.split(b'\r\n')
-                        for line in lines:
-                            if line.startswith(b'Content-Disposition: form-data; name='):
-                                name_start = line.find(b'name="') + 6
-                                name_end = line.find(b'"', name_start)
-                                name = line[name_start:name_end].decode('utf-8')
-                                
-                                # Encontrar o valor na próxima linha
-                                value_line = lines[lines.index(line) + 2] if lines.index(line) + 2 < len(lines) else b''
-                                form_data[name] = value_line.decode('utf-8').strip()
-            
-            # Extrair parâmetros
-            taxa_juros = float(form_data.get('taxa_juros', 6.5)) / 100.0
-            tabua_validos = form_data.get('tabua_validos', 'AT-83')
-            tabua_invalidos = form_data.get('tabua_invalidos', 'AT-83')
-            
-            if not taxas_file_data or not emprestimos_file_data:
-                raise ValueError("Arquivos não encontrados no upload")
-            
-            # Processar arquivo de taxas de risco
-            df_taxas = pd.read_excel(io.BytesIO(taxas_file_data), engine='openpyxl')
-            
-            # Mapear colunas do arquivo de taxas
-            colunas_esperadas_taxas = ['idade', 'sexo', 'situacao', 'parcela', 'taxa_risco_mensal']
-            colunas_originais_taxas = list(df_taxas.columns)
-            
-            if not all(col in df_taxas.columns for col in colunas_esperadas_taxas):
-                # Mapear colunas
-                mapeamento_taxas = {
-                    'Idade': 'idade',
-                    'Sexo': 'sexo',
-                    'Parcelas Restantes': 'parcela',
-                    'Tipo Tábua': 'situacao',
-                    'Taxa Risco Mensal (%)': 'taxa_risco_mensal'
-                }
-                
-                colunas_mapeadas_taxas = {}
-                for col_original, col_nova in mapeamento_taxas.items():
-                    if col_original in df_taxas.columns:
-                        colunas_mapeadas_taxas[col_original] = col_nova
-                
-                if colunas_mapeadas_taxas:
-                    df_taxas = df_taxas.rename(columns=colunas_mapeadas_taxas)
-                    df_taxas['situacao'] = df_taxas['situacao'].map({'Válido': 'valido', 'Inválido': 'invalido'})
-                    df_taxas['sexo'] = df_taxas['sexo'].map({'Masculino': 'M', 'Feminino': 'F'})
-                    df_taxas['parcela'] = df_taxas['parcela'].astype(int)
-                    df_taxas['taxa_risco_mensal'] = df_taxas['taxa_risco_mensal'].astype(float) / 100
-                else:
-                    raise ValueError("Não foi possível mapear as colunas do arquivo de taxas")
-            
-            # Processar arquivo de empréstimos
-            df_emprestimos = pd.read_excel(io.BytesIO(emprestimos_file_data), engine='openpyxl')
-            
-            # Mapear colunas do arquivo de empréstimos
-            colunas_esperadas_emprestimos = ['saldo_adimplente', 'prazo_restante', 'idade', 'sexo']
-            colunas_originais_emprestimos = list(df_emprestimos.columns)
-            
-            if not all(col in df_emprestimos.columns for col in colunas_esperadas_emprestimos):
-                # Mapear colunas
-                mapeamento_emprestimos = {
-                    'Saldo Adimplente': 'saldo_adimplente',
-                    'Prazo Restante': 'prazo_restante',
-                    'Idade': 'idade',
-                    'Sexo': 'sexo'
-                }
+            # Ler o upload em blocos (arquivos grandes vão para disco); o formulário fica
+            # aberto até o fim, pois os empréstimos podem ser lidos em streaming no cálculo
+            formulario = self.ler_formulario_multipart()
+            dados = ler_dados_reserva_coletiva(formulario)
+            lotes = gerar_lotes_reserva_coletiva(dados)
+            
+            if self.cliente_pediu_ndjson():
+                # Streaming: resultados enviados em lotes, com os totais na linha final
+                totais = {'vabf': 0.0, 'vacf': 0.0}
                 
-                colunas_mapeadas_emprestimos = {}
-                for col_original, col_nova in mapeamento_emprestimos.items():
-                    if col_original in df_emprestimos.columns:
-                        colunas_mapeadas_emprestimos[col_original] = col_nova
+                def lotes_com_totais():
+                    for lote in lotes:
+                        totais['vabf'] += sum(r['vabf'] for r in lote)
+                        totais['vacf'] += sum(r['vacf'] for r in lote)
+                        yield lote
                 
-                if colunas_mapeadas_emprestimos:
-                    df_emprestimos = df_emprestimos.rename(columns=colunas_mapeadas_emprestimos)
-                    df_emprestimos['sexo'] = df_emprestimos['sexo'].map({'Masculino': 'M', 'Feminino': 'F'})
-                    df_emprestimos['saldo_adimplente'] = df_emprestimos['saldo_adimplente'].astype(float)
-                    df_emprestimos['prazo_restante'] = df_emprestimos['prazo_restante'].astype(int)
-                    df_emprestimos['idade'] = df_emprestimos['idade'].astype(int)
-                else:
-                    raise ValueError("Não foi possível mapear as colunas do arquivo de empréstimos")
-            
-            # OTIMIZAÇÃO: Usar cache para tábuas de mortalidade
-            print(f"Carregando tábuas de mortalidade...")
-            tabua_obj_validos = obter_tabua_cached(taxa_juros, tabua_validos)
-            tabua_obj_invalidos = obter_tabua_cached(taxa_juros, tabua_invalidos)
-            print(f"Tábuas carregadas com sucesso!")
+                self.enviar_ndjson({"success": True, "total_emprestimos": dados['total_emprestimos']}, lotes_com_totais(), lambda total: {
+                    "completo": True,
+                    "total_emprestimos": total,
+                    "vabf_total": totais['vabf'],
+                    "vacf_total": totais['vacf'],
+                    "reserva_total": totais['vabf'] - totais['vacf']
+                })
+                return
             
             # Calcular reservas matemáticas para cada empréstimo
-            resultados = []
-            
-            for index, row in df_emprestimos.iterrows():
-                try:
-                    saldo_devedor = float(row['saldo_adimplente'])
-                    parcelas_restantes = int(row['prazo_restante'])
-                    idade = int(row['idade'])
-                    sexo = str(row['sexo'])
-                    
-                    # Determinar situação e tábua baseado no sexo
-                    situacao = 'valido'  # Assumir válido por padrão
-                    tabua = tabua_validos if situacao == 'valido' else tabua_invalidos
-                    
-                    # Usar instância já criada (OTIMIZAÇÃO)
-                    tabua_obj = tabua_obj_validos if situacao == 'valido' else tabua_obj_invalidos
-                    
-                    # Calcular VABF e VACF usando o método otimizado
-                    resultado_otimizado = self.calcular_vabf_vacf_otimizado(
-                        tabua_obj, saldo_devedor, parcelas_restantes, idade, sexo, 
-                        situacao, df_taxas, taxa_juros, tabua
-                    )
-                    
-                    if resultado_otimizado['sucesso']:
-                        resultados.append({
-                            'saldo_adimplente': saldo_devedor,
-                            'prazo_restante': parcelas_restantes,
-                            'idade': idade,
-                            'sexo': sexo,
-                            'vabf': resultado_otimizado['vabf_otimizado'],
-                            'vacf': resultado_otimizado['vacf_otimizado'],
-                            'reserva_matematica': resultado_otimizado['reserva_otimizada']
-                        })
-                    else:
-                        # Em caso de erro, adicionar valores zero
-                        resultados.append({
-                            'saldo_adimplente': saldo_devedor,
-                            'prazo_restante': parcelas_restantes,
-                            'idade': idade,
-                            'sexo': sexo,
-                            'vabf': 0,
-                            'vacf': 0,
-                            'reserva_matematica': 0,
-                            'erro': resultado_otimizado.get('erro', 'Erro desconhecido')
-                        })
-                        
-                except Exception as e:
-                    # Em caso de erro, adicionar valores zero
-                    resultados.append({
-                        'saldo_adimplente': float(row.get('saldo_adimplente', 0)),
-                        'prazo_restante': int(row.get('prazo_restante', 0)),
-                        'idade': int(row.get('idade', 0)),
-                        'sexo': str(row.get('sexo', '')),
-                        'vabf': 0,
-                        'vacf': 0,
-                        'reserva_matematica': 0,
-                        'erro': str(e)
-                    })
+            resultados = [resultado for lote in lotes for resultado in lote]
             
             # Preparar resposta
             response = {
@@ -2539,82 +4912,22 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
             self.send_header('Content-type', 'application/json; charset=utf-8')
             self.end_headers()
             self.wfile.write(json.dumps(error_response, ensure_ascii=False).encode('utf-8'))
+        finally:
+            if formulario is not None:
+                formulario.fechar()
 
     def handle_preview_planilha(self):
         """Endpoint para preview das primeiras 10 linhas de uma planilha"""
         try:
-            import pandas as pd
-            import io
-            
-            content_length = int(self.headers.get('Content-Length', 0))
-            if content_length == 0:
-                raise ValueError("Content-Length is 0")
-            
-            post_data = self.rfile.read(content_length)
-            if not post_data:
-                raise ValueError("No data received")
-            
-            content_type = self.headers.get('Content-Type', '')
-            if 'boundary=' not in content_type:
-                raise ValueError("Boundary não encontrado no Content-Type")
-            
-            boundary = content_type.split('boundary=')[1]
-            parts = post_data.split(f'--{boundary}'.encode())
-            
-            file_data = None
-            file_type = None
-            
-            for part in parts:
-                if b'Content-Disposition: form-data' in part:
-                    if b'name="file"' in part:
-                        header_end = part.find(b'\r\n\r\n')
-                        if header_end != -1:
-                            file_data = part[header_end + 4:-2]
-                    elif b'name="type"' in part:
-                        lines = part.split(b'\r\n')
-                        for line in lines:
-                            if line.startswith(b'Content-Disposition: form-data; name='):
-                                value_line = lines[lines.index(line) + 2] if lines.index(line) + 2 < len(lines) else b''
-                                file_type = value_line.decode('utf-8').strip()
-            
-            if not file_data or not file_type:
-                raise ValueError("Arquivo ou tipo não encontrado no upload")
-            
-            # Ler arquivo Excel
-            df = pd.read_excel(io.BytesIO(file_data), engine='openpyxl')
-            
-            # Pegar apenas as primeiras 10 linhas
-            df_preview = df.head(10)
-            
-            # Converter para formato JSON
-            colunas = df_preview.columns.tolist()
-            dados = df_preview.values.tolist()
-            
-            # Formatar dados para exibição
-            dados_formatados = []
-            for linha in dados:
-                linha_formatada = []
-                for i, celula in enumerate(linha):
-                    if pd.isna(celula):
-                        linha_formatada.append('')
-                    elif isinstance(celula, (int, float)):
-                        if file_type == 'taxas' and i == 4:  # Taxa Risco Mensal
-                            linha_formatada.append(f"{celula:.6f}%")
-                        elif file_type == 'emprestimos' and i == 0:  # Saldo Adimplente
-                            linha_formatada.append(f"R$ {celula:,.2f}")
-                        else:
-                            linha_formatada.append(str(celula))
-                    else:
-                        linha_formatada.append(str(celula))
-                dados_formatados.append(linha_formatada)
-            
-            response = {
-                "success": True,
-                "colunas": colunas,
-                "dados": dados_formatados,
-                "total_linhas": len(df),
-                "tipo": file_type
-            }
+            with self.ler_formulario_multipart() as formulario:
+                file_data = formulario.arquivos.get('file')
+                file_type = formulario.campos.get('type', '').strip()
+                
+                if not file_data or not file_data.tamanho or not file_type:
+                    raise ValueError("Arquivo ou tipo não encontrado no upload")
+                
+                # Preview do cache em disco quando o mesmo arquivo já foi visto
+                response = obter_preview_cached(file_data, file_type, gerar_preview_planilha)
             
             self.send_response(200)
             self.send_header('Content-type', 'application/json; charset=utf-8')
@@ -2633,40 +4946,43 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps(error_response, ensure_ascii=False).encode('utf-8'))
 
-    def handle_obter_tabua_completa(self):
-        """Endpoint para obter uma tábua completa de mortalidade."""
+    def handle_obter_tabua_completa(self, tabua_nome=None):
+        """
+        Endpoint para obter uma tábua completa de mortalidade (POST com {"tabua": ...}
+        ou GET com ?tabua=). O corpo fica em cache, comprimido, por versão da tábua.
+        """
         try:
-            # Ler dados do POST
-            content_length = int(self.headers.get('Content-Length', 0))
-            if content_length == 0:
-                raise ValueError("Content-Length is 0")
-            
-            post_data = self.rfile.read(content_length)
-            if not post_data:
-                raise ValueError("No data received")
-            
-            data = json.loads(post_data.decode('utf-8'))
-            tabua_nome = data.get('tabua')
+            if self.command == 'POST':
+                # Ler dados do POST
+                content_length = int(self.headers.get('Content-Length', 0))
+                if content_length == 0:
+                    raise ValueError("Content-Length is 0")
+                
+                post_data = self.rfile.read(content_length)
+                if not post_data:
+                    raise ValueError("No data received")
+                
+                data = json.loads(post_data.decode('utf-8'))
+                tabua_nome = data.get('tabua')
             
             if not tabua_nome:
                 raise ValueError("Nome da tábua não fornecido")
             
-            # Carregar a tábua completa
-            tabua_data = self.carregar_tabua_completa(tabua_nome)
-            
-            if tabua_data is None:
+            versao = obter_versao_tabua(tabua_nome)
+            if versao is None:
                 raise ValueError(f"Tábua '{tabua_nome}' não encontrada")
             
-            # Enviar resposta
-            response_data = {
-                "success": True,
-                "tabua_data": tabua_data
-            }
+            def gerar():
+                # Carregar a tábua completa
+                response_data = {
+                    "success": True,
+                    "tabua_data": self.carregar_tabua_completa(tabua_nome)
+                }
+                return json.dumps(response_data).encode('utf-8'), 'application/json'
             
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(response_data).encode('utf-8'))
+            # Enviar resposta
+            entrada = obter_resposta_cacheavel(('tabua_completa', tabua_nome), versao, gerar)
+            self.enviar_resposta_cacheavel(entrada, CACHE_CONTROL_TABUAS)
             
         except Exception as e:
             error_response = {
@@ -2679,26 +4995,16 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
             self.wfile.write(json.dumps(error_response).encode('utf-8'))
 
     def carregar_tabua_completa(self, tabua_nome):
-        """Carrega uma tábua completa de mortalidade do CSV."""
-        try:
-            # Ler o arquivo CSV
-            with open('tabuas_mortalidade_completas.csv', 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                
-                tabua_data = {}
-                for row in reader:
-                    if row['Tábua'] == tabua_nome:
-                        idade = int(row['Idade'])
-                        tabua_data[idade] = {
-                            'qx_masc': float(row['qx_masc']),
-                            'qx_fem': float(row['qx_fem'])
-                        }
-                
-                return tabua_data if tabua_data else None
-                
-        except Exception as e:
-            print(f"Erro ao carregar tábua {tabua_nome}: {e}")
+        """Carrega uma tábua completa de mortalidade do registro compilado."""
+        carregar_registro_tabuas()
+        if tabua_nome not in TABUAS_INDICE:
             return None
+        
+        qx_masc, qx_fem = TABUAS_CUBO[TABUAS_INDICE[tabua_nome]]
+        return {
+            idade: {'qx_masc': float(qx_masc[idade]), 'qx_fem': float(qx_fem[idade])}
+            for idade in range(IDADES_TABUA)
+        }
 
     def handle_obter_qx(self):
         """Endpoint para obter probabilidade de morte de uma tábua específica."""
@@ -2729,18 +5035,16 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
             if sexo not in ['M', 'F']:
                 raise ValueError("Sexo deve ser 'M' ou 'F'")
             
-            # Criar instância da tábua
-            tabua_obj = TabuladeComutacao(0.01, tabua)  # Taxa de juros não importa para obter qx
+            # Consultar o registro de tábuas diretamente (qx não depende da taxa de juros)
+            registro = carregar_registro_tabuas()
             
             # Verificar se a tábua existe
-            if tabua not in tabua_obj.tabuas_disponiveis:
+            if tabua not in registro:
                 raise KeyError(f"Tábua '{tabua}' não encontrada")
             
-            # Carregar dados da tábua
-            tabua_obj.dados = tabua_obj.tabuas_disponiveis[tabua]
-            
             # Obter probabilidade de morte
-            qx = tabua_obj.obter_qx(idade, sexo)
+            dados_sexo = registro[tabua]['masculino'] if sexo == 'M' else registro[tabua]['feminino']
+            qx = dados_sexo.get(str(idade), 1.0)
             
             response = {
                 'success': True,
@@ -2764,121 +5068,34 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
     def handle_calcular_reserva_matematica_individual(self):
         """Calcula a reserva matemática individual com upload de planilha XLSX."""
         try:
-            import io
-            import pandas as pd
             import tempfile
             import os
             import urllib.parse
             
             # Iniciando cálculo de reserva matemática
             
-            # Ler dados do POST de forma mais simples
-            content_length = int(self.headers.get('Content-Length', 0))
-            if content_length == 0:
-                raise ValueError("Content-Length is 0")
-            
-            post_data = self.rfile.read(content_length)
-            if not post_data:
-                raise ValueError("No data received")
-            
-            # Parse simples dos dados (assumindo que é form-data)
-            # Para simplificar, vamos usar uma abordagem diferente
-            # Processando dados do POST e formulário
-            
-            # Extrair boundary do Content-Type
-            content_type = self.headers.get('Content-Type', '')
-            if 'boundary=' not in content_type:
-                raise ValueError("Boundary não encontrado no Content-Type")
-            
-            boundary = content_type.split('boundary=')[1].encode()
-            
-            # Parse manual dos dados multipart
-            parts = post_data.split(b'--' + boundary)
-            form_data = {}
-            file_data = None
-            
-            for part in parts:
-                if b'Content-Disposition' in part:
-                    # Extrair nome do campo
-                    if b'name="' in part:
-                        name_start = part.find(b'name="') + 6
-                        name_end = part.find(b'"', name_start)
-                        field_name = part[name_start:name_end].decode('utf-8')
-                        
-                        # Verificar se é arquivo
-                        if b'filename="' in part:
-                            # Extrair dados do arquivo
-                            data_start = part.find(b'\r\n\r\n') + 4
-                            data_end = part.rfind(b'\r\n')
-                            file_data = part[data_start:data_end]
-                        else:
-                            # Extrair valor do campo
-                            data_start = part.find(b'\r\n\r\n') + 4
-                            data_end = part.rfind(b'\r\n')
-                            if data_end > data_start:
-                                field_value = part[data_start:data_end].decode('utf-8')
-                                form_data[field_name] = field_value
-            
-            # Extrair dados do formulário
-            saldo_devedor = float(form_data.get('saldo_devedor', 100000.0))
-            parcelas_restantes = int(form_data.get('parcelas_restantes', 12))
-            idade = int(form_data.get('idade', 30))
-            sexo = form_data.get('sexo', 'M')
-            situacao = form_data.get('situacao', 'valido')
-            tabua = form_data.get('tabua', 'AT-83')
-            taxa_juros = float(form_data.get('taxa_juros', 6.5)) / 100.0  # Converter de % para decimal
-            
-            # Dados extraídos do formulário
-            
-            # Processar arquivo XLSX do upload
-            if not file_data:
-                raise ValueError("Arquivo não encontrado no upload")
-            
-            # Arquivo recebido
-            
-            # Ler arquivo XLSX do upload
-            try:
-                df = pd.read_excel(io.BytesIO(file_data), engine='openpyxl')
-            except Exception as e:
-                # Erro ao ler arquivo
-                raise ValueError(f"Erro ao ler arquivo XLSX: {str(e)}")
-            
-            # Verificar se as colunas já estão no formato correto
-            colunas_esperadas = ['idade', 'sexo', 'situacao', 'parcela', 'taxa_risco_mensal']
-            colunas_originais = list(df.columns)
-            
-            # Verificando colunas do arquivo
-            
-            # Se as colunas já estão corretas, não precisa mapear
-            if not all(col in df.columns for col in colunas_esperadas):
-                # Tentar mapear colunas do arquivo para o formato esperado
-                mapeamento_colunas = {
-                    'Idade': 'idade',
-                    'Sexo': 'sexo', 
-                    'Parcelas Restantes': 'parcela',
-                    'Tipo Tábua': 'situacao',
-                    'Taxa Risco Mensal (%)': 'taxa_risco_mensal'
-                }
+            # Ler o upload em blocos (a planilha vai para disco se for grande)
+            with self.ler_formulario_multipart() as formulario:
+                # Campos vazios ficam com o valor padrão
+                form_data = {nome: valor for nome, valor in formulario.campos.items() if valor}
+                # Arquivo de taxas: a parte com filename (a última, se houver mais de uma)
+                file_data = list(formulario.arquivos.values())[-1] if formulario.arquivos else None
                 
-                colunas_mapeadas = {}
+                # Extrair dados do formulário
+                saldo_devedor = float(form_data.get('saldo_devedor', 100000.0))
+                parcelas_restantes = int(form_data.get('parcelas_restantes', 12))
+                idade = int(form_data.get('idade', 30))
+                sexo = form_data.get('sexo', 'M')
+                situacao = form_data.get('situacao', 'valido')
+                tabua = form_data.get('tabua', 'AT-83')
+                taxa_juros = float(form_data.get('taxa_juros', 6.5)) / 100.0  # Converter de % para decimal
                 
-                for col_original, col_nova in mapeamento_colunas.items():
-                    if col_original in df.columns:
-                        colunas_mapeadas[col_original] = col_nova
-                        # Mapeando coluna
+                # Processar arquivo XLSX do upload
+                if not file_data or not file_data.tamanho:
+                    raise ValueError("Arquivo não encontrado no upload")
                 
-                if colunas_mapeadas:
-                    # Renomear colunas
-                    df = df.rename(columns=colunas_mapeadas)
-                    
-                    # Converter tipos de dados
-                    df['idade'] = df['idade'].astype(int)
-                    df['sexo'] = df['sexo'].map({'Masculino': 'M', 'Feminino': 'F'})
-                    df['situacao'] = df['situacao'].map({'Válido': 'valido', 'Inválido': 'invalido'})
-                    df['parcela'] = df['parcela'].astype(int)
-                    df['taxa_risco_mensal'] = df['taxa_risco_mensal'].astype(float) / 100  # Converter de % para decimal
-                else:
-                    raise ValueError("Não foi possível mapear as colunas do arquivo")
+                # Ler arquivo XLSX do upload (do cache em disco quando já foi lido)
+                df = ler_planilha_cached(file_data, 'taxas_individual', ler_planilha_taxas_individual)
             
             # Arquivo processado com sucesso
             
@@ -2896,7 +5113,7 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
             )
             
             # Calcular também a versão otimizada para comparação
-            resultado_otimizado = self.calcular_vabf_vacf_otimizado(
+            resultado_otimizado = calcular_vabf_vacf_otimizado(
                 tabua_obj, saldo_devedor, parcelas_restantes,
                 idade, sexo, situacao, df, taxa_juros, tabua
             )
@@ -2976,11 +5193,9 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
         # Fator de desconto mensal
         v = 1 / (1 + taxa_mensal)
         
-        # Calcular parcela mensal do financiamento Price usando taxa mensal
-        if taxa_mensal > 0:
-            parcela_mensal = saldo_devedor * (taxa_mensal * (1 + taxa_mensal)**parcelas_restantes) / ((1 + taxa_mensal)**parcelas_restantes - 1)
-        else:
-            parcela_mensal = saldo_devedor / parcelas_restantes
+        # Cronograma Price do saldo devedor usando taxa mensal
+        cronograma = calcular_cronograma_price(saldo_devedor, taxa_mensal, parcelas_restantes)
+        parcela_mensal = float(cronograma['pmt'])
         
         detalhes = {
             'parcela_mensal': parcela_mensal,
@@ -2995,28 +5210,29 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
             'calculo_mensal': []
         }
         
+        # Sobrevivência mensal acumulada pré-calculada para a tábua e sexo
+        kernel = obter_kernel_mensal(tabua_obj, sexo)
+        
+        # Arquivo de taxas compilado uma vez (cada mês vira uma indexação de array)
+        indice_taxas = obter_indice_taxas(df_taxas)
+        idade_kernel = min(int(idade), IDADES_TABUA)
+        
         # Calcular VABF e VACF mês a mês
-        saldo_atual = saldo_devedor
         idade_inicial = idade  # Armazenar a idade inicial para cálculo de taxa de risco
         idade_atual = idade
         
         for mes in range(1, parcelas_restantes + 1):
-            # Calcular saldo devedor no mês atual (B_{t-1})
-            if taxa_mensal > 0:
-                juros_mes = saldo_atual * taxa_mensal
-                amortizacao_mes = parcela_mensal - juros_mes
-            else:
-                juros_mes = 0
-                amortizacao_mes = parcela_mensal
-            
-            saldo_proximo = max(0, saldo_atual - amortizacao_mes)
+            # Saldo devedor no mês atual (B_{t-1}), juros e amortização do cronograma
+            saldo_atual = float(cronograma['saldo_devedor'][mes - 1])
+            juros_mes = float(cronograma['juros'][mes - 1])
+            amortizacao_mes = float(cronograma['amortizacao'][mes - 1])
             
             # Verificar se a idade mudou (a cada 12 meses)
             if mes > 1 and (mes - 1) % 12 == 0:
                 idade_atual += 1
             
             # Obter taxa de risco do CSV
-            taxa_risco = self.obter_taxa_risco_csv(df_taxas, idade_inicial, sexo, situacao, mes, parcelas_restantes)
+            taxa_risco = self.obter_taxa_risco_csv(indice_taxas, idade_inicial, sexo, situacao, mes, parcelas_restantes)
             
             # Obter qx anual da tábua para a idade atual
             qx_anual = tabua_obj.obter_qx(idade_atual, sexo)
@@ -3035,24 +5251,8 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
             
             # _{t-1}P_x: Probabilidade de sobrevivência até t-1
             # Calcular considerando mudanças de idade a cada 12 meses
-            if mes == 1:
-                prob_sobrevivencia_t_menos_1 = 1.0
-            else:
-                # Calcular _{t-1}P_x = produto das probabilidades mensais até t-1
-                prob_sobrevivencia_t_menos_1 = 1.0
-                
-                for m in range(1, mes):
-                    # Determinar a idade no mês m
-                    idade_mes_m = idade + ((m - 1) // 12)
-                    
-                    # Obter qx anual para essa idade
-                    qx_anual_mes_m = tabua_obj.obter_qx(idade_mes_m, sexo)
-                    
-                    # Converter para mensal
-                    p_mensal_mes_m = (1 - qx_anual_mes_m) ** (1/12)
-                    
-                    # Multiplicar pela probabilidade de sobrevivência
-                    prob_sobrevivencia_t_menos_1 *= p_mensal_mes_m
+            # (produto das probabilidades mensais até t-1, lido do kernel da tábua)
+            prob_sobrevivencia_t_menos_1 = float(kernel.sobrevivencia[idade_kernel, mes - 1])
             
             # q_{x+t-1}: Probabilidade de morte no período t (qx_mensal da idade atual)
             qx_t_menos_1 = qx_mensal
@@ -3101,9 +5301,6 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
                 'vabf_mes': vabf_mes,
                 'vacf_mes': vacf_mes
             })
-            
-            # Atualizar para próximo mês
-            saldo_atual = saldo_proximo
     
         # Calcular reserva matemática
         reserva_matematica = vabf - vacf
@@ -3122,152 +5319,94 @@ class CalculadoraHandler(http.server.SimpleHTTPRequestHandler):
         - Meses 13-24: idade_inicial + 1 + (parcelas_restantes - 12)
         - Meses 25-36: idade_inicial + 2 + (parcelas_restantes - 24)
         E assim por diante...
+        
+        Sem a idade exata, usa a mais próxima (até 5 anos) e, por fim, a taxa
+        padrão da faixa de idade — buscas já resolvidas no IndiceTaxasRisco
+        (df pode ser o DataFrame ou o índice já compilado).
         """
         # Calcular idade e parcela para buscar na planilha
         anos_transcorridos = (mes - 1) // 12
         idade_para_taxa = idade_inicial + anos_transcorridos
         parcela_para_taxa = parcelas_restantes - (anos_transcorridos * 12)
         
-        # Debug removido para limpeza do terminal
-        
-        # Filtrar dados do CSV
-        filtro = (df['idade'] == idade_para_taxa) & (df['sexo'] == sexo) & (df['situacao'] == situacao) & (df['parcela'] == parcela_para_taxa)
-        dados_filtrados = df[filtro]
-        
-        if len(dados_filtrados) == 0:
-            # Se não encontrar exato, buscar o mais próximo
-            for idade_diff in range(1, 6):  # Buscar até 5 anos de diferença
-                for idade_tentativa in [idade_para_taxa - idade_diff, idade_para_taxa + idade_diff]:
-                    if idade_tentativa >= 0:
-                        filtro_alt = (df['idade'] == idade_tentativa) & (df['sexo'] == sexo) & (df['situacao'] == situacao) & (df['parcela'] == parcela_para_taxa)
-                        dados_alt = df[filtro_alt]
-                        if len(dados_alt) > 0:
-                            return float(dados_alt.iloc[0]['taxa_risco_mensal'])
-            
-            # Se ainda não encontrar, usar taxa padrão baseada na idade
-            if idade_para_taxa < 30:
-                return 0.0001  # 0.01% ao mês
-            elif idade_para_taxa < 50:
-                return 0.0005  # 0.05% ao mês
-            elif idade_para_taxa < 70:
-                return 0.001   # 0.1% ao mês
-            else:
-                return 0.002   # 0.2% ao mês
-        
-        return float(dados_filtrados.iloc[0]['taxa_risco_mensal'])
+        indice_taxas = obter_indice_taxas(df)
+        if indice_taxas is None:
+            return float(taxa_risco_padrao(idade_para_taxa))
+        return indice_taxas.taxa_risco(situacao, sexo, idade_para_taxa, parcela_para_taxa)
 
-    def calcular_vabf_vacf_otimizado(self, tabua_obj, saldo_devedor, parcelas_restantes,
-                                     idade, sexo, situacao, df, taxa_juros, tabua):
-        """
-        Versão ULTRA OTIMIZADA usando técnicas de comutação e vetorização máxima.
-        Elimina loops desnecessários e usa lookup tables para máxima performance.
-        """
-        try:
-            import numpy as np
-            import pandas as pd
-            
-            # ===== PRÉ-COMPUTAÇÕES BÁSICAS =====
-            taxa_mensal = (1 + taxa_juros)**(1/12) - 1
-            v = 1 / (1 + taxa_mensal)
-            
-            # Calcular parcela mensal
-            if taxa_mensal > 0:
-                parcela_mensal = saldo_devedor * (taxa_mensal * (1 + taxa_mensal)**parcelas_restantes) / ((1 + taxa_mensal)**parcelas_restantes - 1)
-            else:
-                parcela_mensal = saldo_devedor / parcelas_restantes
-            
-            # ===== CÁLCULO CORRETO DO SALDO DEVEDOR (PRICE) =====
-            # Calcular saldo devedor mês a mês usando a mesma lógica do método iterativo
-            saldos_devedor = np.zeros(parcelas_restantes)
-            saldo_atual = saldo_devedor
-            
-            for i in range(parcelas_restantes):
-                saldos_devedor[i] = saldo_atual
-                if taxa_mensal > 0:
-                    juros_mes = saldo_atual * taxa_mensal
-                    amortizacao_mes = parcela_mensal - juros_mes
-                else:
-                    juros_mes = 0
-                    amortizacao_mes = parcela_mensal
-                saldo_atual = max(0, saldo_atual - amortizacao_mes)
-            
-            # ===== PRÉ-COMPUTAÇÃO DAS IDADES E PROBABILIDADES =====
-            meses = np.arange(1, parcelas_restantes + 1)
-            idades_mes = idade + ((meses - 1) // 12)
-            
-            # Obter qx anual para todas as idades de uma vez (ULTRA VETORIZADO)
-            # Usar vectorize para eliminar o laço
-            obter_qx_vectorized = np.vectorize(lambda idade_m: tabua_obj.obter_qx(int(idade_m), sexo))
-            qx_anuais = obter_qx_vectorized(idades_mes)
-            
-            # Converter para probabilidades mensais vetorizado
-            p_mensais = (1 - qx_anuais) ** (1/12)
-            qx_mensais = 1 - p_mensais
-            
-            # ===== CÁLCULO ULTRA VETORIZADO DE _{t-1}P_x =====
-            # Usar cumprod para calcular produto acumulado de forma vetorizada
-            prob_sobrevivencia_acumulada = np.ones(parcelas_restantes)
-            if parcelas_restantes > 1:
-                prob_sobrevivencia_acumulada[1:] = np.cumprod(p_mensais[:-1])
-            
-            # ===== CÁLCULO ULTRA VETORIZADO DAS TAXAS DE RISCO =====
-            anos_transcorridos = (meses - 1) // 12
-            idades_para_taxa = idade + anos_transcorridos
-            parcelas_para_taxa = parcelas_restantes - (anos_transcorridos * 12)
-            
-            # ULTRA OTIMIZAÇÃO: Usar merge do pandas para lookup vetorizado
-            if df is not None and not df.empty:
-                # Criar DataFrame com as chaves de busca
-                df_busca = pd.DataFrame({
-                    'idade': idades_para_taxa,
-                    'sexo': [sexo] * parcelas_restantes,
-                    'situacao': [situacao] * parcelas_restantes,
-                    'parcela': parcelas_para_taxa
-                })
-                
-                # Merge vetorizado para obter taxas de risco
-                df_merged = df_busca.merge(df, on=['idade', 'sexo', 'situacao', 'parcela'], how='left')
-                taxas_risco = df_merged['taxa_risco_mensal'].fillna(0.001).values
-            else:
-                # Taxa padrão vetorizada baseada na idade
-                taxas_risco = np.where(idades_para_taxa < 30, 0.0001,
-                                     np.where(idades_para_taxa < 50, 0.0005,
-                                             np.where(idades_para_taxa < 70, 0.001, 0.002)))
-            
-            # ===== CÁLCULOS FINAIS CORRIGIDOS =====
-            # Pré-computar fatores de desconto
-            fatores_desconto = v ** meses
-            
-            # Probabilidade de morte no mês t (como no método iterativo)
-            prob_morte = prob_sobrevivencia_acumulada * qx_mensais
-            
-            # VABF = Σ B_{t-1} × _{t-1}P_x × q_{x+t-1} × v^t
-            vabf_otimizado = np.sum(saldos_devedor * prob_morte * fatores_desconto)
-            
-            # VACF = Σ premio_mes × prob_sobrevivencia_fim_mes × v^t
-            # onde premio_mes = taxa_risco × saldo_devedor
-            premios_mensais = taxas_risco * saldos_devedor
-            prob_sobrevivencia_fim_mes = prob_sobrevivencia_acumulada * p_mensais
-            vacf_otimizado = np.sum(premios_mensais * prob_sobrevivencia_fim_mes * fatores_desconto)
-            
-            # Calcular reserva matemática
-            reserva_otimizada = vabf_otimizado - vacf_otimizado
-            
-            return {
-                'vabf_otimizado': vabf_otimizado,
-                'vacf_otimizado': vacf_otimizado,
-                'reserva_otimizada': reserva_otimizada,
-                'sucesso': True
-            }
-            
-        except Exception as e:
-            return {
-                'vabf_otimizado': None,
-                'vacf_otimizado': None,
-                'reserva_otimizada': None,
-                'sucesso': False,
-                'erro': str(e)
-            }
+class ServidorConcorrente(http.server.ThreadingHTTPServer):
+    """Servidor HTTP com uma thread por conexão."""
+    daemon_threads = True
+    request_queue_size = 64
+
+def iniciar_executor_pesado(max_workers=None):
+    """Cria o executor limitado das rotas de cálculo pesado."""
+    global EXECUTOR_PESADO
+    if EXECUTOR_PESADO is None:
+        EXECUTOR_PESADO = ThreadPoolExecutor(max_workers=max_workers or MAX_REQUISICOES_PESADAS,
+                                             thread_name_prefix='calculo-pesado')
+    return EXECUTOR_PESADO
+
+def encerrar_executor_pesado():
+    """Encerra o executor das rotas de cálculo pesado, se existir."""
+    global EXECUTOR_PESADO
+    if EXECUTOR_PESADO is not None:
+        EXECUTOR_PESADO.shutdown(wait=False, cancel_futures=True)
+        EXECUTOR_PESADO = None
+
+def medir_latencia(url_base, rota_leve='/tabuas', rota_pesada='/calcular_coletivo',
+                   num_requisicoes=200, requisicoes_pesadas=2):
+    """
+    Mede a latência de uma rota leve enquanto rotas pesadas estão em execução.
+    
+    Dispara requisicoes_pesadas clientes repetindo a rota pesada (grade coletiva
+    completa) e, em paralelo, faz num_requisicoes chamadas sequenciais à rota
+    leve, informando p50, p99 e máximo em milissegundos.
+    """
+    import urllib.request
+    
+    payload_pesado = json.dumps({
+        "idade_min": 0, "idade_max": 110, "sexos": ["M", "F"],
+        "periodo_min": 1, "periodo_max": 10, "taxa_juros": 6.5,
+        "tabuas_validas": list(carregar_registro_tabuas().keys()), "tabuas_invalidas": []
+    }).encode('utf-8')
+    parar = threading.Event()
+    pesadas_concluidas = []
+    
+    def cliente_pesado():
+        while not parar.is_set():
+            requisicao = urllib.request.Request(url_base + rota_pesada, data=payload_pesado,
+                                                headers={'Content-Type': 'application/json'})
+            with urllib.request.urlopen(requisicao, timeout=600) as resposta:
+                resposta.read()
+            pesadas_concluidas.append(1)
+    
+    clientes = [threading.Thread(target=cliente_pesado, daemon=True) for _ in range(requisicoes_pesadas)]
+    for cliente in clientes:
+        cliente.start()
+    time.sleep(0.5)  # Deixar as requisições pesadas começarem
+    
+    latencias = []
+    try:
+        for _ in range(num_requisicoes):
+            inicio = time.perf_counter()
+            with urllib.request.urlopen(url_base + rota_leve, timeout=600) as resposta:
+                resposta.read()
+            latencias.append((time.perf_counter() - inicio) * 1000)
+    finally:
+        parar.set()
+    
+    latencias = np.array(latencias)
+    resultado = {
+        "rota_leve": rota_leve,
+        "rota_pesada": rota_pesada,
+        "requisicoes": len(latencias),
+        "pesadas_concluidas": len(pesadas_concluidas),
+        "p50_ms": float(np.percentile(latencias, 50)),
+        "p99_ms": float(np.percentile(latencias, 99)),
+        "max_ms": float(latencias.max())
+    }
+    return resultado
 
 def obter_ip_rede_local():
     """Obtém o IP da rede local automaticamente."""
@@ -3300,9 +5439,63 @@ def encontrar_porta_disponivel(porta_inicial=PORT_INICIAL, max_tentativas=100):
     raise RuntimeError(f"Não foi possível encontrar uma porta disponível entre {porta_inicial} e {porta_inicial + max_tentativas - 1}")
 
 if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Servidor da Calculadora de Seguro Prestamista")
+    parser.add_argument('--compilar-tabuas', action='store_true',
+                        help=f"Compila {ARQUIVO_TABUAS_CSV} em {ARQUIVO_TABUAS_BIN} e encerra")
+    parser.add_argument('--max-workers', type=int, default=MAX_WORKERS,
+                        help="Número de processos do pool do cálculo coletivo (padrão: %(default)s)")
+    parser.add_argument('--tamanho-chunk', type=int, default=TAMANHO_CHUNK,
+                        help="Fatias (tábua, sexo) por tarefa enviada ao pool; 0 = uma tarefa por worker (padrão: %(default)s)")
+    parser.add_argument('--workers', type=int, default=MAX_REQUISICOES_PESADAS,
+                        help="Requisições de cálculo pesado executadas ao mesmo tempo (padrão: %(default)s)")
+    parser.add_argument('--cache-resultados', default=ARQUIVO_CACHE_RESULTADOS, metavar='ARQUIVO',
+                        help="Arquivo SQLite do cache em disco da grade coletiva; vazio desativa (padrão: %(default)s)")
+    parser.add_argument('--cache-max-linhas', type=int, default=MAX_LINHAS_CACHE_RESULTADOS,
+                        help="Limite de linhas do cache em disco antes de remover as menos usadas (padrão: %(default)s)")
+    parser.add_argument('--cache-planilhas', default=DIRETORIO_CACHE_PLANILHAS, metavar='DIRETORIO',
+                        help="Diretório do cache das planilhas enviadas (por sha256); vazio desativa (padrão: %(default)s)")
+    parser.add_argument('--max-jobs', type=int, default=MAX_JOBS_SIMULTANEOS,
+                        help="Jobs assíncronos (/jobs/...) executados ao mesmo tempo, dentro do limite de --workers (padrão: %(default)s)")
+    parser.add_argument('--medir-latencia', metavar='URL',
+                        help="Mede o p99 de /tabuas num servidor em execução (ex.: http://localhost:8001) "
+                             "enquanto /calcular_coletivo roda, e encerra")
+    args = parser.parse_args()
+    
+    MAX_WORKERS = max(1, args.max_workers)
+    TAMANHO_CHUNK = max(0, args.tamanho_chunk)
+    MAX_REQUISICOES_PESADAS = max(1, args.workers)
+    MAX_JOBS_SIMULTANEOS = max(1, args.max_jobs)
+    ARQUIVO_CACHE_RESULTADOS = args.cache_resultados
+    MAX_LINHAS_CACHE_RESULTADOS = max(1, args.cache_max_linhas)
+    DIRETORIO_CACHE_PLANILHAS = args.cache_planilhas
+    
+    if args.medir_latencia:
+        resultado = medir_latencia(args.medir_latencia.rstrip('/'))
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+        sys.exit(0)
+    
+    if args.compilar_tabuas:
+        total = compilar_tabuas_binarias()
+        print(f"{total} tábuas compiladas em {ARQUIVO_TABUAS_BIN}")
+        sys.exit(0)
+    
     # Obter IP da rede local
     ip_local = obter_ip_rede_local()
     
+    # Carregar as tábuas de mortalidade uma única vez, antes de aceitar requisições
+    carregar_registro_tabuas()
+    
+    # Pool de processos persistente (workers já com as tábuas carregadas)
+    iniciar_pool_processos()
+    
+    # Executor limitado para as rotas de cálculo pesado
+    iniciar_executor_pesado()
+    
+    # Executor dos jobs assíncronos
+    iniciar_executor_jobs()
+    
     # Encontrar uma porta disponível
     PORT = encontrar_porta_disponivel()
     
@@ -3310,12 +5503,14 @@ if __name__ == '__main__':
     if PORT != PORT_INICIAL:
         print(f"AVISO: Porta {PORT_INICIAL} esta em uso. Usando porta {PORT}.")
     
-    with socketserver.TCPServer(("0.0.0.0", PORT), CalculadoraHandler) as httpd:
+    with ServidorConcorrente(("0.0.0.0", PORT), CalculadoraHandler) as httpd:
         print("=" * 60)
         print("SERVIDOR DE SEGURO PRESTAMISTA INICIADO")
         print("=" * 60)
         print(f"Calculadora de Seguro de Vida - Web")
         print(f"Servidor rodando na porta: {PORT}")
+        print(f"Requisições de cálculo pesado simultâneas: {MAX_REQUISICOES_PESADAS}")
+        print(f"Jobs assíncronos simultâneos: {MAX_JOBS_SIMULTANEOS}")
         print()
         print("ACESSO LOCAL:")
         print(f"   • http://localhost:{PORT}")
@@ -3341,3 +5536,7 @@ if __name__ == '__main__':
             httpd.serve_forever()
         except KeyboardInterrupt:
             print("\n🛑 Servidor parado.")
+        finally:
+            encerrar_executor_jobs()
+            encerrar_executor_pesado()
+            encerrar_pool_processos()